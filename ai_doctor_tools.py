@@ -1,20 +1,121 @@
 from typing import List, Dict, Optional
-from openai import OpenAI
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, tool
 from langchain_core.runnables import RunnableConfig
-import sqlite3
+from hospital_db import acquire_connection, release_connection, begin_immediate
+from llm_cache import LLMResponseCache, cache_key
 from appointment_tools import *
+import asyncio
 import json  
 import os
+import random
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-client = OpenAI()
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("HOSPITAL_OPENAI_TIMEOUT_SECONDS", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("HOSPITAL_OPENAI_MAX_RETRIES", "3"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("HOSPITAL_OPENAI_MAX_CONNECTIONS", "20"))
 
-@tool
-def symptom_analysis(
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+def get_openai_client():
+    """Sync OpenAI client, imported and created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(timeout=OPENAI_TIMEOUT_SECONDS, max_retries=OPENAI_MAX_RETRIES)
+    return _client
+
+def get_async_openai_client():
+    """Async OpenAI client for the async tool path; one pooled transport shared by all requests"""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                import httpx
+                from openai import AsyncOpenAI
+                _async_client = AsyncOpenAI(
+                    timeout=OPENAI_TIMEOUT_SECONDS,
+                    max_retries=0,  # retried with jitter in acreate_completion
+                    http_client=httpx.AsyncClient(
+                        timeout=OPENAI_TIMEOUT_SECONDS,
+                        limits=httpx.Limits(
+                            max_connections=OPENAI_MAX_CONNECTIONS,
+                            max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+                        )
+                    )
+                )
+    return _async_client
+
+async def acreate_completion(**kwargs):
+    """chat.completions.create on the async client, retrying transient errors with full-jitter backoff"""
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+    retryable = (APITimeoutError, APIConnectionError, RateLimitError, InternalServerError)
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        try:
+            return await get_async_openai_client().chat.completions.create(**kwargs)
+        except retryable as e:
+            if attempt == OPENAI_MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+            print(f"OpenAI request failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+# Persistent cache of symptom analyses; common complaints skip the API call
+symptom_cache = LLMResponseCache()
+
+SYMPTOM_MODEL = "gpt-4o-mini"
+SYMPTOM_TEMPERATURE = 0.3
+
+def _symptom_messages(symptoms: str, medical_history: Optional[str]) -> List[Dict]:
+    # 构建提示信息
+    prompt = f"""As a medical AI assistant, please analyze the following symptoms:
+        
+Symptoms: {symptoms}
+Medical History: {medical_history or 'Not provided'}
+
+Please provide:
+1. Possible conditions
+2. Severity level (High/Medium/Low)
+3. Type of medical expertise needed
+4. General advice and self-care recommendations
+5. Warning signs to watch for
+
+Format the response as a structured JSON."""
+
+    return [
+        {"role": "system", "content": "You are a medical AI assistant helping with initial symptom analysis."},
+        {"role": "user", "content": prompt}
+    ]
+
+def _cached_analysis(key: str, config: RunnableConfig) -> Optional[str]:
+    # Clinicians can set bypass_cache to always get a fresh analysis
+    if config.get("configurable", {}).get("bypass_cache"):
+        symptom_cache.record_bypass()
+        return None
+    return symptom_cache.get(key)
+
+def _analysis_result(key: str, content: str, fresh: bool) -> Dict:
+    # 解析AI响应; only well-formed analyses are cached
+    analysis = json.loads(content)
+    if fresh:
+        symptom_cache.put(key, content)
+    print(analysis)
+
+    # 组合返回结果
+    return {
+        "analysis": analysis,
+        "recommendations": generate_medical_recommendations(analysis)
+    }
+
+def _symptom_analysis(
     symptoms: str,
     medical_history: Optional[str] = None,
     *,
@@ -28,47 +129,72 @@ def symptom_analysis(
         medical_history: Patient's relevant medical history
     """
     try:
-        # 构建提示信息
-        prompt = f"""As a medical AI assistant, please analyze the following symptoms:
-        
-Symptoms: {symptoms}
-Medical History: {medical_history or 'Not provided'}
+        messages = _symptom_messages(symptoms, medical_history)
+        key = cache_key(SYMPTOM_MODEL, SYMPTOM_TEMPERATURE, messages)
+        content = _cached_analysis(key, config)
+        fresh = content is None
 
-Please provide:
-1. Possible conditions
-2. Severity level (High/Medium/Low)
-3. Type of medical expertise needed
-4. General advice and self-care recommendations
-5. Warning signs to watch for
+        if fresh:
+            # 使用新版本的 OpenAI API
+            response = get_openai_client().chat.completions.create(
+                model=SYMPTOM_MODEL,
+                messages=messages,
+                temperature=SYMPTOM_TEMPERATURE,
+                response_format={"type": "json_object"}
+            )
+            content = response.choices[0].message.content
 
-Format the response as a structured JSON."""
+        return _analysis_result(key, content, fresh)
 
-        # 使用新版本的 OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a medical AI assistant helping with initial symptom analysis."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-
-        )
-
-        # 解析AI响应
-        analysis = json.loads(response.choices[0].message.content)
-        print(analysis)
-        
+    except Exception as e:
+        return {"error": f"Failed to analyze symptoms: {str(e)}"}
 
-        # 组合返回结果
-        return {
-            "analysis": analysis,
-            "recommendations": generate_medical_recommendations(analysis)
-        }
+async def _asymptom_analysis(
+    symptoms: str,
+    medical_history: Optional[str] = None,
+    *,
+    config: RunnableConfig
+) -> Dict:
+    """Async symptom_analysis; the event loop stays free while waiting on OpenAI"""
+    try:
+        messages = _symptom_messages(symptoms, medical_history)
+        key = cache_key(SYMPTOM_MODEL, SYMPTOM_TEMPERATURE, messages)
+        content = _cached_analysis(key, config)
+        fresh = content is None
+
+        if fresh:
+            response = await acreate_completion(
+                model=SYMPTOM_MODEL,
+                messages=messages,
+                temperature=SYMPTOM_TEMPERATURE,
+                response_format={"type": "json_object"}
+            )
+            content = response.choices[0].message.content
+
+        return _analysis_result(key, content, fresh)
 
     except Exception as e:
         return {"error": f"Failed to analyze symptoms: {str(e)}"}
 
+# Sync and async implementations behind one tool: graph.invoke uses the
+# former, graph.ainvoke / astream the latter
+symptom_analysis = StructuredTool.from_function(
+    func=_symptom_analysis,
+    coroutine=_asymptom_analysis,
+    name="symptom_analysis"
+)
+
+MEDICAL_HISTORY_SQL = '''
+    SELECT m.visit_date, m.chief_complaint, m.diagnosis,
+           m.treatment, m.prescriptions,
+           d.name as doctor_name, dep.name as department_name
+    FROM medical_records m
+    JOIN doctors d ON m.doctor_id = d.doctor_id
+    JOIN departments dep ON d.department_id = dep.department_id
+    WHERE m.patient_id = ?
+    ORDER BY m.visit_date DESC
+'''
+
 @tool
 def get_patient_medical_history(
     *,
@@ -80,7 +206,7 @@ def get_patient_medical_history(
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
@@ -95,16 +221,7 @@ def get_patient_medical_history(
         patient_info = cursor.fetchone()
         
         # 获取过往就医记录
-        cursor.execute('''
-            SELECT m.visit_date, m.chief_complaint, m.diagnosis, 
-                   m.treatment, m.prescriptions,
-                   d.name as doctor_name, dep.name as department_name
-            FROM medical_records m
-            JOIN doctors d ON m.doctor_id = d.doctor_id
-            JOIN departments dep ON d.department_id = dep.department_id
-            WHERE m.patient_id = ?
-            ORDER BY m.visit_date DESC
-        ''', (patient_id,))
+        cursor.execute(MEDICAL_HISTORY_SQL, (patient_id,))
         
         medical_records = cursor.fetchall()
 
@@ -123,7 +240,7 @@ def get_patient_medical_history(
 
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 def generate_medical_recommendations(analysis: Dict) -> List[str]:
     """Generate medical recommendations based on symptom analysis"""
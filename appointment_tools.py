@@ -1,8 +1,10 @@
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict
 from datetime import datetime, timedelta
 from langchain_core.tools import tool
 from langchain_core.runnables import RunnableConfig
-import sqlite3
+from hospital_db import (acquire_connection, release_connection, begin_immediate,
+                         day_range, TIMESTAMP_FORMAT)
+from slot_engine import BookingIndex, free_slots_batch, minutes_to_datetime
 from enum import Enum
 from dataclasses import dataclass
 # 定义一些常量和枚举
@@ -31,17 +33,155 @@ class WorkingHours:
     AFTERNOON_END = '17:00'
     APPOINTMENT_DURATION = 30  # minutes
 
+# SQL run by the tools below. hospital_schema checks the plans of these same
+# strings, so edit the query here rather than inline.
+APPOINTMENT_RULES_SQL = '''
+    SELECT working_days, working_hours, max_daily_appointments
+    FROM doctors WHERE doctor_id = ?
+'''
+DAILY_APPOINTMENT_COUNT_SQL = '''
+    SELECT COUNT(*) FROM appointments
+    WHERE doctor_id = ?
+    AND status = 'scheduled'
+    AND scheduled_time >= ?
+    AND scheduled_time < ?
+'''
+APPOINTMENT_OVERLAP_SQL = '''
+    SELECT COUNT(*) FROM appointments
+    WHERE doctor_id = ?
+    AND status = 'scheduled'
+    AND scheduled_time < ?
+    AND end_time > ?
+'''
+DOCTOR_SCHEDULE_SQL = '''
+    SELECT working_days, working_hours
+    FROM doctors
+    WHERE doctor_id = ?
+'''
+DAY_BOOKINGS_SQL = '''
+    SELECT doctor_id, scheduled_time, end_time
+    FROM appointments
+    WHERE doctor_id = ?
+    AND status = 'scheduled'
+    AND scheduled_time >= ?
+    AND scheduled_time < ?
+'''
+# {doctor_ids} is filled with one placeholder per doctor
+BULK_BOOKINGS_SQL = '''
+    SELECT doctor_id, scheduled_time, end_time
+    FROM appointments
+    WHERE doctor_id IN ({doctor_ids})
+    AND status = 'scheduled'
+    AND scheduled_time >= ?
+    AND scheduled_time < ?
+'''
+PATIENT_SQL = "SELECT * FROM patients WHERE patient_id = ?"
+RECENT_APPOINTMENTS_SQL = '''
+    SELECT a.*, d.name as doctor_name, dep.name as department_name
+    FROM appointments a
+    JOIN doctors d ON a.doctor_id = d.doctor_id
+    JOIN departments dep ON a.department_id = dep.department_id
+    WHERE a.patient_id = ?
+    ORDER BY a.scheduled_time DESC
+    LIMIT 5
+'''
+RECENT_RECORDS_SQL = '''
+    SELECT m.*, d.name as doctor_name
+    FROM medical_records m
+    JOIN doctors d ON m.doctor_id = d.doctor_id
+    WHERE m.patient_id = ?
+    ORDER BY m.visit_date DESC
+    LIMIT 5
+'''
+# Dynamic queries: the base statement plus the clause each optional filter appends
+SEARCH_DEPARTMENTS_SQL = "SELECT * FROM departments WHERE 1=1"
+SEARCH_DEPARTMENTS_FILTERS = {
+    "name": " AND name LIKE ?",
+    "is_active": " AND is_active = 1",
+}
+SEARCH_DOCTORS_SQL = """
+    SELECT d.*, dep.name as department_name
+    FROM doctors d
+    JOIN departments dep ON d.department_id = dep.department_id
+    WHERE 1=1
+"""
+SEARCH_DOCTORS_FILTERS = {
+    "department": " AND dep.name LIKE ?",
+    "name": " AND d.name LIKE ?",
+    "specialty": " AND d.specialty LIKE ?",
+    "is_active": " AND d.is_active = 1",
+}
+AVAILABLE_DOCTORS_SQL = """
+    SELECT d.doctor_id, d.name, d.specialty, d.working_days, d.working_hours,
+           dep.name as department_name
+    FROM doctors d
+    JOIN departments dep ON d.department_id = dep.department_id
+    WHERE d.is_active = 1
+"""
+AVAILABLE_DOCTORS_FILTERS = {
+    "department": " AND dep.name LIKE ?",
+    "doctor_id": " AND d.doctor_id = ?",
+}
+APPOINTMENT_STATUS_SQL = '''
+    SELECT status FROM appointments
+    WHERE appointment_id = ? AND patient_id = ?
+'''
+CANCELLATION_CHECK_SQL = '''
+    SELECT scheduled_time, status
+    FROM appointments
+    WHERE appointment_id = ? AND patient_id = ?
+'''
+CANCEL_APPOINTMENT_SQL = '''
+    UPDATE appointments
+    SET status = 'cancelled',
+        cancelled_reason = ?,
+        last_updated = CURRENT_TIMESTAMP
+    WHERE appointment_id = ? AND patient_id = ?
+'''
+UPCOMING_APPOINTMENTS_SQL = '''
+    SELECT a.*, d.name as doctor_name, dep.name as department_name
+    FROM appointments a
+    JOIN doctors d ON a.doctor_id = d.doctor_id
+    JOIN departments dep ON a.department_id = dep.department_id
+    WHERE a.patient_id = ?
+    AND a.scheduled_time > CURRENT_TIMESTAMP
+    AND a.status = 'scheduled'
+    ORDER BY a.scheduled_time ASC
+'''
+SEARCH_RECORDS_SQL = """
+    SELECT m.*, d.name as doctor_name, dep.name as department_name
+    FROM medical_records m
+    JOIN doctors d ON m.doctor_id = d.doctor_id
+    JOIN departments dep ON d.department_id = dep.department_id
+    WHERE m.patient_id = ?
+"""
+VISIT_DATE_FILTERS = {
+    "start_date": " AND m.visit_date >= ?",
+    "end_date": " AND m.visit_date < ?",
+}
+REVIEW_ELIGIBILITY_SQL = '''
+    SELECT COUNT(*) FROM appointments
+    WHERE patient_id = ? AND doctor_id = ? AND status = 'completed'
+'''
+MEDICAL_EXPENSES_SQL = """
+    SELECT m.visit_date, m.treatment, m.prescriptions,
+           d.name as doctor_name, dep.name as department_name,
+           b.amount, b.insurance_coverage, b.patient_payment
+    FROM medical_records m
+    JOIN doctors d ON m.doctor_id = d.doctor_id
+    JOIN departments dep ON d.department_id = dep.department_id
+    JOIN billing b ON m.record_id = b.record_id
+    WHERE m.patient_id = ?
+"""
+
 def validate_appointment_time(doctor_id: int, scheduled_time: datetime) -> tuple[bool, str]:
     """Validate if the appointment time is valid"""
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
         # Get doctor's working days and hours
-        cursor.execute('''
-            SELECT working_days, working_hours, max_daily_appointments 
-            FROM doctors WHERE doctor_id = ?
-        ''', (doctor_id,))
+        cursor.execute(APPOINTMENT_RULES_SQL, (doctor_id,))
         doctor_schedule = cursor.fetchone()
         
         if not doctor_schedule:
@@ -63,12 +203,7 @@ def validate_appointment_time(doctor_id: int, scheduled_time: datetime) -> tuple
                 return False, "Appointment time is outside working hours"
 
         # Check number of appointments for the day
-        cursor.execute('''
-            SELECT COUNT(*) FROM appointments 
-            WHERE doctor_id = ? 
-            AND date(scheduled_time) = date(?) 
-            AND status = 'scheduled'
-        ''', (doctor_id, scheduled_time))
+        cursor.execute(DAILY_APPOINTMENT_COUNT_SQL, (doctor_id, *day_range(scheduled_time)))
         
         daily_appointments = cursor.fetchone()[0]
         if daily_appointments >= max_daily_appointments:
@@ -76,13 +211,9 @@ def validate_appointment_time(doctor_id: int, scheduled_time: datetime) -> tuple
 
         # Check if the time slot is available
         appointment_end = scheduled_time + timedelta(minutes=WorkingHours.APPOINTMENT_DURATION)
-        cursor.execute('''
-            SELECT COUNT(*) FROM appointments 
-            WHERE doctor_id = ? 
-            AND scheduled_time < ? 
-            AND end_time > ?
-            AND status = 'scheduled'
-        ''', (doctor_id, appointment_end, scheduled_time))
+        cursor.execute(APPOINTMENT_OVERLAP_SQL, (doctor_id,
+                                                 appointment_end.strftime(TIMESTAMP_FORMAT),
+                                                 scheduled_time.strftime(TIMESTAMP_FORMAT)))
         
         if cursor.fetchone()[0] > 0:
             return False, "Time slot is already booked"
@@ -91,77 +222,71 @@ def validate_appointment_time(doctor_id: int, scheduled_time: datetime) -> tuple
 
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
+
+def _to_time_slots(day, intervals) -> List[TimeSlot]:
+    """Convert free minute intervals from the slot engine into TimeSlots"""
+    return [TimeSlot(minutes_to_datetime(day, start), minutes_to_datetime(day, end), True)
+            for start, end in intervals]
 
 def get_available_slots(doctor_id: int, date: datetime) -> List[TimeSlot]:
     """Get available appointment slots for a specific doctor and date"""
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
         # Get doctor's schedule
-        cursor.execute('''
-            SELECT working_days, working_hours 
-            FROM doctors 
-            WHERE doctor_id = ?
-        ''', (doctor_id,))
+        cursor.execute(DOCTOR_SCHEDULE_SQL, (doctor_id,))
         schedule = cursor.fetchone()
         
         if not schedule:
             return []
 
-        working_days, working_hours = schedule
-        
-        # Check if the doctor works on this day
-        if working_days and date.strftime('%A') not in working_days.split(','):
-            return []
+        # Get all appointments for the day
+        cursor.execute(DAY_BOOKINGS_SQL, (doctor_id, *day_range(date)))
+        bookings = BookingIndex.from_rows(cursor.fetchall())
 
-        # Get working hours
-        start_time, end_time = working_hours.split('-')
-        day_start = datetime.combine(date.date(), 
-                                   datetime.strptime(start_time, '%H:%M').time())
-        day_end = datetime.combine(date.date(), 
-                                  datetime.strptime(end_time, '%H:%M').time())
+        day = date.date()
+        free = free_slots_batch({doctor_id: schedule}, bookings, [day],
+                                WorkingHours.APPOINTMENT_DURATION)
+        return _to_time_slots(day, free.get((doctor_id, day), []))
 
-        # Get all appointments for the day
-        cursor.execute('''
-            SELECT scheduled_time, end_time 
-            FROM appointments 
-            WHERE doctor_id = ? 
-            AND date(scheduled_time) = date(?)
-            AND status = 'scheduled'
-            ORDER BY scheduled_time
-        ''', (doctor_id, date))
-        
-        booked_slots = cursor.fetchall()
+    finally:
+        cursor.close()
+        release_connection(conn)
 
-        # Generate available time slots
-        available_slots = []
-        current_time = day_start
+def get_available_slots_bulk(
+    schedules: Dict[int, tuple],
+    days: list
+) -> Dict[tuple, List[TimeSlot]]:
+    """Get available slots for many doctors and days with a single appointments query
 
-        while current_time + timedelta(minutes=WorkingHours.APPOINTMENT_DURATION) <= day_end:
-            slot_end = current_time + timedelta(minutes=WorkingHours.APPOINTMENT_DURATION)
-            
-            # Check if slot overlaps with any booked appointments
-            is_available = True
-            for booked_start, booked_end in booked_slots:
-                booked_start = datetime.strptime(booked_start, '%Y-%m-%d %H:%M:%S')
-                booked_end = datetime.strptime(booked_end, '%Y-%m-%d %H:%M:%S')
-                
-                if (current_time < booked_end and slot_end > booked_start):
-                    is_available = False
-                    break
+    Args:
+        schedules: doctor_id -> (working_days, working_hours)
+        days: Dates to search
 
-            if is_available:
-                available_slots.append(TimeSlot(current_time, slot_end, True))
-            
-            current_time = slot_end
+    Returns:
+        (doctor_id, date) -> available TimeSlots
+    """
+    if not schedules or not days:
+        return {}
 
-        return available_slots
+    conn = acquire_connection()
+    cursor = conn.cursor()
+
+    try:
+        window_start, window_end = day_range(min(days), (max(days) - min(days)).days + 1)
+        doctor_ids = list(schedules)
+        cursor.execute(BULK_BOOKINGS_SQL.format(doctor_ids=', '.join('?' * len(doctor_ids))),
+                       (*doctor_ids, window_start, window_end))
+        bookings = BookingIndex.from_rows(cursor.fetchall())
+
+        free = free_slots_batch(schedules, bookings, days, WorkingHours.APPOINTMENT_DURATION)
+        return {key: _to_time_slots(key[1], intervals) for key, intervals in free.items()}
 
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 # 患者信息相关工具
 @tool
@@ -172,39 +297,22 @@ def fetch_patient_info(*, config: RunnableConfig) -> dict:
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
         # Get patient basic info
-        cursor.execute('''
-            SELECT * FROM patients WHERE patient_id = ?
-        ''', (patient_id,))
+        cursor.execute(PATIENT_SQL, (patient_id,))
         patient_info = cursor.fetchone()
         if not patient_info:
             return {"error": "Patient not found"}
 
         # Get recent appointments
-        cursor.execute('''
-            SELECT a.*, d.name as doctor_name, dep.name as department_name
-            FROM appointments a
-            JOIN doctors d ON a.doctor_id = d.doctor_id
-            JOIN departments dep ON a.department_id = dep.department_id
-            WHERE a.patient_id = ?
-            ORDER BY a.scheduled_time DESC
-            LIMIT 5
-        ''', (patient_id,))
+        cursor.execute(RECENT_APPOINTMENTS_SQL, (patient_id,))
         appointments = cursor.fetchall()
 
         # Get recent medical records
-        cursor.execute('''
-            SELECT m.*, d.name as doctor_name
-            FROM medical_records m
-            JOIN doctors d ON m.doctor_id = d.doctor_id
-            WHERE m.patient_id = ?
-            ORDER BY m.visit_date DESC
-            LIMIT 5
-        ''', (patient_id,))
+        cursor.execute(RECENT_RECORDS_SQL, (patient_id,))
         records = cursor.fetchall()
 
         return {
@@ -228,7 +336,7 @@ def fetch_patient_info(*, config: RunnableConfig) -> dict:
         }
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 # 科室查询工具
 @tool
@@ -237,19 +345,19 @@ def search_departments(
     is_active: bool = True
 ) -> list[dict]:
     """Search for hospital departments"""
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
-        query = "SELECT * FROM departments WHERE 1=1"
+        query = SEARCH_DEPARTMENTS_SQL
         params = []
 
         if name:
-            query += " AND name LIKE ?"
+            query += SEARCH_DEPARTMENTS_FILTERS["name"]
             params.append(f"%{name}%")
         
         if is_active:
-            query += " AND is_active = 1"
+            query += SEARCH_DEPARTMENTS_FILTERS["is_active"]
 
         cursor.execute(query, params)
         departments = cursor.fetchall()
@@ -260,7 +368,7 @@ def search_departments(
             dept)) for dept in departments]
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 # 医生查询工具
 @tool
@@ -271,32 +379,27 @@ def search_doctors(
     is_active: bool = True
 ) -> list[dict]:
     """Search for doctors based on various criteria"""
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
-        query = """
-            SELECT d.*, dep.name as department_name 
-            FROM doctors d
-            JOIN departments dep ON d.department_id = dep.department_id 
-            WHERE 1=1
-        """
+        query = SEARCH_DOCTORS_SQL
         params = []
 
         if department:
-            query += " AND dep.name LIKE ?"
+            query += SEARCH_DOCTORS_FILTERS["department"]
             params.append(f"%{department}%")
         
         if name:
-            query += " AND d.name LIKE ?"
+            query += SEARCH_DOCTORS_FILTERS["name"]
             params.append(f"%{name}%")
         
         if specialty:
-            query += " AND d.specialty LIKE ?"
+            query += SEARCH_DOCTORS_FILTERS["specialty"]
             params.append(f"%{specialty}%")
         
         if is_active:
-            query += " AND d.is_active = 1"
+            query += SEARCH_DOCTORS_FILTERS["is_active"]
 
         cursor.execute(query, params)
         doctors = cursor.fetchall()
@@ -308,7 +411,7 @@ def search_doctors(
             doc)) for doc in doctors]
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 # 预约相关工具
 @tool
@@ -319,41 +422,41 @@ def search_available_appointments(
     end_date: Optional[datetime] = None
 ) -> list[dict]:
     """Search for available appointment slots"""
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
         # Build query to get relevant doctors
-        query = """
-            SELECT d.doctor_id, d.name, d.specialty, d.working_days, d.working_hours,
-                   dep.name as department_name
-            FROM doctors d
-            JOIN departments dep ON d.department_id = dep.department_id
-            WHERE d.is_active = 1
-        """
+        query = AVAILABLE_DOCTORS_SQL
         params = []
 
         if department:
-            query += " AND dep.name LIKE ?"
+            query += AVAILABLE_DOCTORS_FILTERS["department"]
             params.append(f"%{department}%")
         
         if doctor_id:
-            query += " AND d.doctor_id = ?"
+            query += AVAILABLE_DOCTORS_FILTERS["doctor_id"]
             params.append(doctor_id)
 
         cursor.execute(query, params)
         doctors = cursor.fetchall()
 
-        # For each doctor, get available slots
+        # Compute every doctor's slots for the whole window at once
         available_appointments = []
         current_date = start_date or datetime.now()
         end_date = end_date or (current_date + timedelta(days=7))
+        days = []
+        while current_date <= end_date:
+            days.append(current_date.date())
+            current_date += timedelta(days=1)
+
+        slots_by_day = get_available_slots_bulk(
+            {doctor[0]: (doctor[3], doctor[4]) for doctor in doctors}, days)
 
         for doctor in doctors:
             doctor_id = doctor[0]
-            while current_date <= end_date:
-                slots = get_available_slots(doctor_id, current_date)
-                for slot in slots:
+            for day in days:
+                for slot in slots_by_day.get((doctor_id, day), []):
                     available_appointments.append({
                         "doctor_id": doctor_id,
                         "doctor_name": doctor[1],
@@ -363,13 +466,12 @@ def search_available_appointments(
                         "start_time": slot.start_time.strftime('%H:%M'),
                         "end_time": slot.end_time.strftime('%H:%M')
                     })
-                current_date += timedelta(days=1)
 
         return available_appointments
 
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 @tool
 def book_appointment(
@@ -386,10 +488,11 @@ def book_appointment(
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
+        begin_immediate(conn)
         # Validate appointment time
         is_valid, message = validate_appointment_time(doctor_id, scheduled_time)
         if not is_valid:
@@ -425,7 +528,7 @@ def book_appointment(
         return f"Failed to book appointment: {str(e)}"
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 @tool
 def update_appointment(
@@ -441,15 +544,13 @@ def update_appointment(
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
+        begin_immediate(conn)
         # Verify appointment exists and belongs to patient
-        cursor.execute('''
-            SELECT status FROM appointments 
-            WHERE appointment_id = ? AND patient_id = ?
-        ''', (appointment_id, patient_id))
+        cursor.execute(APPOINTMENT_STATUS_SQL, (appointment_id, patient_id))
         
         result = cursor.fetchone()
         if not result:
@@ -511,7 +612,7 @@ def update_appointment(
         return f"Failed to update appointment: {str(e)}"
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 @tool
 def cancel_appointment(
@@ -526,16 +627,13 @@ def cancel_appointment(
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
+        begin_immediate(conn)
         # Verify appointment exists and belongs to patient
-        cursor.execute('''
-            SELECT scheduled_time, status 
-            FROM appointments 
-            WHERE appointment_id = ? AND patient_id = ?
-        ''', (appointment_id, patient_id))
+        cursor.execute(CANCELLATION_CHECK_SQL, (appointment_id, patient_id))
         
         result = cursor.fetchone()
         if not result:
@@ -552,13 +650,7 @@ def cancel_appointment(
             return "Cannot cancel appointments less than 24 hours before scheduled time."
 
         # Cancel appointment
-        cursor.execute('''
-            UPDATE appointments 
-            SET status = 'cancelled', 
-                cancelled_reason = ?,
-                last_updated = CURRENT_TIMESTAMP
-            WHERE appointment_id = ? AND patient_id = ?
-        ''', (reason, appointment_id, patient_id))
+        cursor.execute(CANCEL_APPOINTMENT_SQL, (reason, appointment_id, patient_id))
         
         conn.commit()
         return "Appointment successfully cancelled"
@@ -568,7 +660,7 @@ def cancel_appointment(
         return f"Failed to cancel appointment: {str(e)}"
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 
 @tool
@@ -579,20 +671,11 @@ def get_upcoming_appointments(*, config: RunnableConfig) -> list[dict]:
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute('''
-            SELECT a.*, d.name as doctor_name, dep.name as department_name
-            FROM appointments a
-            JOIN doctors d ON a.doctor_id = d.doctor_id
-            JOIN departments dep ON a.department_id = dep.department_id
-            WHERE a.patient_id = ?
-            AND a.scheduled_time > CURRENT_TIMESTAMP
-            AND a.status = 'scheduled'
-            ORDER BY a.scheduled_time ASC
-        ''', (patient_id,))
+        cursor.execute(UPCOMING_APPOINTMENTS_SQL, (patient_id,))
         
         appointments = cursor.fetchall()
 
@@ -604,7 +687,7 @@ def get_upcoming_appointments(*, config: RunnableConfig) -> list[dict]:
             appt)) for appt in appointments]
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 
 @tool
@@ -620,25 +703,19 @@ def search_medical_records(
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
-        query = """
-            SELECT m.*, d.name as doctor_name, dep.name as department_name
-            FROM medical_records m
-            JOIN doctors d ON m.doctor_id = d.doctor_id
-            JOIN departments dep ON d.department_id = dep.department_id
-            WHERE m.patient_id = ?
-        """
+        query = SEARCH_RECORDS_SQL
         params = [patient_id]
 
         if start_date:
-            query += " AND m.visit_date >= ?"
+            query += VISIT_DATE_FILTERS["start_date"]
             params.append(start_date.strftime('%Y-%m-%d'))
         if end_date:
-            query += " AND m.visit_date <= ?"
-            params.append(end_date.strftime('%Y-%m-%d'))
+            query += VISIT_DATE_FILTERS["end_date"]
+            params.append((end_date + timedelta(days=1)).strftime('%Y-%m-%d'))
 
         query += " ORDER BY m.visit_date DESC"
         
@@ -653,7 +730,7 @@ def search_medical_records(
             record)) for record in records]
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 
 @tool
@@ -673,15 +750,13 @@ def submit_doctor_review(
     if not (1 <= rating <= 5):
         return "Rating must be between 1 and 5"
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
+        begin_immediate(conn)
         # Verify patient has had an appointment with this doctor
-        cursor.execute('''
-            SELECT COUNT(*) FROM appointments
-            WHERE patient_id = ? AND doctor_id = ? AND status = 'completed'
-        ''', (patient_id, doctor_id))
+        cursor.execute(REVIEW_ELIGIBILITY_SQL, (patient_id, doctor_id))
         
         if cursor.fetchone()[0] == 0:
             return "You can only review doctors you have had appointments with"
@@ -701,7 +776,7 @@ def submit_doctor_review(
         return f"Failed to submit review: {str(e)}"
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 
 @tool
@@ -717,28 +792,19 @@ def get_medical_expenses(
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
-        query = """
-            SELECT m.visit_date, m.treatment, m.prescriptions,
-                   d.name as doctor_name, dep.name as department_name,
-                   b.amount, b.insurance_coverage, b.patient_payment
-            FROM medical_records m
-            JOIN doctors d ON m.doctor_id = d.doctor_id
-            JOIN departments dep ON d.department_id = dep.department_id
-            JOIN billing b ON m.record_id = b.record_id
-            WHERE m.patient_id = ?
-        """
+        query = MEDICAL_EXPENSES_SQL
         params = [patient_id]
 
         if start_date:
-            query += " AND m.visit_date >= ?"
+            query += VISIT_DATE_FILTERS["start_date"]
             params.append(start_date.strftime('%Y-%m-%d'))
         if end_date:
-            query += " AND m.visit_date <= ?"
-            params.append(end_date.strftime('%Y-%m-%d'))
+            query += VISIT_DATE_FILTERS["end_date"]
+            params.append((end_date + timedelta(days=1)).strftime('%Y-%m-%d'))
 
         cursor.execute(query, params)
         expenses = cursor.fetchall()
@@ -756,4 +822,4 @@ def get_medical_expenses(
         }
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
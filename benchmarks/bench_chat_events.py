@@ -0,0 +1,84 @@
+"""Per-turn cost of /chat event processing as conversation history grows.
+
+Compares the old stream_mode="values" loop, which rescans the whole message
+list after every step, with the delta-only run_chat_turn path. A fake graph
+stands in for hospital_support_graph so no LLM or API keys are needed.
+
+    python -m benchmarks.bench_chat_events
+"""
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from chat_events import run_chat_turn
+
+class FakeGraph:
+    """Emits one assistant tool call, its result and a reply per turn"""
+
+    def __init__(self, history_length: int):
+        self.history = []
+        for i in range(history_length):
+            self.history.append(HumanMessage(content=f"question {i}", id=str(uuid.uuid4())))
+
+    def _turn_messages(self, message):
+        call_id = str(uuid.uuid4())
+        return [
+            ("primary_assistant", AIMessage(
+                content="", id=str(uuid.uuid4()),
+                tool_calls=[{"id": call_id, "name": "search_doctors", "args": {}}])),
+            ("primary_assistant_tools", ToolMessage(
+                content="[]", tool_call_id=call_id, id=str(uuid.uuid4()))),
+            ("primary_assistant", AIMessage(content=f"answer to {message}", id=str(uuid.uuid4()))),
+        ]
+
+    def stream(self, input, config, stream_mode):
+        role, text = input["messages"]
+        self.history.append(HumanMessage(content=text, id=str(uuid.uuid4())))
+        if stream_mode == "values":
+            yield {"messages": list(self.history)}
+        for node, message in self._turn_messages(text):
+            self.history.append(message)
+            if stream_mode == "values":
+                yield {"messages": list(self.history)}
+            else:
+                yield {node: {"messages": message}}
+
+def legacy_values_turn(graph, message, config, printed):
+    """The /chat loop before delta processing"""
+    responses = []
+    for event in graph.stream({"messages": ("user", message)}, config, stream_mode="values"):
+        messages = event.get("messages")
+        if messages:
+            for msg in messages if isinstance(messages, list) else [messages]:
+                msg_id = msg.id if hasattr(msg, 'id') else None
+                if msg_id and msg_id in printed:
+                    continue
+                content = msg.content if hasattr(msg, 'content') else str(msg)
+                if hasattr(msg, 'tool_calls') and msg.tool_calls:
+                    for tool_call in msg.tool_calls:
+                        responses.append({'tool_call_id': tool_call['id'], 'content': content})
+                else:
+                    responses.append(content)
+                if msg_id:
+                    printed.add(msg_id)
+    return responses
+
+def time_turn(turn, history_length: int, turns: int = 20) -> float:
+    """Mean milliseconds per turn after the history has been seen once"""
+    graph = FakeGraph(history_length)
+    printed = {msg.id for msg in graph.history}
+    start = time.perf_counter()
+    for i in range(turns):
+        turn(graph, f"message {i}", {}, printed)
+    return (time.perf_counter() - start) / turns * 1000
+
+def main():
+    print(f"{'history':>8} {'values (ms/turn)':>18} {'updates (ms/turn)':>18}")
+    for history_length in (10, 100, 1000, 10000):
+        legacy = time_turn(legacy_values_turn, history_length)
+        delta = time_turn(run_chat_turn, history_length)
+        print(f"{history_length:>8} {legacy:>18.3f} {delta:>18.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Per-request construction cost of MedicalDiagnosisCrew.
+
+Compares building a fresh crew (a new ChatOpenAI client and every specialist
+Agent) for each request, as /run_diagnosis used to, with borrowing a prebuilt
+crew from crew_pool. No LLM calls are made; a placeholder API key is set when
+OPENAI_API_KEY is missing so the clients can be constructed offline.
+
+    python -m benchmarks.bench_crew_pool
+"""
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from multiagent import CrewPool, MedicalDiagnosisCrew
+
+REQUESTS = 50
+
+def fresh_crew(model_name, temperature):
+    return MedicalDiagnosisCrew(model_name=model_name, temperature=temperature)
+
+def measure(label, run):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {elapsed / REQUESTS * 1000:9.2f} ms/request  peak {peak / 1024:9.1f} KiB")
+
+def main():
+    pool = CrewPool(max_idle=4)
+
+    start = time.perf_counter()
+    pool.warm("gpt-4o-mini", 0.7)
+    print(f"pool warm-up           {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+    def borrow():
+        with pool.crew("gpt-4o-mini", 0.7):
+            pass
+
+    measure("new crew per request", lambda: fresh_crew("gpt-4o-mini", 0.7))
+    measure("pooled crew", borrow)
+    print(pool.stats())
+
+if __name__ == "__main__":
+    main()
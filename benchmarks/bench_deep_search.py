@@ -0,0 +1,86 @@
+"""Deep search research time with a cold and a warm search cache.
+
+Runs the deep_search graph over a few clinical topics against
+StubSearchClient with a simulated search round trip and a fake LLM, so no
+API keys or network are needed. The second pass repeats the same topics,
+as when a clinician reruns a research question, and is served from the
+search cache. The last line searches three queries per loop instead of one.
+
+    python -m benchmarks.bench_deep_search
+"""
+import json
+import os
+import tempfile
+import time
+
+import deep_search.graph as deep_search_graph
+from deep_search import utils
+from deep_search.search_cache import SearchCache, SearchCacheSettings
+from deep_search.search_stub import StubSearchClient
+
+SEARCH_LATENCY_SECONDS = 0.3
+LLM_LATENCY_SECONDS = 0.02
+LOOPS = 2
+TOPICS = [
+    "first-line treatment of community-acquired pneumonia in adults",
+    "anticoagulation after atrial fibrillation ablation",
+    "screening intervals for diabetic retinopathy",
+]
+
+class FakeReply:
+    def __init__(self, content):
+        self.content = content
+
+class FakeLLM:
+    """Answers each deep_search prompt with a deterministic reply"""
+
+    def invoke(self, messages):
+        time.sleep(LLM_LATENCY_SECONDS)
+        system, human = messages[0].content, messages[1].content
+        topic = next((t for t in TOPICS if t in system or t in human), "topic")
+        if "follow_up_queries" in system:
+            return FakeReply(json.dumps({
+                "knowledge_gaps": ["dosing", "outcomes", "guidelines"],
+                "follow_up_queries": [f"{topic} {aspect} {len(human) % 7}"
+                                      for aspect in ("dosing", "outcomes", "guidelines")]
+            }))
+        if "follow_up_query" in system:
+            return FakeReply(json.dumps({"knowledge_gap": "dosing",
+                                         "follow_up_query": f"{topic} dosing {len(human) % 7}"}))
+        if '"queries"' in system:
+            return FakeReply(json.dumps({"queries": [
+                {"query": f"{topic} {aspect}"} for aspect in ("overview", "evidence", "risks")]}))
+        if '"query"' in system:
+            return FakeReply(json.dumps({"query": f"{topic} overview"}))
+        return FakeReply(f"Summary of {topic} from {human.count('URL:')} sources.")
+
+def run(label, client, queries_per_loop=1):
+    config = {"configurable": {
+        "llm_provider": "gpt",
+        "search_api": "tavily",
+        "max_web_research_loops": LOOPS,
+        "queries_per_loop": queries_per_loop,
+    }}
+    before = client.calls.get("search", 0)
+    start = time.perf_counter()
+    for topic in TOPICS:
+        deep_search_graph.graph.invoke({"research_topic": topic}, config=config)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18} {elapsed / len(TOPICS):6.2f} s/topic  "
+          f"search API calls {client.calls.get('search', 0) - before}")
+
+def main():
+    deep_search_graph.get_llm = lambda configurable, temperature=0, format=None: FakeLLM()
+    client = StubSearchClient(latency_seconds=SEARCH_LATENCY_SECONDS)
+    utils.set_search_client(client)
+    with tempfile.TemporaryDirectory() as tmp:
+        utils.search_cache = SearchCache(SearchCacheSettings(path=os.path.join(tmp, "search.sqlite")))
+        run("cold cache", client)
+        run("warm cache", client)
+        print(utils.search_cache.stats())
+
+        utils.search_cache = SearchCache(SearchCacheSettings(path=os.path.join(tmp, "search-3.sqlite")))
+        run("3 queries per loop", client, queries_per_loop=3)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Parking reservations under a morning-rush burst of concurrent bookings.
+
+Many threads book overlapping 1-3 hour stays in one area at once, first
+with the old query (find a spot with no reservation *starting* inside the
+window, then insert) and then through SpotAllocator. Reports throughput
+and how many pairs of reservations ended up sharing a spot. Finally books
+the same stays one transaction each and as a single allocate_many batch.
+
+Runs against a throwaway database holding only the parking tables.
+
+    python -m benchmarks.bench_parking_allocator
+"""
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from hospital_db import (acquire_connection, release_connection, begin_immediate,
+                         close_connection, configure_database, TIMESTAMP_FORMAT)
+from parking_allocator import SpotAllocator, SpotRequest
+
+THREAD_COUNTS = [1, 4, 16]
+REQUESTS = 400
+SPOTS = 60
+AREA_ID = 1
+
+SCHEMA = '''
+    CREATE TABLE parking_facilities (
+        area_id INTEGER PRIMARY KEY, level TEXT, total_spaces INTEGER,
+        parking_type TEXT, hourly_rate REAL);
+    CREATE TABLE parking_spots (
+        spot_id INTEGER PRIMARY KEY, area_id INTEGER, level TEXT,
+        spot_number TEXT, type TEXT, status TEXT);
+    CREATE TABLE parking_reservations (
+        reservation_id INTEGER PRIMARY KEY, area_id INTEGER, spot_id INTEGER,
+        patient_id INTEGER, reservation_time TIMESTAMP, duration_hours INTEGER,
+        total_cost REAL, status TEXT, created_at TIMESTAMP, cancelled_at TIMESTAMP);
+    CREATE INDEX idx_parking_reservations_spot_time ON parking_reservations(spot_id, reservation_time);
+    CREATE INDEX idx_parking_reservations_area_time ON parking_reservations(area_id, reservation_time);
+'''
+
+def setup(path):
+    configure_database(path=path, auto_migrate=False)
+    conn = acquire_connection()
+    try:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO parking_facilities VALUES (?, 'A', ?, 'standard', 2.0)", (AREA_ID, SPOTS))
+        conn.executemany(
+            "INSERT INTO parking_spots VALUES (?, ?, 'A', ?, 'standard', 'available')",
+            [(i, AREA_ID, f"1A{i:02d}") for i in range(1, SPOTS + 1)])
+        conn.commit()
+    finally:
+        release_connection(conn)
+
+def workload(seed=11):
+    rng = random.Random(seed)
+    morning = (datetime.now() + timedelta(days=1)).replace(hour=7, minute=0, second=0, microsecond=0)
+    return [(morning + timedelta(minutes=15 * rng.randrange(16)), rng.randint(1, 3))
+            for _ in range(REQUESTS)]
+
+def insert(cursor, spot_id, start, hours):
+    cursor.execute('''
+        INSERT INTO parking_reservations (
+            area_id, spot_id, patient_id, reservation_time,
+            duration_hours, total_cost, status, created_at
+        ) VALUES (?, ?, 1, ?, ?, ?, 'confirmed', CURRENT_TIMESTAMP)
+    ''', (AREA_ID, spot_id, start.strftime(TIMESTAMP_FORMAT), hours, 2.0 * hours))
+    return cursor.lastrowid
+
+def legacy_reserve(start, hours):
+    conn = acquire_connection()
+    cursor = conn.cursor()
+    try:
+        begin_immediate(conn)
+        cursor.execute('''
+            SELECT ps.spot_id FROM parking_spots ps
+            LEFT JOIN parking_reservations pr
+                ON ps.spot_id = pr.spot_id
+                AND pr.reservation_time >= ? AND pr.reservation_time < ?
+            WHERE ps.area_id = ? AND ps.type = 'standard' AND ps.status = 'available'
+            AND pr.reservation_id IS NULL
+            LIMIT 1
+        ''', (start.strftime(TIMESTAMP_FORMAT),
+              (start + timedelta(hours=hours)).strftime(TIMESTAMP_FORMAT), AREA_ID))
+        spot = cursor.fetchone()
+        if spot is None:
+            return None
+        reservation_id = insert(cursor, spot[0], start, hours)
+        conn.commit()
+        return reservation_id
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+def double_bookings():
+    conn = acquire_connection()
+    try:
+        return conn.execute('''
+            SELECT COUNT(*) FROM parking_reservations a
+            JOIN parking_reservations b
+                ON a.spot_id = b.spot_id AND a.reservation_id < b.reservation_id
+            WHERE a.reservation_time < datetime(b.reservation_time, '+' || b.duration_hours || ' hours')
+            AND b.reservation_time < datetime(a.reservation_time, '+' || a.duration_hours || ' hours')
+        ''').fetchone()[0]
+    finally:
+        release_connection(conn)
+
+def run(label, threads, reserve):
+    requests = workload()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        booked = sum(1 for result in pool.map(lambda r: reserve(*r), requests) if result is not None)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {threads:3d} threads {REQUESTS / elapsed:8.0f} requests/s  booked {booked:4d}  "
+          f"double-booked pairs {double_bookings()}")
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for threads in THREAD_COUNTS:
+            setup(os.path.join(tmp, f"legacy-{threads}.sqlite"))
+            run("legacy", threads, legacy_reserve)
+
+            setup(os.path.join(tmp, f"allocator-{threads}.sqlite"))
+            allocator = SpotAllocator()
+            run("allocator", threads, lambda start, hours: allocator.allocate(
+                AREA_ID, "standard", start, hours,
+                lambda cursor, spot: insert(cursor, spot.spot_id, start, hours)))
+
+        requests = [SpotRequest(AREA_ID, "standard", start, hours) for start, hours in workload()]
+        setup(os.path.join(tmp, "single.sqlite"))
+        allocator = SpotAllocator()
+        start = time.perf_counter()
+        booked = sum(1 for r in requests if allocator.allocate(
+            r.area_id, r.spot_type, r.start, r.duration_hours,
+            lambda cursor, spot: insert(cursor, spot.spot_id, r.start, r.duration_hours)) is not None)
+        print(f"one by one {time.perf_counter() - start:8.3f} s  booked {booked:4d}")
+
+        setup(os.path.join(tmp, "bulk.sqlite"))
+        allocator = SpotAllocator()
+        start = time.perf_counter()
+        results = allocator.allocate_many(
+            requests, lambda cursor, r, spot: insert(cursor, spot.spot_id, r.start, r.duration_hours))
+        booked = sum(1 for result in results if result is not None)
+        print(f"bulk       {time.perf_counter() - start:8.3f} s  booked {booked:4d}  "
+              f"double-booked pairs {double_bookings()}")
+        close_connection()
+
+if __name__ == "__main__":
+    main()
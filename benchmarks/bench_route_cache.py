@@ -0,0 +1,53 @@
+"""Directions lookup latency with and without the route cache.
+
+Replays a request mix where start addresses repeat (as when a patient asks
+twice in one conversation) against StubMapsClient with a simulated Google
+round trip, so no API key or network is needed.
+
+    python -m benchmarks.bench_route_cache
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import map_tools
+from maps_stub import StubMapsClient
+from route_cache import RouteCache, RouteCacheSettings
+
+LATENCY_SECONDS = 0.05
+REQUESTS = 200
+ADDRESSES = [f"{100 + i} N State St, Chicago, IL" for i in range(20)]
+MODES = ["driving", "driving", "transit", "walking"]
+
+def workload(seed=7):
+    rng = random.Random(seed)
+    for _ in range(REQUESTS):
+        address = rng.choice(ADDRESSES)
+        # Same address typed differently by the patient
+        if rng.random() < 0.3:
+            address = address.upper().replace(",", "")
+        yield rng.choice(["route", "eta"]), address, rng.choice(MODES)
+
+def run(label, cache):
+    client = StubMapsClient(latency_seconds=LATENCY_SECONDS)
+    map_tools.set_gmaps_client(client)
+    map_tools.route_cache = cache
+    now = datetime.now()
+    start = time.perf_counter()
+    for kind, address, mode in workload():
+        map_tools.cached_directions(kind, address, mode, now, alternatives=kind == "route")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed / REQUESTS * 1000:8.2f} ms/request  google calls {client.calls.get('directions', 0)}")
+    return cache.stats()
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "routes.sqlite")
+        run("uncached", RouteCache(RouteCacheSettings(enabled=False, path=path)))
+        stats = run("cached", RouteCache(RouteCacheSettings(path=path)))
+        print(stats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Import-time and memory report for the server entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter per
+module and summarises the output: total import time, peak RSS, the slowest
+imports by cumulative time and the top-level packages that cost the most
+self time. Run it before and after a change to see cold-start cost move.
+
+    python -m benchmarks.importtime_report
+    python -m benchmarks.importtime_report hospital_support_graph run_server --top 25
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+DEFAULT_MODULES = ["hospital_support_graph", "run_server"]
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+def profile(module):
+    """(import lines, peak RSS in KiB, error) for importing module in a fresh interpreter"""
+    code = f"import resource, {module}; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    imports = []
+    errors = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+        elif not line.startswith("import time:"):
+            errors.append(line)
+    rss = int(proc.stdout.strip().splitlines()[-1]) if proc.returncode == 0 else None
+    return imports, rss, "\n".join(errors[-5:]) if proc.returncode else None
+
+def report(module, top):
+    imports, rss, error = profile(module)
+    print(f"== {module}")
+    if error:
+        print(f"   import failed:\n{error}")
+        return
+    total_ms = sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000
+    print(f"   total import time {total_ms:9.1f} ms   peak RSS {rss / 1024:7.1f} MiB   modules {len(imports)}")
+
+    print("   slowest imports (cumulative):")
+    for name, _, cumulative, _ in sorted(imports, key=lambda i: i[2], reverse=True)[:top]:
+        print(f"     {cumulative / 1000:9.1f} ms  {name}")
+
+    packages = defaultdict(int)
+    for name, self_us, _, _ in imports:
+        packages[name.split(".")[0]] += self_us
+    print("   heaviest packages (self time):")
+    for name, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top]:
+        print(f"     {self_us / 1000:9.1f} ms  {name}")
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    for module in args.modules:
+        report(module, args.top)
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,6 @@ import asyncio
 import os
 from dataclasses import dataclass
 from typing import List, Optional
-from PyPDF2 import PdfReader
-import docx
-
-import gradio as gr
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from rich.console import Console
@@ -62,10 +58,12 @@ def read_file_content(file_obj) -> str:
 	content = ""
 	
 	if file_path.endswith('.pdf'):
+		from PyPDF2 import PdfReader
 		pdf = PdfReader(file_path)
 		for page in pdf.pages:
 			content += page.extract_text() or ''
 	elif file_path.endswith(('.doc', '.docx')):
+		import docx
 		doc = docx.Document(file_path)
 		content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
 	else:
@@ -150,6 +148,9 @@ async def run_browser_task(
 
 
 def create_ui():
+	# gradio is only needed for the standalone UI, not when run as a server job
+	import gradio as gr
+
 	with gr.Blocks(title='Browser Use GUI') as interface:
 		gr.Markdown('# Browser Use Task Automation')
 
@@ -0,0 +1,162 @@
+import hmac
+import json
+import os
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+# Stream modes used by the streaming chat endpoints: "messages" carries LLM
+# token deltas as they are generated, "updates" carries each node's output
+# once the node finishes.
+STREAM_MODES = ["messages", "updates"]
+
+ChatEvent = Tuple[str, Dict]
+
+def token_event(chunk: Tuple) -> List[ChatEvent]:
+    """Turn a ("messages" mode) token chunk into a token event"""
+    message, metadata = chunk
+    if not isinstance(message, AIMessageChunk):
+        return []
+    if not isinstance(message.content, str) or not message.content:
+        return []
+    return [("token", {
+        "id": message.id,
+        "node": metadata.get("langgraph_node"),
+        "content": message.content
+    })]
+
+def message_events(message, node: str, printed) -> List[ChatEvent]:
+    """Events for one completed message"""
+    msg_id = getattr(message, 'id', None)
+    events = []
+    if isinstance(message, ToolMessage):
+        events.append(("tool_result", {
+            "tool_call_id": message.tool_call_id,
+            "name": message.name,
+            "node": node,
+            "content": message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+        }))
+    elif isinstance(message, AIMessage):
+        for tool_call in message.tool_calls:
+            events.append(("tool_call", {
+                "id": tool_call["id"],
+                "name": tool_call["name"],
+                "args": tool_call["args"],
+                "node": node
+            }))
+        if message.content:
+            events.append(("message", {"id": msg_id, "node": node, "content": message.content}))
+
+    if msg_id:
+        printed.add(msg_id)
+    return events
+
+def new_messages(chunk: Dict, printed) -> Iterator[Tuple[str, object]]:
+    """(node, message) for each message in an "updates" chunk not yet sent.
+
+    Update chunks only carry what a node just produced, so this work is
+    proportional to the new messages rather than to the conversation length.
+    """
+    for node, update in chunk.items():
+        if not isinstance(update, dict):
+            continue
+        messages = update.get("messages") or []
+        if not isinstance(messages, list):
+            messages = [messages]
+        for message in messages:
+            msg_id = getattr(message, 'id', None)
+            if msg_id and msg_id in printed:
+                continue
+            yield node, message
+
+def update_events(chunk: Dict, printed) -> List[ChatEvent]:
+    """Events for an "updates" mode chunk of {node: state update}"""
+    events = []
+    for node, message in new_messages(chunk, printed):
+        events.extend(message_events(message, node, printed))
+    return events
+
+def response_items(message) -> List:
+    """The /chat JSON response entries for one message"""
+    content = message.content if hasattr(message, 'content') else str(message)
+    if hasattr(message, 'tool_calls') and message.tool_calls:
+        return [{'tool_call_id': tool_call['id'], 'content': content}
+                for tool_call in message.tool_calls]
+    return [content]
+
+def is_clinician(token: Optional[str]) -> bool:
+    """Whether a request carries the clinician token set in HOSPITAL_CLINICIAN_TOKEN"""
+    expected = os.getenv("HOSPITAL_CLINICIAN_TOKEN")
+    return bool(expected and token) and hmac.compare_digest(token, expected)
+
+def turn_config(config: Dict, bypass_cache: bool) -> Dict:
+    """
+    The session config for one turn.
+
+    bypass_cache (fresh tool results instead of cached ones) applies to
+    this turn only and is never written back into the stored session.
+    """
+    return {**config, "configurable": {**config.get("configurable", {}), "bypass_cache": bypass_cache}}
+
+def run_chat_turn(graph, message: str, config: Dict, printed) -> List:
+    """Run one chat turn and collect the /chat responses from state deltas only"""
+    responses = []
+    for chunk in graph.stream(
+        {"messages": ("user", message)},
+        config,
+        stream_mode="updates"
+    ):
+        for _, msg in new_messages(chunk, printed):
+            responses.extend(response_items(msg))
+            msg_id = getattr(msg, 'id', None)
+            if msg_id:
+                printed.add(msg_id)
+    return responses
+
+def stream_chat_events(graph, message: str, config: Dict, printed) -> Iterator[ChatEvent]:
+    """Run one chat turn and yield events as soon as the graph produces them"""
+    for mode, chunk in graph.stream(
+        {"messages": ("user", message)},
+        config,
+        stream_mode=STREAM_MODES
+    ):
+        if mode == "messages":
+            yield from token_event(chunk)
+        else:
+            yield from update_events(chunk, printed)
+
+    # Sensitive tools are interrupted before they run and wait for approval
+    snapshot = graph.get_state(config)
+    yield "done", {"pending_approval": bool(snapshot.next)}
+
+async def arun_chat_turn(graph, message: str, config: Dict, printed) -> List:
+    """Async run_chat_turn, driving the graph with astream"""
+    responses = []
+    async for chunk in graph.astream(
+        {"messages": ("user", message)},
+        config,
+        stream_mode="updates"
+    ):
+        for _, msg in new_messages(chunk, printed):
+            responses.extend(response_items(msg))
+            msg_id = getattr(msg, 'id', None)
+            if msg_id:
+                printed.add(msg_id)
+    return responses
+
+async def astream_chat_events(graph, message: str, config: Dict, printed) -> AsyncIterator[ChatEvent]:
+    """Async stream_chat_events, driving the graph with astream"""
+    async for mode, chunk in graph.astream(
+        {"messages": ("user", message)},
+        config,
+        stream_mode=STREAM_MODES
+    ):
+        events = token_event(chunk) if mode == "messages" else update_events(chunk, printed)
+        for event in events:
+            yield event
+
+    snapshot = await graph.aget_state(config)
+    yield "done", {"pending_approval": bool(snapshot.next)}
+
+def format_sse(event: str, data: Dict) -> str:
+    """Serialise one event as a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,230 @@
+import asyncio
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+load_dotenv()
+
+@dataclass(frozen=True)
+class CheckpointSettings:
+    """Checkpoint backend selection and retention policy"""
+    backend: str = os.getenv("HOSPITAL_CHECKPOINTER", "sqlite")  # sqlite | memory
+    path: str = os.getenv("HOSPITAL_CHECKPOINT_DB", "checkpoints.sqlite")
+    max_age_hours: float = float(os.getenv("HOSPITAL_CHECKPOINT_MAX_AGE_HOURS", "72"))
+    max_threads: int = int(os.getenv("HOSPITAL_CHECKPOINT_MAX_THREADS", "10000"))
+    keep_per_thread: int = int(os.getenv("HOSPITAL_CHECKPOINT_KEEP_PER_THREAD", "3"))
+    # Compaction runs after this many writes or this many seconds, whichever
+    # comes first; every write itself is committed immediately
+    batch_size: int = int(os.getenv("HOSPITAL_CHECKPOINT_BATCH_SIZE", "16"))
+    batch_interval_seconds: float = float(os.getenv("HOSPITAL_CHECKPOINT_BATCH_INTERVAL", "1.0"))
+    eviction_interval_seconds: float = float(os.getenv("HOSPITAL_CHECKPOINT_EVICTION_INTERVAL", "300"))
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:  # langgraph-checkpoint-sqlite is optional
+    SqliteSaver = None
+
+if SqliteSaver is not None:
+
+    class BoundedSqliteSaver(SqliteSaver):
+        """SqliteSaver with batched retention maintenance.
+
+        Every put/put_writes commits before returning, so other workers
+        sharing the database see a checkpoint as soon as it is written and
+        no write lock is held between calls. Only the bookkeeping is batched:
+        once batch_size writes or batch_interval_seconds have accumulated,
+        threads written since the last run are compacted to their newest
+        keep_per_thread checkpoints, and at most every
+        eviction_interval_seconds whole threads are evicted once idle longer
+        than max_age_hours or beyond the newest max_threads.
+        """
+
+        def __init__(self, conn: sqlite3.Connection, settings: CheckpointSettings, **kwargs):
+            super().__init__(conn, **kwargs)
+            self.settings = settings
+            self._pending = 0
+            self._last_maintenance = time.monotonic()
+            self._last_eviction = 0.0
+            self._touched = {}
+
+        @classmethod
+        def from_settings(cls, settings: CheckpointSettings) -> "BoundedSqliteSaver":
+            conn = sqlite3.connect(settings.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            saver = cls(conn, settings)
+            saver.start_maintenance()
+            atexit.register(saver.maintain)
+            return saver
+
+        def start_maintenance(self) -> None:
+            """Compact recently written threads in the background once they are batch_interval old"""
+            def run():
+                while True:
+                    time.sleep(self.settings.batch_interval_seconds)
+                    try:
+                        if self._pending or self._touched:
+                            self.maintain()
+                    except Exception as e:
+                        print(f"Warning: checkpoint maintenance failed: {str(e)}")
+
+            threading.Thread(target=run, name="checkpoint-maintenance", daemon=True).start()
+
+        def setup(self) -> None:
+            if self.is_setup:
+                return
+            super().setup()
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS checkpoint_threads (
+                    thread_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_checkpoint_threads_updated
+                ON checkpoint_threads(updated_at);
+            ''')
+            self.conn.commit()
+
+        @contextmanager
+        def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+            with self.lock:
+                self.setup()
+                cur = self.conn.cursor()
+                try:
+                    yield cur
+                finally:
+                    if transaction:
+                        self.conn.commit()
+                        self._pending += 1
+                        if (self._pending >= self.settings.batch_size
+                                or time.monotonic() - self._last_maintenance >= self.settings.batch_interval_seconds):
+                            self._maintain(cur)
+                    cur.close()
+
+        def put(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+            thread_id = str(config["configurable"]["thread_id"])
+            with self.lock:
+                self._touched[thread_id] = time.time()
+            return super().put(config, checkpoint, metadata, new_versions)
+
+        def maintain(self) -> None:
+            """Run pending compaction (and eviction, when due) now"""
+            with self.lock:
+                self.setup()
+                cur = self.conn.cursor()
+                try:
+                    self._maintain(cur)
+                finally:
+                    cur.close()
+
+        def _maintain(self, cur: sqlite3.Cursor) -> None:
+            # Called with self.lock held and no transaction open; commits its own
+            # short transaction so the write lock is never held between calls.
+            # Errors are only logged: the checkpoint itself is already committed
+            touched, self._touched = self._touched, {}
+            now = time.monotonic()
+            # Either way, the next run is a batch_interval away
+            self._pending = 0
+            self._last_maintenance = now
+            evict = now - self._last_eviction >= self.settings.eviction_interval_seconds
+            try:
+                cur.executemany(
+                    "INSERT OR REPLACE INTO checkpoint_threads (thread_id, updated_at) VALUES (?, ?)",
+                    touched.items()
+                )
+                for thread_id in touched:
+                    self._compact_thread(cur, thread_id)
+                if evict:
+                    self._evict(cur)
+                self.conn.commit()
+            except Exception as e:
+                # Release the write lock; the background thread retries these threads
+                self.conn.rollback()
+                self._touched = {**touched, **self._touched}
+                print(f"Warning: checkpoint compaction failed, retrying later: {str(e)}")
+                return
+            if evict:
+                self._last_eviction = now
+
+        def _compact_thread(self, cur: sqlite3.Cursor, thread_id: str) -> None:
+            """Drop all but the newest checkpoints (and their writes) of a thread"""
+            cur.execute('''
+                DELETE FROM checkpoints
+                WHERE thread_id = ?
+                AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints c
+                    WHERE c.thread_id = checkpoints.thread_id
+                    AND c.checkpoint_ns = checkpoints.checkpoint_ns
+                    ORDER BY checkpoint_id DESC
+                    LIMIT ?
+                )
+            ''', (thread_id, self.settings.keep_per_thread))
+            if cur.rowcount:
+                cur.execute('''
+                    DELETE FROM writes
+                    WHERE thread_id = ?
+                    AND NOT EXISTS (
+                        SELECT 1 FROM checkpoints c
+                        WHERE c.thread_id = writes.thread_id
+                        AND c.checkpoint_ns = writes.checkpoint_ns
+                        AND c.checkpoint_id = writes.checkpoint_id
+                    )
+                ''', (thread_id,))
+
+        def _evict(self, cur: sqlite3.Cursor) -> None:
+            """Remove threads that are too old or beyond the thread cap"""
+            cutoff = time.time() - self.settings.max_age_hours * 3600
+            cur.execute('''
+                SELECT thread_id FROM checkpoint_threads WHERE updated_at < ?
+                UNION
+                SELECT thread_id FROM (
+                    SELECT thread_id FROM checkpoint_threads
+                    ORDER BY updated_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (cutoff, self.settings.max_threads))
+            expired = [(row[0],) for row in cur.fetchall()]
+            if not expired:
+                return
+            cur.executemany("DELETE FROM writes WHERE thread_id = ?", expired)
+            cur.executemany("DELETE FROM checkpoints WHERE thread_id = ?", expired)
+            cur.executemany("DELETE FROM checkpoint_threads WHERE thread_id = ?", expired)
+            print(f"Evicted {len(expired)} expired conversation thread(s) from checkpoints")
+
+        # SqliteSaver is sync-only; the async server runs the same calls in a worker thread
+        async def aget_tuple(self, *args, **kwargs):
+            return await asyncio.to_thread(self.get_tuple, *args, **kwargs)
+
+        async def alist(self, *args, **kwargs):
+            for item in await asyncio.to_thread(lambda: list(self.list(*args, **kwargs))):
+                yield item
+
+        async def aput(self, *args, **kwargs):
+            return await asyncio.to_thread(self.put, *args, **kwargs)
+
+        async def aput_writes(self, *args, **kwargs):
+            return await asyncio.to_thread(self.put_writes, *args, **kwargs)
+
+        def close(self) -> None:
+            self.maintain()
+            self.conn.close()
+
+def create_checkpointer(settings: Optional[CheckpointSettings] = None) -> BaseCheckpointSaver:
+    """Build the conversation checkpointer selected by HOSPITAL_CHECKPOINTER"""
+    settings = settings or CheckpointSettings()
+    if settings.backend == "memory":
+        return MemorySaver()
+    if settings.backend != "sqlite":
+        raise ValueError(f"Unsupported checkpointer backend: {settings.backend}")
+    if SqliteSaver is None:
+        print("Warning: langgraph-checkpoint-sqlite is not installed, falling back to MemorySaver")
+        return MemorySaver()
+    return BoundedSqliteSaver.from_settings(settings)
@@ -23,6 +23,18 @@ class Configuration:
     local_llm: str = "llama3.2"
     llm_provider: LLMProvider = LLMProvider.OLLAMA
     search_api: SearchAPI = SearchAPI.TAVILY
+    # Queries written per research loop; with more than one they are searched concurrently
+    queries_per_loop: int = 1
+    max_search_concurrency: int = 4
+    # Token budgets, measured with the tokenizer in tokens.py
+    max_prompt_tokens: int = 6000
+    max_tokens_per_source: int = 1000
+
+    def __post_init__(self):
+        # Values read from the environment arrive as strings
+        for name in ("max_web_research_loops", "queries_per_loop", "max_search_concurrency",
+                     "max_prompt_tokens", "max_tokens_per_source"):
+            setattr(self, name, int(getattr(self, name)))
 
     @classmethod
     def from_runnable_config(
@@ -1,4 +1,5 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 from typing_extensions import Literal
 
@@ -8,46 +9,124 @@ from langchain_ollama import ChatOllama
 from langgraph.graph import START, END, StateGraph
 
 from .configuration import Configuration, SearchAPI
-from .utils import deduplicate_and_format_sources, tavily_search, format_sources, perplexity_search
+from .utils import (deduplicate_and_format_sources, tavily_search, format_sources, perplexity_search,
+                    merge_search_responses)
 from .state import SummaryState, SummaryStateInput, SummaryStateOutput
-from .prompts import query_writer_instructions, summarizer_instructions, reflection_instructions
+from .prompts import (query_writer_instructions, summarizer_instructions, reflection_instructions,
+                      multi_query_writer_instructions, multi_reflection_instructions)
 from .llm import get_llm
+from .tokens import count_tokens, message_usage, truncate_to_tokens, usage_by_loop
+
+def parse_json_response(content: str):
+    """ Parse an LLM's JSON reply """
+    # 清理响应内容，移除可能的 Markdown 代码块
+    content = content.strip()
+    if content.startswith('```') and content.endswith('```'):
+        # 移除开头和结尾的 ```
+        content = content.split('\n', 1)[1].rsplit('\n', 1)[0]
+        # 如果还有 json 标记，也移除它
+        if content.startswith('json'):
+            content = content.split('\n', 1)[1]
+    return json.loads(content)
+
+def _distinct_queries(queries, limit: int):
+    """ Non-empty queries in order, without repeats, at most limit of them """
+    distinct = []
+    for query in queries:
+        query = query.get('query') if isinstance(query, dict) else query
+        if isinstance(query, str) and query.strip() and query.strip() not in distinct:
+            distinct.append(query.strip())
+    return distinct[:limit]
+
+def invoke_llm(llm, messages, state: SummaryState, node: str):
+    """ Call the LLM and record the call's prompt and completion tokens """
+    result = llm.invoke(messages)
+    usage = message_usage(result, "\n".join(message.content for message in messages))
+    return result, [{"loop": state.research_loop_count, "node": node, **usage}]
+
+def build_summary_prompt(research_topic: str, existing_summary, new_results: str, max_prompt_tokens: int) -> str:
+    """
+    Human message for summarize_sources, trimmed so that it and the system
+    prompt fit in max_prompt_tokens. New results keep at least half of the
+    room; the existing summary is only cut when it would leave them less.
+    """
+    def render(summary, results):
+        if summary:
+            return (
+                f"<User Input> \n {research_topic} \n <User Input>\n\n"
+                f"<Existing Summary> \n {summary} \n <Existing Summary>\n\n"
+                f"<New Search Results> \n {results} \n <New Search Results>"
+            )
+        return (
+            f"<User Input> \n {research_topic} \n <User Input>\n\n"
+            f"<Search Results> \n {results} \n <Search Results>"
+        )
+
+    # Tokens left once the system prompt and the message's own markup are counted
+    frame = render(" " if existing_summary else None, "")
+    available = max_prompt_tokens - count_tokens(summarizer_instructions) - count_tokens(frame)
+    summary_tokens = count_tokens(existing_summary)
+    results_budget = max(available - summary_tokens, available // 2)
+    if summary_tokens > available - results_budget:
+        existing_summary = truncate_to_tokens(existing_summary, available - results_budget)
+    return render(existing_summary, truncate_to_tokens(new_results, results_budget))
 
 # Nodes   
+def generate_queries(state: SummaryState, configurable: Configuration):
+    """ Generate several queries for web search, one per aspect of the topic """
+
+    number_of_queries = configurable.queries_per_loop
+    llm = get_llm(configurable, temperature=0)
+    result, usage = invoke_llm(llm,
+        [SystemMessage(content=multi_query_writer_instructions.format(
+            research_topic=state.research_topic, number_of_queries=number_of_queries)),
+        HumanMessage(content=f"Generate {number_of_queries} queries for web search:")],
+        state, "generate_query"
+    )
+    try:
+        queries = _distinct_queries(parse_json_response(result.content)['queries'], number_of_queries)
+    except Exception as e:
+        print(f"Error parsing queries response: {e}")
+        print(f"Original response: {result.content}")
+        queries = []
+    # 回退到使用原始研究主题
+    queries = queries or [state.research_topic]
+    return {"search_query": queries[0], "search_queries": queries, "token_usage": usage}
+
 def generate_query(state: SummaryState, config: RunnableConfig):
     """ Generate a query for web search """
     
+    configurable = Configuration.from_runnable_config(config)
+    if configurable.queries_per_loop > 1:
+        return generate_queries(state, configurable)
+
     # Format the prompt
     query_writer_instructions_formatted = query_writer_instructions.format(research_topic=state.research_topic)
 
     # Generate a query
-    configurable = Configuration.from_runnable_config(config)
     llm = get_llm(configurable, temperature=0)
-    result = llm.invoke(
+    result, usage = invoke_llm(llm,
         [SystemMessage(content=query_writer_instructions_formatted),
-        HumanMessage(content=f"Generate a query for web search:")]
+        HumanMessage(content=f"Generate a query for web search:")],
+        state, "generate_query"
     )   
     print(result.content)
     try:
-        # 清理响应内容，移除可能的 Markdown 代码块
-        content = result.content.strip()
-        if content.startswith('```') and content.endswith('```'):
-            # 移除开头和结尾的 ```
-            content = content.split('\n', 1)[1].rsplit('\n', 1)[0]
-            # 如果还有 json 标记，也移除它
-            if content.startswith('json'):
-                content = content.split('\n', 1)[1]
-        
         # 尝试解析 JSON
-        print(content)
-        query = json.loads(content)
-        return {"search_query": query['query']}
+        query = parse_json_response(result.content)
+        return {"search_query": query['query'], "token_usage": usage}
         
     except Exception as e:
         print(f"Error parsing query response: {e}")
         print(f"Original response: {result.content}")
         # 回退到使用原始研究主题
-        return {"search_query": state.research_topic}
+        return {"search_query": state.research_topic, "token_usage": usage}
+
+def search(search_api: str, query: str, loop_count: int):
+    """ Run one query against the configured search API """
+    if search_api == "tavily":
+        return tavily_search(query, include_raw_content=True, max_results=1)
+    return perplexity_search(query, loop_count)
 
 def web_research(state: SummaryState, config: RunnableConfig):
     """ Gather information from the web """
@@ -62,47 +141,51 @@ def web_research(state: SummaryState, config: RunnableConfig):
         search_api = configurable.search_api
     else:
         search_api = configurable.search_api.value
+    if search_api not in ("tavily", "perplexity"):
+        raise ValueError(f"Unsupported search API: {configurable.search_api}")
 
-    # Search the web
-    if search_api == "tavily":
-        search_results = tavily_search(state.search_query, include_raw_content=True, max_results=1)
-        search_str = deduplicate_and_format_sources(search_results, max_tokens_per_source=1000, include_raw_content=True)
-    elif search_api == "perplexity":
-        search_results = perplexity_search(state.search_query, state.research_loop_count)
-        search_str = deduplicate_and_format_sources(search_results, max_tokens_per_source=1000, include_raw_content=False)
+    # Search the web; the queries of one loop run concurrently
+    queries = state.search_queries if configurable.queries_per_loop > 1 and state.search_queries else [state.search_query]
+    if len(queries) == 1:
+        responses = [search(search_api, queries[0], state.research_loop_count)]
     else:
-        raise ValueError(f"Unsupported search API: {configurable.search_api}")
+        workers = max(min(configurable.max_search_concurrency, len(queries)), 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(search, search_api, query, state.research_loop_count) for query in queries]
+        responses = []
+        for query, future in zip(queries, futures):
+            try:
+                responses.append(future.result())
+            except Exception as e:
+                # One failed query should not throw away the others' results
+                print(f"Search for {query!r} failed: {e}")
+        if not responses:
+            raise RuntimeError("Every search of this research loop failed")
+
+    search_results = merge_search_responses(responses)
+    search_str = deduplicate_and_format_sources(
+        search_results, max_tokens_per_source=configurable.max_tokens_per_source,
+        include_raw_content=search_api == "tavily"
+    )
         
-    return {"sources_gathered": [format_sources(search_results)], "research_loop_count": state.research_loop_count + 1, "web_research_results": [search_str]}
+    return {"sources_gathered": format_sources(search_results).splitlines(), "research_loop_count": state.research_loop_count + 1, "web_research_results": state.web_research_results + [search_str]}
 
 def summarize_sources(state: SummaryState, config: RunnableConfig):
     """ Summarize the gathered sources """
     
-    # Existing summary
-    existing_summary = state.running_summary
-
-    # Most recent web research
-    most_recent_web_research = state.web_research_results[-1]
-
-    # Build the human message
-    if existing_summary:
-        human_message_content = (
-            f"<User Input> \n {state.research_topic} \n <User Input>\n\n"
-            f"<Existing Summary> \n {existing_summary} \n <Existing Summary>\n\n"
-            f"<New Search Results> \n {most_recent_web_research} \n <New Search Results>"
-        )
-    else:
-        human_message_content = (
-            f"<User Input> \n {state.research_topic} \n <User Input>\n\n"
-            f"<Search Results> \n {most_recent_web_research} \n <Search Results>"
-        )
+    # Search results not yet folded into the summary, trimmed to the prompt budget
+    configurable = Configuration.from_runnable_config(config)
+    human_message_content = build_summary_prompt(
+        state.research_topic, state.running_summary,
+        "\n\n".join(state.web_research_results), configurable.max_prompt_tokens
+    )
 
     # Run the LLM
-    configurable = Configuration.from_runnable_config(config)
     llm = get_llm(configurable, temperature=0)
-    result = llm.invoke(
+    result, usage = invoke_llm(llm,
         [SystemMessage(content=summarizer_instructions),
-        HumanMessage(content=human_message_content)]
+        HumanMessage(content=human_message_content)],
+        state, "summarize_sources"
     )
 
     running_summary = result.content
@@ -114,46 +197,63 @@ def summarize_sources(state: SummaryState, config: RunnableConfig):
         end = running_summary.find("</think>") + len("</think>")
         running_summary = running_summary[:start] + running_summary[end:]
 
-    return {"running_summary": running_summary}
+    # The raw results are in the summary now; drop them from the state
+    return {"running_summary": running_summary, "web_research_results": [], "token_usage": usage}
+
+def reflect_on_summary_multi(state: SummaryState, configurable: Configuration):
+    """ Reflect on the summary and generate several follow-up queries """
+
+    number_of_queries = configurable.queries_per_loop
+    llm = get_llm(configurable, temperature=0)
+    result, usage = invoke_llm(llm,
+        [SystemMessage(content=multi_reflection_instructions.format(
+            research_topic=state.research_topic, number_of_queries=number_of_queries)),
+        HumanMessage(content=f"Identify {number_of_queries} knowledge gaps and generate a follow-up web search query for each based on our existing knowledge: {state.running_summary}")],
+        state, "reflect_on_summary"
+    )
+    try:
+        queries = _distinct_queries(parse_json_response(result.content).get('follow_up_queries') or [], number_of_queries)
+    except Exception as e:
+        print(f"Error parsing reflection response: {e}")
+        print(f"Original response: {result.content}")
+        queries = []
+    # 回退到使用扩展查询
+    queries = queries or [f"Tell me more about {state.research_topic}"]
+    return {"search_query": queries[0], "search_queries": queries, "token_usage": usage}
 
 def reflect_on_summary(state: SummaryState, config: RunnableConfig):
     """ Reflect on the summary and generate a follow-up query """
 
-    # Generate a query
     configurable = Configuration.from_runnable_config(config)
+    if configurable.queries_per_loop > 1:
+        return reflect_on_summary_multi(state, configurable)
+
+    # Generate a query
     llm = get_llm(configurable, temperature=0)
-    result = llm.invoke(
+    result, usage = invoke_llm(llm,
         [SystemMessage(content=reflection_instructions.format(research_topic=state.research_topic)),
-        HumanMessage(content=f"Identify a knowledge gap and generate a follow-up web search query based on our existing knowledge: {state.running_summary}")]
+        HumanMessage(content=f"Identify a knowledge gap and generate a follow-up web search query based on our existing knowledge: {state.running_summary}")],
+        state, "reflect_on_summary"
     )   
 
     try:
-        # 清理响应内容，移除可能的 Markdown 代码块
-        content = result.content.strip()
-        if content.startswith('```') and content.endswith('```'):
-            # 移除开头和结尾的 ```
-            content = content.split('\n', 1)[1].rsplit('\n', 1)[0]
-            # 如果还有 json 标记，也移除它
-            if content.startswith('json'):
-                content = content.split('\n', 1)[1]
-        
         # 尝试解析 JSON
-        follow_up_query = json.loads(content)
+        follow_up_query = parse_json_response(result.content)
         
         # 获取 follow-up query
         query = follow_up_query.get('follow_up_query')
         
         # 如果没有找到 follow-up query，使用回退方案
         if not query:
-            return {"search_query": f"Tell me more about {state.research_topic}"}
+            return {"search_query": f"Tell me more about {state.research_topic}", "token_usage": usage}
             
-        return {"search_query": query}
+        return {"search_query": query, "token_usage": usage}
         
     except Exception as e:
         print(f"Error parsing reflection response: {e}")
         print(f"Original response: {result.content}")
         # 回退到使用扩展查询
-        return {"search_query": f"Tell me more about {state.research_topic}"}
+        return {"search_query": f"Tell me more about {state.research_topic}", "token_usage": usage}
 
 def finalize_summary(state: SummaryState):
     """ Finalize the summary """
@@ -161,6 +261,10 @@ def finalize_summary(state: SummaryState):
     # Format all accumulated sources into a single bulleted list
     all_sources = "\n".join(source for source in state.sources_gathered)
     state.running_summary = f"## Summary\n\n{state.running_summary}\n\n ### Sources:\n{all_sources}"
+
+    for loop in usage_by_loop(state.token_usage):
+        print(f"Research loop {loop['loop']}: {loop['prompt_tokens']} prompt tokens, "
+              f"{loop['completion_tokens']} completion tokens")
     return {"running_summary": state.running_summary}
 
 def route_research(state: SummaryState, config: RunnableConfig) -> Literal["finalize_summary", "web_research"]:
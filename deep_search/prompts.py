@@ -23,6 +23,42 @@ Example output:
 
 Provide your response in JSON format:"""
 
+multi_query_writer_instructions="""Your goal is to generate {number_of_queries} targeted web search queries.
+Together the queries will gather information related to a specific topic.
+Each query should cover a different aspect of the topic, so their results overlap as little as possible.
+
+<TOPIC>
+{research_topic}
+</TOPIC>
+
+<FORMAT>
+Format your response as a JSON object with a single key "queries" holding a list of
+{number_of_queries} objects, each with ALL three of these exact keys:
+   - "query": The actual search query string
+   - "aspect": The specific aspect of the topic being researched
+   - "rationale": Brief explanation of why this query is relevant
+</FORMAT>
+
+<EXAMPLE>
+Example output:
+{{
+    "queries": [
+        {{
+            "query": "machine learning transformer architecture explained",
+            "aspect": "technical architecture",
+            "rationale": "Understanding the fundamental structure of transformer models"
+        }},
+        {{
+            "query": "transformer model training compute requirements",
+            "aspect": "training cost",
+            "rationale": "Understanding what it takes to train transformer models"
+        }}
+    ]
+}}
+</EXAMPLE>
+
+Provide your response in JSON format:"""
+
 summarizer_instructions="""
 <GOAL>
 Generate a high-quality summary of the web search results and keep it concise / related to the user topic.
@@ -74,4 +110,39 @@ Example output:
 }}
 </EXAMPLE>
 
+Provide your analysis in JSON format:"""
+
+multi_reflection_instructions = """You are an expert research assistant analyzing a summary about {research_topic}.
+
+<GOAL>
+1. Identify the {number_of_queries} most important knowledge gaps or areas that need deeper exploration
+2. Generate one follow-up question per gap that would help expand your understanding
+3. Focus on technical details, implementation specifics, or emerging trends that weren't fully covered
+</GOAL>
+
+<REQUIREMENTS>
+Ensure each follow-up question is self-contained and includes necessary context for web search.
+The questions should address different gaps, so their search results overlap as little as possible.
+</REQUIREMENTS>
+
+<FORMAT>
+Format your response as a JSON object with these exact keys:
+- knowledge_gaps: A list describing what information is missing or needs clarification
+- follow_up_queries: A list of {number_of_queries} specific questions addressing these gaps
+</FORMAT>
+
+<EXAMPLE>
+Example output:
+{{
+    "knowledge_gaps": [
+        "The summary lacks information about performance metrics and benchmarks",
+        "The summary does not cover deployment costs"
+    ],
+    "follow_up_queries": [
+        "What are typical performance benchmarks and metrics used to evaluate [specific technology]?",
+        "What does it cost to deploy [specific technology] in production?"
+    ]
+}}
+</EXAMPLE>
+
 Provide your analysis in JSON format:"""
\ No newline at end of file
@@ -0,0 +1,54 @@
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+from sqlite_cache import SqliteCache
+
+load_dotenv()
+
+@dataclass(frozen=True)
+class SearchCacheSettings:
+    """Location and bounds of the persistent web search cache"""
+    enabled: bool = os.getenv("HOSPITAL_SEARCH_CACHE", "true").lower() == "true"
+    path: str = os.getenv("HOSPITAL_SEARCH_CACHE_DB", "search_cache.sqlite")
+    max_entries: int = int(os.getenv("HOSPITAL_SEARCH_CACHE_MAX_ENTRIES", "2000"))
+    ttl_hours: float = float(os.getenv("HOSPITAL_SEARCH_CACHE_TTL_HOURS", "24"))
+    # Entries are trimmed back to max_entries once every evict_every writes
+    evict_every: int = 50
+    # A hit refreshes last_used at most this often, so hits are reads only
+    touch_interval_seconds: float = 60
+
+def normalize_query(query: str) -> str:
+    """Query with letter case and whitespace differences removed"""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+def cache_key(provider: str, query: str, max_results: Optional[int], include_raw_content: bool) -> str:
+    """Content hash of a search request"""
+    content = json.dumps({
+        "provider": provider,
+        "query": normalize_query(query),
+        "max_results": max_results,
+        "include_raw_content": bool(include_raw_content)
+    }, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+class SearchCache(SqliteCache):
+    """SQLite-backed cache of search API responses with LRU and TTL eviction"""
+
+    def __init__(self, settings: Optional[SearchCacheSettings] = None):
+        self.settings = settings or SearchCacheSettings()
+        super().__init__(
+            self.settings.path, "search_responses", self.settings.max_entries, self.settings.enabled,
+            self.settings.evict_every, self.settings.touch_interval_seconds
+        )
+
+    def get(self, key: str):
+        """The cached response for key, or None if missing or expired"""
+        response = self.lookup(key)
+        return json.loads(response) if response is not None else None
+
+    def put(self, key: str, provider: str, response) -> None:
+        self.store(key, json.dumps(response, default=str), self.settings.ttl_hours * 3600, provider)
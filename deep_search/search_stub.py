@@ -0,0 +1,50 @@
+import hashlib
+import threading
+import time
+from typing import Dict, List, Tuple
+
+class StubSearchClient:
+    """Offline stand-in for the Tavily and Perplexity APIs.
+
+    search() answers like TavilyClient.search and ask() returns the
+    (content, citations) pair perplexity_search reads from a chat
+    completion. Results are deterministic per query and arrive after an
+    optional simulated latency. Select it with HOSPITAL_SEARCH_CLIENT=stub or
+    utils.set_search_client(StubSearchClient()).
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    @staticmethod
+    def _slug(query: str, i: int) -> str:
+        return hashlib.md5(f"{query.lower()}|{i}".encode("utf-8")).hexdigest()[:10]
+
+    def search(self, query: str, max_results: int = 5, include_raw_content: bool = False, **kwargs) -> Dict:
+        self._call("search")
+        results = []
+        for i in range(max_results):
+            slug = self._slug(query, i)
+            result = {
+                "title": f"Stub result {i + 1} for {query}",
+                "url": f"https://search.stub/{slug}",
+                "content": f"Summary {slug} of findings about {query}.",
+                "score": round(1 - i / (max_results + 1), 3),
+            }
+            if include_raw_content:
+                result["raw_content"] = f"Full text {slug} discussing {query}. " * 200
+            results.append(result)
+        return {"query": query, "results": results}
+
+    def ask(self, query: str) -> Tuple[str, List[str]]:
+        self._call("ask")
+        citations = [f"https://search.stub/{self._slug(query, i)}" for i in range(3)]
+        return f"Stub answer about {query}.", citations
@@ -2,14 +2,25 @@ import operator
 from dataclasses import dataclass, field
 from typing_extensions import TypedDict, Annotated
 
+def add_unique(left: list, right: list) -> list:
+    """ Append the new items that are not already in the list """
+    merged, seen = list(left), set(left)
+    for item in right:
+        if item not in seen:
+            seen.add(item)
+            merged.append(item)
+    return merged
+
 @dataclass(kw_only=True)
 class SummaryState:
     research_topic: str = field(default=None) # Report topic     
     search_query: str = field(default=None) # Search query
-    web_research_results: Annotated[list, operator.add] = field(default_factory=list) 
-    sources_gathered: Annotated[list, operator.add] = field(default_factory=list) 
+    search_queries: list = field(default_factory=list) # All queries of the current loop
+    web_research_results: list = field(default_factory=list) # Search results not yet summarized
+    sources_gathered: Annotated[list, add_unique] = field(default_factory=list) # One line per source
     research_loop_count: int = field(default=0) # Research loop count
     running_summary: str = field(default=None) # Final report
+    token_usage: Annotated[list, operator.add] = field(default_factory=list) # Tokens per LLM call
 
 @dataclass(kw_only=True)
 class SummaryStateInput:
@@ -17,4 +28,5 @@ class SummaryStateInput:
 
 @dataclass(kw_only=True)
 class SummaryStateOutput:
-    running_summary: str = field(default=None) # Final report
\ No newline at end of file
+    running_summary: str = field(default=None) # Final report
+    token_usage: list = field(default_factory=list) # Tokens per LLM call
\ No newline at end of file
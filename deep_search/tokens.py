@@ -0,0 +1,57 @@
+import os
+import threading
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def get_encoding():
+    """tiktoken encoding used to measure prompts, loaded on first use.
+
+    HOSPITAL_TOKENIZER_ENCODING picks the encoding (default cl100k_base).
+    Local models tokenize differently, so counts are close, not exact.
+    """
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(os.getenv("HOSPITAL_TOKENIZER_ENCODING", "cl100k_base"))
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = "... [truncated]") -> str:
+    """text cut to at most max_tokens tokens, counting the marker appended when cut"""
+    if not text:
+        return text or ""
+    encoding = get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    keep = max_tokens - len(encoding.encode(marker))
+    if keep <= 0:
+        return ""
+    return encoding.decode(tokens[:keep]) + marker
+
+def message_usage(message, prompt: str) -> dict:
+    """Prompt and completion tokens of an LLM reply.
+
+    Uses the provider's reported usage when the reply carries it and
+    counts with the tokenizer otherwise.
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None and usage.get("output_tokens") is not None:
+        return {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"]}
+    return {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(message.content)}
+
+def usage_by_loop(token_usage: list) -> list:
+    """Prompt and completion token totals per research loop, in loop order"""
+    totals = {}
+    for entry in token_usage:
+        loop = totals.setdefault(entry["loop"], {"loop": entry["loop"], "prompt_tokens": 0, "completion_tokens": 0})
+        loop["prompt_tokens"] += entry["prompt_tokens"]
+        loop["completion_tokens"] += entry["completion_tokens"]
+    return [totals[loop] for loop in sorted(totals)]
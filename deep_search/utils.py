@@ -1,14 +1,101 @@
 import os
-import requests
+import threading
 from typing import Dict, Any
 from langsmith import traceable
-from tavily import TavilyClient
 from .env import get_env_or_raise
+from .search_cache import SearchCache, cache_key
+from .tokens import truncate_to_tokens
+
+# Search responses, cached per (provider, normalized query, max_results, include_raw_content)
+search_cache = SearchCache()
+
+_tavily_client = None
+_perplexity_client = None
+_clients_lock = threading.Lock()
+
+class PerplexityClient:
+    """Perplexity chat completions over one pooled HTTP session"""
+
+    def __init__(self):
+        import requests
+        self.session = requests.Session()
+
+    def ask(self, query: str):
+        """(answer, citation URLs) for a query"""
+        headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "Authorization": f"Bearer {get_env_or_raise('PERPLEXITY_API_KEY')}"
+        }
+        
+        payload = {
+            "model": "sonar-pro",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "Search the web and provide factual information with sources."
+                },
+                {
+                    "role": "user",
+                    "content": query
+                }
+            ]
+        }
+        
+        response = self.session.post(
+            "https://api.perplexity.ai/chat/completions",
+            headers=headers,
+            json=payload
+        )
+        response.raise_for_status()  # Raise exception for bad status codes
+        
+        # Parse the response
+        data = response.json()
+        return data["choices"][0]["message"]["content"], data.get("citations", ["https://perplexity.ai"])
+
+def _use_stub() -> bool:
+    return os.getenv("HOSPITAL_SEARCH_CLIENT", "live") == "stub"
+
+def get_tavily_client():
+    """Tavily client, imported and created on first use and then shared.
+
+    HOSPITAL_SEARCH_CLIENT=stub selects the offline StubSearchClient instead.
+    """
+    global _tavily_client
+    if _tavily_client is None:
+        with _clients_lock:
+            if _tavily_client is None:
+                if _use_stub():
+                    from .search_stub import StubSearchClient
+                    _tavily_client = StubSearchClient()
+                else:
+                    from tavily import TavilyClient
+                    _tavily_client = TavilyClient()
+    return _tavily_client
+
+def get_perplexity_client():
+    """Perplexity client, created on first use and then shared (or the stub, as above)"""
+    global _perplexity_client
+    if _perplexity_client is None:
+        with _clients_lock:
+            if _perplexity_client is None:
+                if _use_stub():
+                    from .search_stub import StubSearchClient
+                    _perplexity_client = StubSearchClient()
+                else:
+                    _perplexity_client = PerplexityClient()
+    return _perplexity_client
+
+def set_search_client(client) -> None:
+    """Serve both providers from client, e.g. a StubSearchClient in benchmarks and offline runs"""
+    global _tavily_client, _perplexity_client
+    with _clients_lock:
+        _tavily_client = _perplexity_client = client
 
 def deduplicate_and_format_sources(search_response, max_tokens_per_source, include_raw_content=False):
     """
     Takes either a single search response or list of responses from search APIs and formats them.
-    Limits the raw_content to approximately max_tokens_per_source.
+    Limits the raw_content to max_tokens_per_source tokens.
     include_raw_content specifies whether to include the raw_content from Tavily in the formatted string.
     
     Args:
@@ -45,19 +132,31 @@ def deduplicate_and_format_sources(search_response, max_tokens_per_source, inclu
         formatted_text += f"URL: {source['url']}\n===\n"
         formatted_text += f"Most relevant content from source: {source['content']}\n===\n"
         if include_raw_content:
-            # Using rough estimate of 4 characters per token
-            char_limit = max_tokens_per_source * 4
             # Handle None raw_content
             raw_content = source.get('raw_content', '')
             if raw_content is None:
                 raw_content = ''
                 print(f"Warning: No raw_content found for source {source['url']}")
-            if len(raw_content) > char_limit:
-                raw_content = raw_content[:char_limit] + "... [truncated]"
+            raw_content = truncate_to_tokens(raw_content, max_tokens_per_source)
             formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
                 
     return formatted_text.strip()
 
+def merge_search_responses(responses):
+    """Combine several search responses into one, keeping the first result for each URL.
+    
+    Args:
+        responses (list): Search responses, each a dict with a 'results' list
+        
+    Returns:
+        dict: Search response with the merged 'results'
+    """
+    unique_sources = {}
+    for response in responses:
+        for source in response['results']:
+            unique_sources.setdefault(source['url'], source)
+    return {"results": list(unique_sources.values())}
+
 def format_sources(search_results):
     """Format search results into a bullet-point list of sources.
     
@@ -89,10 +188,14 @@ def tavily_search(query, include_raw_content=True, max_results=3):
                 - content (str): Snippet/summary of the content
                 - raw_content (str): Full content of the page if available"""
      
-    tavily_client = TavilyClient()
-    return tavily_client.search(query, 
-                         max_results=max_results, 
-                         include_raw_content=include_raw_content)
+    key = cache_key("tavily", query, max_results, include_raw_content)
+    response = search_cache.get(key)
+    if response is None:
+        response = get_tavily_client().search(query, 
+                             max_results=max_results, 
+                             include_raw_content=include_raw_content)
+        search_cache.put(key, "tavily", response)
+    return response
 
 @traceable
 def perplexity_search(query: str, perplexity_search_loop_count: int) -> Dict[str, Any]:
@@ -111,39 +214,14 @@ def perplexity_search(query: str, perplexity_search_loop_count: int) -> Dict[str
                 - raw_content (str): Full content of the page if available
     """
 
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "Authorization": f"Bearer {get_env_or_raise('PERPLEXITY_API_KEY')}"
-    }
-    
-    payload = {
-        "model": "sonar-pro",
-        "messages": [
-            {
-                "role": "system",
-                "content": "Search the web and provide factual information with sources."
-            },
-            {
-                "role": "user",
-                "content": query
-            }
-        ]
-    }
-    
-    response = requests.post(
-        "https://api.perplexity.ai/chat/completions",
-        headers=headers,
-        json=payload
-    )
-    response.raise_for_status()  # Raise exception for bad status codes
-    
-    # Parse the response
-    data = response.json()
-    content = data["choices"][0]["message"]["content"]
-
-    # Perplexity returns a list of citations for a single search result
-    citations = data.get("citations", ["https://perplexity.ai"])
+    # Only the API's answer is cached; titles depend on the loop count
+    key = cache_key("perplexity", query, None, True)
+    cached = search_cache.get(key)
+    if cached is None:
+        content, citations = get_perplexity_client().ask(query)
+        search_cache.put(key, "perplexity", {"content": content, "citations": citations})
+    else:
+        content, citations = cached["content"], cached["citations"]
     
     # Return first citation with full content, others just as references
     results = [{
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple, Union
+from dotenv import load_dotenv
+
+load_dotenv()
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """Connection settings shared by every hospital tool"""
+    path: str = os.getenv("HOSPITAL_DB_PATH", "hospital.sqlite")
+    busy_timeout_ms: int = int(os.getenv("HOSPITAL_DB_BUSY_TIMEOUT_MS", "5000"))
+    cached_statements: int = int(os.getenv("HOSPITAL_DB_CACHED_STATEMENTS", "256"))
+    journal_mode: str = os.getenv("HOSPITAL_DB_JOURNAL_MODE", "WAL")
+    auto_migrate: bool = os.getenv("HOSPITAL_DB_AUTO_MIGRATE", "1") == "1"
+
+_settings = DatabaseSettings()
+_generation = 0
+_settings_lock = threading.Lock()
+_migrated_paths = set()
+
+# Each thread keeps one open connection; nested borrows on the same thread
+# (e.g. validate_appointment_time inside book_appointment) share it.
+_local = threading.local()
+
+def configure_database(
+    path: Optional[str] = None,
+    busy_timeout_ms: Optional[int] = None,
+    cached_statements: Optional[int] = None,
+    journal_mode: Optional[str] = None,
+    auto_migrate: Optional[bool] = None
+) -> DatabaseSettings:
+    """Override database settings; threads reconnect on their next borrow"""
+    global _settings, _generation
+    changes = {
+        "path": path,
+        "busy_timeout_ms": busy_timeout_ms,
+        "cached_statements": cached_statements,
+        "journal_mode": journal_mode,
+        "auto_migrate": auto_migrate,
+    }
+    with _settings_lock:
+        _settings = replace(_settings, **{k: v for k, v in changes.items() if v is not None})
+        _generation += 1
+    return _settings
+
+def get_database_settings() -> DatabaseSettings:
+    return _settings
+
+def _connect(settings: DatabaseSettings) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        settings.path,
+        timeout=settings.busy_timeout_ms / 1000,
+        cached_statements=settings.cached_statements
+    )
+    conn.execute(f"PRAGMA busy_timeout = {int(settings.busy_timeout_ms)}")
+    conn.execute(f"PRAGMA journal_mode = {settings.journal_mode}")
+    if settings.journal_mode.upper() == "WAL":
+        # NORMAL is durable across application crashes in WAL mode
+        conn.execute("PRAGMA synchronous = NORMAL")
+    if settings.auto_migrate and settings.path not in _migrated_paths:
+        _ensure_schema(conn, settings.path)
+    return conn
+
+def _ensure_schema(conn: sqlite3.Connection, path: str) -> None:
+    """Bring the database up to the latest schema once per process"""
+    from hospital_schema import migrate
+
+    with _settings_lock:
+        if path in _migrated_paths:
+            return
+        try:
+            migrate(conn)
+        except sqlite3.Error as e:
+            # Left unmarked so the next new connection tries again
+            print(f"Warning: schema migration failed for {path}: {e}")
+            return
+        _migrated_paths.add(path)
+
+def acquire_connection() -> sqlite3.Connection:
+    """Borrow the calling thread's pooled connection.
+
+    Every acquire must be paired with release_connection(). Borrows nest, so
+    helpers called from inside a tool reuse the same connection and see the
+    same open transaction.
+    """
+    conn = getattr(_local, "conn", None)
+    depth = getattr(_local, "depth", 0)
+    if conn is not None and depth == 0 and _local.generation != _generation:
+        conn.close()
+        conn = None
+    if conn is None:
+        with _settings_lock:
+            settings, generation = _settings, _generation
+        conn = _connect(settings)
+        _local.conn = conn
+        _local.generation = generation
+    _local.depth = depth + 1
+    return conn
+
+def release_connection(conn: sqlite3.Connection) -> None:
+    """Return a borrowed connection.
+
+    When the outermost borrow is released any transaction that was not
+    committed is rolled back, matching what closing the connection used to do.
+    """
+    _local.depth = max(getattr(_local, "depth", 1) - 1, 0)
+    if _local.depth == 0 and conn.in_transaction:
+        conn.rollback()
+
+def begin_immediate(conn: sqlite3.Connection) -> None:
+    """Start a write transaction up front so checks and writes are atomic"""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+def close_connection() -> None:
+    """Close the calling thread's pooled connection, if any"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+        _local.depth = 0
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def day_range(value: Union[date, datetime], days: int = 1) -> Tuple[str, str]:
+    """Half-open [start, end) timestamp bounds covering whole days.
+
+    Comparing the raw column against these bounds lets SQLite use the
+    appointment indexes, unlike wrapping the column in date().
+    """
+    start = datetime(value.year, value.month, value.day)
+    end = start + timedelta(days=days)
+    return start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)
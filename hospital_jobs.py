@@ -0,0 +1,114 @@
+import os
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional
+from job_queue import JobQueue, JobSettings
+
+def format_patient_case(data: Dict) -> str:
+    return f"""
+        Patient Information:
+        {data['basic_info']}
+
+        Presenting Complaints:
+        {data['symptoms']}
+
+        Medical History:
+        {data['medical_history']}
+
+        Current Medications:
+        {data['medications']}
+
+        Vital Signs:
+        {data['vital_signs']}
+        """
+
+# The handlers import their workflows on first use, so processes that only
+# serve /chat never load crewai, browser_use or the deep search graph
+
+def run_diagnosis_job(params: Dict, progress: Callable[[str], None]) -> Dict:
+    from multiagent import crew_pool
+
+    progress("Medical team is reviewing the case")
+    with crew_pool.crew(model_name="gpt-4o-mini", temperature=0.7) as crew:
+        diagnosis_result = str(crew.run_diagnosis(params["patient_case"]))
+    return {
+        "success": True,
+        "diagnosis_process": [{
+            "specialist": "Medical Team",
+            "message": diagnosis_result
+        }]
+    }
+
+def run_deep_search_job(params: Dict, progress: Callable[[str], None]) -> Dict:
+    from deep_search.graph import graph as deep_search_graph
+    from deep_search.tokens import usage_by_loop
+
+    config = {
+        "configurable": {
+            "llm_provider": params.get("llm_provider"),
+            "search_api": params.get("search_api"),
+            "max_web_research_loops": params.get("max_loops", 3),
+            "queries_per_loop": params.get("queries_per_loop")
+        }
+    }
+    summary = None
+    loop_count = 0
+    token_usage = []
+    for chunk in deep_search_graph.stream(
+        {"research_topic": params["research_topic"]},
+        config=config,
+        stream_mode="updates"
+    ):
+        for node, update in chunk.items():
+            update = update or {}
+            loop_count = update.get("research_loop_count", loop_count)
+            if "running_summary" in update:
+                summary = update["running_summary"]
+            usage = update.get("token_usage") or []
+            token_usage.extend(usage)
+            tokens = "".join(f" ({u['prompt_tokens']} prompt / {u['completion_tokens']} completion tokens)"
+                             for u in usage)
+            progress(f"Research loop {loop_count}: {node.replace('_', ' ')} done{tokens}")
+    return {
+        "success": True,
+        "result": summary,
+        "token_usage": usage_by_loop(token_usage)
+    }
+
+async def run_browser_job(params: Dict, progress: Callable[[str], None]) -> Dict:
+    from browser import run_browser_task
+
+    file_path = params.get("file_path")
+    progress("Browser agent is running")
+    try:
+        result = await run_browser_task(
+            task=params["task"],
+            model=params.get("model", "gpt-4o-mini"),
+            headless=params.get("headless", True),
+            # read_file_content only needs the file name
+            file_obj=SimpleNamespace(name=file_path) if file_path else None
+        )
+    finally:
+        if file_path:
+            try:
+                os.unlink(file_path)
+            except OSError:
+                pass
+    return {
+        "success": True,
+        "result": result
+    }
+
+def upload_path(queue: JobQueue, filename: str) -> str:
+    """Where to keep an uploaded file until its job has run"""
+    os.makedirs(queue.settings.upload_dir, exist_ok=True)
+    file_ext = os.path.splitext(filename or "")[1]
+    return os.path.join(queue.settings.upload_dir, f"{uuid.uuid4()}{file_ext}")
+
+def create_job_queue(settings: Optional[JobSettings] = None) -> JobQueue:
+    """Job queue with the diagnosis, deep search and browser workers registered"""
+    queue = JobQueue(settings)
+    queue.register("diagnosis", run_diagnosis_job, concurrency=2)
+    queue.register("deep_search", run_deep_search_job, concurrency=2)
+    queue.register("browser", run_browser_job, concurrency=1)
+    return queue
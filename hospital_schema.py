@@ -0,0 +1,231 @@
+import argparse
+import re
+import sqlite3
+import sys
+from typing import List, Optional, Tuple
+
+from hospital_db import (acquire_connection, release_connection, begin_immediate,
+                         configure_database, get_database_settings)
+
+# Versioned schema changes, applied in order and tracked with PRAGMA user_version.
+# Never edit a released migration; append a new one instead.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "Composite and covering indexes for tool queries", [
+        # validate_appointment_time / get_available_slots / search_available_appointments:
+        # equality on doctor and status, range on scheduled_time, end_time covered
+        '''CREATE INDEX IF NOT EXISTS idx_appointments_doctor_status_time
+           ON appointments(doctor_id, status, scheduled_time, end_time)''',
+        # fetch_patient_info / get_upcoming_appointments
+        '''CREATE INDEX IF NOT EXISTS idx_appointments_patient_time
+           ON appointments(patient_id, scheduled_time)''',
+        # fetch_patient_info / search_medical_records / get_medical_expenses
+        '''CREATE INDEX IF NOT EXISTS idx_medical_records_patient_visit
+           ON medical_records(patient_id, visit_date)''',
+        # get_parking_availability
+        '''CREATE INDEX IF NOT EXISTS idx_parking_reservations_area_time
+           ON parking_reservations(area_id, reservation_time)''',
+        # reserve_parking_spot
+        '''CREATE INDEX IF NOT EXISTS idx_parking_reservations_spot_time
+           ON parking_reservations(spot_id, reservation_time)''',
+        '''CREATE INDEX IF NOT EXISTS idx_parking_spots_area_type_status
+           ON parking_spots(area_id, type, status)''',
+        # get_medical_expenses
+        '''CREATE INDEX IF NOT EXISTS idx_billing_record
+           ON billing(record_id)''',
+    ]),
+    (2, "Per-area hourly parking occupancy summary", [
+        # Confirmed reservations per area and hour bucket, kept in step by
+        # reserve_parking_spot / cancel_parking_reservation
+        '''CREATE TABLE IF NOT EXISTS parking_occupancy (
+               area_id INTEGER NOT NULL,
+               bucket_start TEXT NOT NULL,
+               reserved INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (area_id, bucket_start)
+           ) WITHOUT ROWID''',
+        # Backfill: every hour a confirmed reservation overlaps
+        '''INSERT OR REPLACE INTO parking_occupancy (area_id, bucket_start, reserved)
+           WITH RECURSIVE hours(area_id, bucket_start, ends_at) AS (
+               SELECT area_id,
+                      strftime('%Y-%m-%d %H:00:00', reservation_time),
+                      datetime(reservation_time, '+' || duration_hours || ' hours')
+               FROM parking_reservations
+               WHERE status = 'confirmed' AND duration_hours > 0
+               UNION ALL
+               SELECT area_id, datetime(bucket_start, '+1 hour'), ends_at
+               FROM hours
+               WHERE datetime(bucket_start, '+1 hour') < ends_at
+           )
+           SELECT area_id, bucket_start, COUNT(*) FROM hours
+           GROUP BY area_id, bucket_start''',
+        # get_parking_availability: available spots per area
+        '''CREATE INDEX IF NOT EXISTS idx_parking_spots_area_status
+           ON parking_spots(area_id, status)''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: Optional[sqlite3.Connection] = None, target: int = SCHEMA_VERSION) -> int:
+    """Apply pending migrations up to target, one transaction per version"""
+    borrowed = conn is None
+    if borrowed:
+        conn = acquire_connection()
+
+    try:
+        version = get_schema_version(conn)
+        for number, description, statements in MIGRATIONS:
+            if number <= version or number > target:
+                continue
+            begin_immediate(conn)
+            try:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"Applied schema migration {number}: {description}")
+            version = number
+        return version
+    finally:
+        if borrowed:
+            release_connection(conn)
+
+def _all_filters(sql: str, filters: dict) -> str:
+    """A dynamic query with every optional filter switched on"""
+    return sql + "".join(filters.values())
+
+def tool_queries() -> List[Tuple[str, str]]:
+    """
+    Every query the tools run, named, with all optional filters switched on.
+
+    The SQL is imported from the tool modules themselves, so the plan check
+    always sees what actually runs. Imported lazily: migrations do not need
+    the tool modules or their dependencies.
+    """
+    import appointment_tools as at
+    import ai_doctor_tools
+    import parking_allocator as pa
+    import parking_tools as pt
+
+    return [
+        ("validate_appointment_time: schedule", at.APPOINTMENT_RULES_SQL),
+        ("validate_appointment_time: daily count", at.DAILY_APPOINTMENT_COUNT_SQL),
+        ("validate_appointment_time: overlap", at.APPOINTMENT_OVERLAP_SQL),
+        ("get_available_slots: schedule", at.DOCTOR_SCHEDULE_SQL),
+        ("get_available_slots: bookings", at.DAY_BOOKINGS_SQL),
+        ("get_available_slots_bulk: bookings", at.BULK_BOOKINGS_SQL.format(doctor_ids="?, ?, ?")),
+        ("fetch_patient_info: patient", at.PATIENT_SQL),
+        ("fetch_patient_info: appointments", at.RECENT_APPOINTMENTS_SQL),
+        ("fetch_patient_info: records", at.RECENT_RECORDS_SQL),
+        ("search_departments", _all_filters(at.SEARCH_DEPARTMENTS_SQL, at.SEARCH_DEPARTMENTS_FILTERS)),
+        ("search_doctors", _all_filters(at.SEARCH_DOCTORS_SQL, at.SEARCH_DOCTORS_FILTERS)),
+        ("search_available_appointments: doctors",
+         _all_filters(at.AVAILABLE_DOCTORS_SQL, at.AVAILABLE_DOCTORS_FILTERS)),
+        ("update_appointment: ownership", at.APPOINTMENT_STATUS_SQL),
+        ("cancel_appointment: ownership", at.CANCELLATION_CHECK_SQL),
+        ("cancel_appointment: cancel", at.CANCEL_APPOINTMENT_SQL),
+        ("get_upcoming_appointments", at.UPCOMING_APPOINTMENTS_SQL),
+        ("search_medical_records", _all_filters(at.SEARCH_RECORDS_SQL, at.VISIT_DATE_FILTERS)),
+        ("submit_doctor_review: eligibility", at.REVIEW_ELIGIBILITY_SQL),
+        ("get_medical_expenses", _all_filters(at.MEDICAL_EXPENSES_SQL, at.VISIT_DATE_FILTERS)),
+        ("get_patient_medical_history: records", ai_doctor_tools.MEDICAL_HISTORY_SQL),
+        ("get_parking_availability",
+         _all_filters(pt.PARKING_AVAILABILITY_SQL, pt.PARKING_AVAILABILITY_FILTERS)),
+        ("spot allocator: area spots", pa.AREA_SPOTS_SQL),
+        ("spot allocator: area reservations", pa.AREA_RESERVATIONS_SQL),
+        ("spot allocator: conflict check", pa.SPOT_CONFLICT_SQL),
+        ("cancel_parking_reservation: ownership", pt.RESERVATION_CHECK_SQL),
+        ("cancel_parking_reservation: cancel", pt.CANCEL_RESERVATION_SQL),
+        ("appointment_stays", pt.APPOINTMENT_STAYS_SQL),
+        ("parking occupancy: update", pt.OCCUPANCY_UPSERT_SQL),
+    ]
+
+# Small reference tables that are fine to scan in full
+LOOKUP_TABLES = {"departments", "doctors", "parking_facilities"}
+
+_TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_SQL_KEYWORDS = {"WHERE", "JOIN", "LEFT", "INNER", "ON", "SET", "ORDER", "GROUP", "LIMIT"}
+
+def _table_aliases(sql: str) -> dict:
+    aliases = {}
+    for table, alias in _TABLE_REFERENCE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+def explain_query(conn: sqlite3.Connection, sql: str) -> List[str]:
+    """Return the EXPLAIN QUERY PLAN detail lines for a parameterised query"""
+    params = [None] * sql.count('?')
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def check_query_plans(
+    conn: Optional[sqlite3.Connection] = None,
+    queries: Optional[List[Tuple[str, str]]] = None
+) -> List[Tuple[str, str]]:
+    """Find full table scans of non-lookup tables in the tool queries
+
+    Returns:
+        (query name, plan detail) for every offending scan
+    """
+    queries = tool_queries() if queries is None else queries
+    borrowed = conn is None
+    if borrowed:
+        conn = acquire_connection()
+
+    try:
+        problems = []
+        for name, sql in queries:
+            aliases = _table_aliases(sql)
+            try:
+                plan = explain_query(conn, sql)
+            except sqlite3.OperationalError as e:
+                problems.append((name, f"cannot plan query: {e}"))
+                continue
+            for detail in plan:
+                # SCAN CONSTANT ROW is a SELECT with no FROM, e.g. of scalar subqueries
+                match = re.match(r"SCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)", detail)
+                if not match:
+                    continue
+                table = aliases.get(match.group(1), match.group(1))
+                if table not in LOOKUP_TABLES:
+                    problems.append((name, detail))
+        return problems
+    finally:
+        if borrowed:
+            release_connection(conn)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hospital database schema management")
+    parser.add_argument("command", choices=["migrate", "check", "version"])
+    parser.add_argument("--db", help="Database path (defaults to HOSPITAL_DB_PATH)")
+    args = parser.parse_args(argv)
+
+    # Migrations only run when explicitly requested from the command line
+    configure_database(path=args.db, auto_migrate=False)
+    conn = acquire_connection()
+
+    try:
+        if args.command == "migrate":
+            version = migrate(conn)
+            print(f"{get_database_settings().path} is at schema version {version}")
+        elif args.command == "version":
+            print(f"Schema version {get_schema_version(conn)} (latest {SCHEMA_VERSION})")
+        else:
+            queries = tool_queries()
+            problems = check_query_plans(conn, queries)
+            for name, detail in problems:
+                print(f"FULL SCAN  {name}: {detail}")
+            print(f"Checked {len(queries)} queries, {len(problems)} problem(s)")
+            return 1 if problems else 0
+        return 0
+    finally:
+        release_connection(conn)
+
+if __name__ == "__main__":
+    sys.exit(main())
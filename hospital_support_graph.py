@@ -1,5 +1,6 @@
 import getpass
 import os
+import threading
 from dotenv import load_dotenv
 import sqlite3
 import datetime
@@ -9,21 +10,21 @@ from enum import Enum
 from dataclasses import dataclass
 from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
 from langgraph.prebuilt import ToolNode
 
 from appointment_tools import *
 from map_tools import *
+from route_planning import plan_arrival_times
 from parking_tools import *
 from ai_doctor_tools import *
 
-from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.runnables import Runnable, RunnableConfig
 from langgraph.graph.message import AnyMessage, add_messages
-from langchain_openai import ChatOpenAI
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import tools_condition
-from langgraph.checkpoint.memory import MemorySaver
+from checkpointer import create_checkpointer
 
 import datetime
 from typing import Optional, List
@@ -80,8 +81,14 @@ def handle_tool_error(state) -> dict:
     }
 
 
-def create_tool_node_with_fallback(tools: list) -> dict:
-    return ToolNode(tools).with_fallbacks(
+def create_tool_node_with_fallback(tools: list, max_concurrency: Optional[int] = None) -> dict:
+    # ToolNode runs the tool calls of one message concurrently: on a thread
+    # pool (capped by max_concurrency) under invoke, and with asyncio.gather
+    # over the tools' coroutines under ainvoke/astream
+    node = ToolNode(tools)
+    if max_concurrency:
+        node = node.with_config(max_concurrency=max_concurrency)
+    return node.with_fallbacks(
         [RunnableLambda(handle_tool_error)], exception_key="error"
     )
     
@@ -102,7 +109,30 @@ class State(TypedDict):
         update_dialog_stack,
     ]
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+_llm = None
+_lazy_lock = threading.Lock()
+
+def get_llm():
+    """Chat model shared by every assistant; langchain_openai is imported and the client created on first use"""
+    global _llm
+    if _llm is None:
+        with _lazy_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+                _llm = ChatOpenAI(model="gpt-4o-mini")
+    return _llm
+
+_tavily = None
+
+@tool("tavily_search_results_json")
+def tavily_search(query: str) -> list:
+    """A search engine optimized for comprehensive, accurate, and trusted results. Useful for when you need to answer questions about current events. Input should be a search query."""
+    # langchain_community and the Tavily client are only loaded once a search runs
+    global _tavily
+    if _tavily is None:
+        from langchain_community.tools.tavily_search import TavilySearchResults
+        _tavily = TavilySearchResults(max_results=1)
+    return _tavily.invoke({"query": query})
 
 # 整合所有工具
 hospital_tools = [
@@ -132,15 +162,35 @@ hospital_tools = [
     # 停车相关工具
     get_parking_availability,
     reserve_parking_spot,
+    reserve_parking_bulk,
     cancel_parking_reservation,
     
     # 通用搜索工具
-    TavilySearchResults(max_results=1)
+    tavily_search
 ]
 
 class Assistant:
-    def __init__(self, runnable: Runnable):
-        self.runnable = runnable
+    def __init__(self, make_runnable: Callable[[], Runnable]):
+        # The prompt | llm.bind_tools(...) runnable is built on the first turn
+        self._make_runnable = make_runnable
+        self._runnable = None
+        self._lock = threading.Lock()
+
+    @property
+    def runnable(self) -> Runnable:
+        if self._runnable is None:
+            with self._lock:
+                if self._runnable is None:
+                    self._runnable = self._make_runnable()
+        return self._runnable
+
+    @staticmethod
+    def _is_empty(result) -> bool:
+        return not result.tool_calls and (
+            not result.content
+            or isinstance(result.content, list)
+            and not result.content[0].get("text")
+        )
 
     def __call__(self, state: State, config: RunnableConfig):
         while True:
@@ -150,17 +200,31 @@ class Assistant:
             result = self.runnable.invoke(state)
             # If the LLM happens to return an empty response, we will re-prompt it
             # for an actual response.
-            if not result.tool_calls and (
-                not result.content
-                or isinstance(result.content, list)
-                and not result.content[0].get("text")
-            ):
+            if self._is_empty(result):
                 messages = state["messages"] + [("user", "Respond with a real output.")]
                 state = {**state, "messages": messages}
             else:
                 break
         return {"messages": result}
 
+    async def acall(self, state: State, config: RunnableConfig):
+        """Async variant used when the graph runs under ainvoke/astream"""
+        while True:
+            configuration = config.get("configurable", {})
+            passenger_id = configuration.get("passenger_id", None)
+            state = {**state, "user_info": passenger_id}
+            result = await self.runnable.ainvoke(state)
+            if self._is_empty(result):
+                messages = state["messages"] + [("user", "Respond with a real output.")]
+                state = {**state, "messages": messages}
+            else:
+                break
+        return {"messages": result}
+
+    def as_node(self) -> RunnableLambda:
+        """Graph node that calls the LLM natively under both sync and async execution"""
+        return RunnableLambda(self.__call__, afunc=self.acall)
+
 
 # Define CompleteOrEscalate tool
 class CompleteOrEscalate(BaseModel):
@@ -184,6 +248,10 @@ class CompleteOrEscalate(BaseModel):
             },
         }
 
+def bound_llm(prompt: ChatPromptTemplate, tools: list) -> Callable[[], Runnable]:
+    """Factory for prompt | llm bound to tools (plus CompleteOrEscalate), for Assistant"""
+    return lambda: prompt | get_llm().bind_tools(tools + [CompleteOrEscalate])
+
 # 1. Appointment Assistant
 appointment_prompt = ChatPromptTemplate.from_messages([
     (
@@ -204,7 +272,7 @@ appointment_prompt = ChatPromptTemplate.from_messages([
 appointment_safe_tools = [search_doctors, search_departments, search_available_appointments, get_upcoming_appointments]
 appointment_sensitive_tools = [book_appointment, update_appointment, cancel_appointment]
 appointment_tools = appointment_safe_tools + appointment_sensitive_tools
-appointment_runnable = appointment_prompt | llm.bind_tools(appointment_tools + [CompleteOrEscalate])
+appointment_runnable = bound_llm(appointment_prompt, appointment_tools)
 
 
 # 2. AI Doctor Assistant
@@ -224,7 +292,7 @@ ai_doctor_prompt = ChatPromptTemplate.from_messages([
 ]).partial(time=datetime.now)
 
 ai_doctor_safe_tools = [symptom_analysis, get_patient_medical_history, search_medical_records]
-ai_doctor_runnable = ai_doctor_prompt | llm.bind_tools(ai_doctor_safe_tools + [CompleteOrEscalate])
+ai_doctor_runnable = bound_llm(ai_doctor_prompt, ai_doctor_safe_tools)
 
 
 # 3a. Direction Assistant
@@ -241,8 +309,8 @@ direction_prompt = ChatPromptTemplate.from_messages([
     ("placeholder", "{messages}"),
 ]).partial(time=datetime.now)
 
-direction_tools = [get_estimated_arrival_time, get_route_to_hospital]
-direction_runnable = direction_prompt | llm.bind_tools(direction_tools + [CompleteOrEscalate])
+direction_tools = [get_estimated_arrival_time, get_route_to_hospital, plan_arrival_times]
+direction_runnable = bound_llm(direction_prompt, direction_tools)
 
 # 3b. Parking Assistant
 parking_prompt = ChatPromptTemplate.from_messages([
@@ -259,9 +327,9 @@ parking_prompt = ChatPromptTemplate.from_messages([
 ]).partial(time=datetime.now)
 
 parking_safe_tools = [get_parking_availability]
-parking_sensitive_tools = [reserve_parking_spot, cancel_parking_reservation]
+parking_sensitive_tools = [reserve_parking_spot, reserve_parking_bulk, cancel_parking_reservation]
 parking_tools = parking_safe_tools + parking_sensitive_tools
-parking_runnable = parking_prompt | llm.bind_tools(parking_tools + [CompleteOrEscalate])
+parking_runnable = bound_llm(parking_prompt, parking_tools)
 
 # Update routing tools to include new assistants
 class ToAppointmentAssistant(BaseModel):
@@ -334,13 +402,11 @@ primary_assistant_tools = [
     # Add any general tools that the primary assistant should have direct access to
     search_medical_records,
     get_medical_expenses,
-    TavilySearchResults(max_results=1)
+    tavily_search
 ]
 
 # Create the primary assistant's runnable
-assistant_runnable = primary_assistant_prompt | llm.bind_tools(
-    primary_assistant_tools + [CompleteOrEscalate]
-)
+assistant_runnable = bound_llm(primary_assistant_prompt, primary_assistant_tools)
 
 # 1. Define State and Entry Node Utility
 
@@ -378,7 +444,7 @@ builder.add_node(
     "enter_appointment",
     create_entry_node("Medical Appointment Assistant", "appointment")
 )
-builder.add_node("appointment", Assistant(appointment_runnable))
+builder.add_node("appointment", Assistant(appointment_runnable).as_node())
 builder.add_edge("enter_appointment", "appointment")
 builder.add_node(
     "appointment_safe_tools",
@@ -416,11 +482,14 @@ builder.add_node(
     "enter_ai_doctor",
     create_entry_node("AI Medical Assistant", "ai_doctor")
 )
-builder.add_node("ai_doctor", Assistant(ai_doctor_runnable))
+builder.add_node("ai_doctor", Assistant(ai_doctor_runnable).as_node())
 builder.add_edge("enter_ai_doctor", "ai_doctor")
 builder.add_node(
     "ai_doctor_safe_tools",
-    create_tool_node_with_fallback(ai_doctor_safe_tools)
+    create_tool_node_with_fallback(
+        ai_doctor_safe_tools,
+        max_concurrency=int(os.getenv("HOSPITAL_TOOL_MAX_CONCURRENCY", "4"))
+    )
 )
 
 def route_ai_doctor(state: State):
@@ -446,7 +515,7 @@ builder.add_node(
     "enter_direction",
     create_entry_node("Direction Assistant", "direction")
 )
-builder.add_node("direction", Assistant(direction_runnable))
+builder.add_node("direction", Assistant(direction_runnable).as_node())
 builder.add_edge("enter_direction", "direction")
 builder.add_node(
     "direction_tools",
@@ -476,7 +545,7 @@ builder.add_node(
     "enter_parking",
     create_entry_node("Parking Assistant", "parking")
 )
-builder.add_node("parking", Assistant(parking_runnable))
+builder.add_node("parking", Assistant(parking_runnable).as_node())
 builder.add_edge("enter_parking", "parking")
 builder.add_node(
     "parking_safe_tools",
@@ -529,7 +598,7 @@ builder.add_node("leave_skill", pop_dialog_state)
 builder.add_edge("leave_skill", "primary_assistant")
 
 # Add primary assistant
-builder.add_node("primary_assistant", Assistant(assistant_runnable))
+builder.add_node("primary_assistant", Assistant(assistant_runnable).as_node())
 builder.add_node(
     "primary_assistant_tools",
     create_tool_node_with_fallback(primary_assistant_tools)
@@ -584,14 +653,28 @@ def route_to_workflow(state: State) -> Literal[
 builder.add_conditional_edges("fetch_user_info", route_to_workflow)
 
 # 8. Compile the graph
-memory = MemorySaver()
-hospital_support_graph = builder.compile(
-    checkpointer=memory,
-    interrupt_before=[
-        "appointment_sensitive_tools",
-        "parking_sensitive_tools"
-    ]
-)
+_graph = None
+
+def get_hospital_support_graph():
+    """The compiled graph; its checkpointer (and database) is opened on first use"""
+    global _graph
+    if _graph is None:
+        with _lazy_lock:
+            if _graph is None:
+                _graph = builder.compile(
+                    checkpointer=create_checkpointer(),
+                    interrupt_before=[
+                        "appointment_sensitive_tools",
+                        "parking_sensitive_tools"
+                    ]
+                )
+    return _graph
+
+def __getattr__(name: str):
+    # `from hospital_support_graph import hospital_support_graph` compiles on demand
+    if name == "hospital_support_graph":
+        return get_hospital_support_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Make the graph available for import
-__all__ = ["hospital_support_graph"]
\ No newline at end of file
+__all__ = ["hospital_support_graph", "get_hospital_support_graph"]
\ No newline at end of file
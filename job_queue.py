@@ -0,0 +1,380 @@
+import asyncio
+import inspect
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+@dataclass(frozen=True)
+class JobSettings:
+    """Job table location and queue limits"""
+    path: str = os.getenv("HOSPITAL_JOB_DB", "jobs.sqlite")
+    max_queued: int = int(os.getenv("HOSPITAL_JOB_MAX_QUEUED", "100"))  # per job type
+    result_ttl_hours: float = float(os.getenv("HOSPITAL_JOB_RESULT_TTL_HOURS", "168"))
+    upload_dir: str = os.getenv("HOSPITAL_JOB_UPLOAD_DIR", "job_uploads")
+    # A worker process that has not heartbeated for lease_seconds is presumed
+    # dead: its running jobs are failed and its queued jobs adopted by others
+    lease_seconds: float = float(os.getenv("HOSPITAL_JOB_LEASE_SECONDS", "60"))
+    heartbeat_seconds: float = float(os.getenv("HOSPITAL_JOB_HEARTBEAT_SECONDS", "15"))
+    purge_interval_seconds: float = float(os.getenv("HOSPITAL_JOB_PURGE_INTERVAL_SECONDS", "3600"))
+    # Attempts at recording a finished job before giving up on it
+    finish_attempts: int = int(os.getenv("HOSPITAL_JOB_FINISH_ATTEMPTS", "5"))
+    latency_samples: int = 500
+
+class JobQueueFull(Exception):
+    """Raised when a job type already has max_queued jobs waiting"""
+
+class _JobType:
+    def __init__(self, name: str, handler: Callable, concurrency: int, latency_samples: int):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.pending = queue.Queue()
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_seconds = deque(maxlen=latency_samples)
+        self.run_seconds = deque(maxlen=latency_samples)
+
+def _latency(samples: deque) -> Dict:
+    if not samples:
+        return {"count": 0, "avg": None, "p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avg": round(sum(ordered) / len(ordered), 3),
+        "p50": round(ordered[len(ordered) // 2], 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max": round(ordered[-1], 3)
+    }
+
+class JobQueue:
+    """Bounded background workers for long-running jobs, persisted in SQLite.
+
+    Each registered job type gets its own FIFO and `concurrency` worker
+    threads. Handlers are called as handler(params, progress) and may be
+    plain functions or coroutines; progress(message) records a progress note
+    that status polls return. Results and errors are stored in the job table
+    so they can still be fetched after a restart.
+
+    Several processes may share one job table. Every job records the
+    process that owns it (its submitter until a worker claims it), and each
+    process heartbeats in job_workers while its workers run. Claims are a
+    conditional UPDATE, so a job runs at most once.
+    """
+
+    def __init__(self, settings: Optional[JobSettings] = None):
+        self.settings = settings or JobSettings()
+        self._types: Dict[str, _JobType] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._local = threading.local()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._ready = False
+        self._setup_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.settings.path, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._setup(conn)
+            self._local.conn = conn
+        return conn
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        """Create the job tables and purge expired jobs on the first connection"""
+        with self._setup_lock:
+            if self._ready:
+                return
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    submitted_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_type_status ON jobs(job_type, status, submitted_at);
+                CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at);
+                CREATE TABLE IF NOT EXISTS job_workers (
+                    owner TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL
+                );
+            ''')
+            # Job tables created before jobs had owners
+            if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_owner ON jobs(status, owner)")
+            conn.commit()
+            self._purge_finished(conn)
+            self._ready = True
+
+    def _update(self, job_id: str, **fields) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._conn()
+        conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+    def _purge_finished(self, conn: sqlite3.Connection) -> None:
+        cutoff = time.time() - self.settings.result_ttl_hours * 3600
+        conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+        conn.commit()
+
+    def register(self, job_type: str, handler: Callable, concurrency: int = 1) -> None:
+        """Add a job type; HOSPITAL_JOB_CONCURRENCY_<JOB_TYPE> overrides its concurrency"""
+        concurrency = int(os.getenv(f"HOSPITAL_JOB_CONCURRENCY_{job_type.upper()}", concurrency))
+        self._types[job_type] = _JobType(job_type, handler, max(1, concurrency), self.settings.latency_samples)
+
+    def start(self) -> None:
+        """Start the workers on first use.
+
+        Starting lazily keeps processes that import the app without serving
+        it (such as the Flask reloader's parent) from running jobs. Jobs of
+        processes whose lease has expired are recovered now and on every
+        heartbeat after: queued ones are adopted, running ones marked failed.
+        Jobs of other live processes are left alone.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._heartbeat()
+        self._recover()
+        for kind in self._types.values():
+            for i in range(kind.concurrency):
+                threading.Thread(
+                    target=self._work, args=(kind,), name=f"job-{kind.name}-{i}", daemon=True
+                ).start()
+        threading.Thread(target=self._keep_alive, name="job-heartbeat", daemon=True).start()
+
+    def _heartbeat(self) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO job_workers (owner, heartbeat_at) VALUES (?, ?)",
+            (self.owner, time.time())
+        )
+        conn.commit()
+
+    def _keep_alive(self) -> None:
+        last_purge = time.monotonic()
+        while True:
+            time.sleep(self.settings.heartbeat_seconds)
+            try:
+                self._heartbeat()
+                self._recover()
+                if time.monotonic() - last_purge >= self.settings.purge_interval_seconds:
+                    self._purge_finished(self._conn())
+                    last_purge = time.monotonic()
+            except sqlite3.Error as e:
+                print(f"Warning: job queue heartbeat failed: {str(e)}")
+
+    def _recover(self) -> None:
+        """Fail running jobs and adopt queued jobs of processes whose lease expired"""
+        if not self._types:
+            return
+        conn = self._conn()
+        now = time.time()
+        types = list(self._types)
+        dead = f'''
+            job_type IN ({", ".join("?" * len(types))})
+            AND (owner IS NULL OR owner NOT IN (
+                SELECT owner FROM job_workers WHERE heartbeat_at >= ?
+            ))
+        '''
+        alive_since = now - self.settings.lease_seconds
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            failed = conn.execute(f'''
+                UPDATE jobs SET status = ?, error = ?, finished_at = ?
+                WHERE status = ? AND {dead}
+            ''', (FAILED, "Interrupted: the worker running it stopped", now, RUNNING,
+                  *types, alive_since)).rowcount
+            adopted = conn.execute(f'''
+                SELECT job_id, job_type FROM jobs
+                WHERE status = ? AND {dead}
+                ORDER BY submitted_at
+            ''', (QUEUED, *types, alive_since)).fetchall()
+            conn.executemany("UPDATE jobs SET owner = ? WHERE job_id = ?",
+                             [(self.owner, job_id) for job_id, _ in adopted])
+            conn.execute("DELETE FROM job_workers WHERE heartbeat_at < ?", (alive_since,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        for job_id, job_type in adopted:
+            self._types[job_type].pending.put(job_id)
+        if failed or adopted:
+            print(f"Recovered jobs of stopped workers: {failed} failed, {len(adopted)} requeued")
+
+    def submit(self, job_type: str, params: Dict) -> str:
+        """Queue a job and return its id"""
+        kind = self._types.get(job_type)
+        if kind is None:
+            raise ValueError(f"Unknown job type: {job_type}")
+        self.start()
+        with self._lock:
+            if kind.pending.qsize() >= self.settings.max_queued:
+                kind.rejected += 1
+                raise JobQueueFull(f"Too many queued {job_type} jobs, please try again later")
+            job_id = str(uuid.uuid4())
+            conn = self._conn()
+            conn.execute('''
+                INSERT INTO jobs (job_id, job_type, status, params, submitted_at, owner)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (job_id, job_type, QUEUED, json.dumps(params), time.time(), self.owner))
+            conn.commit()
+            kind.pending.put(job_id)
+        return job_id
+
+    def get(self, job_id: str, include_result: bool = False) -> Optional[Dict]:
+        """Job status, progress and timings; the stored result only when include_result"""
+        self.start()
+        row = self._conn().execute('''
+            SELECT job_id, job_type, status, progress, error, submitted_at, started_at, finished_at, result
+            FROM jobs WHERE job_id = ?
+        ''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row[0],
+            "job_type": row[1],
+            "status": row[2],
+            "progress": row[3],
+            "error": row[4],
+            "submitted_at": row[5],
+            "started_at": row[6],
+            "finished_at": row[7]
+        }
+        if job["status"] == QUEUED:
+            job["queue_position"] = self._queue_position(row[1], row[5])
+        if include_result:
+            job["result"] = json.loads(row[8]) if row[8] is not None else None
+        return job
+
+    def _queue_position(self, job_type: str, submitted_at: float) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE job_type = ? AND status = ? AND submitted_at < ?",
+            (job_type, QUEUED, submitted_at)
+        ).fetchone()[0] + 1
+
+    def _claim(self, job_id: str) -> Optional[tuple]:
+        """(started_at, params, submitted_at) if this worker claimed the job, else None"""
+        # Claim atomically: only one worker, in any process, moves it out of queued
+        started = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner = ? WHERE job_id = ? AND status = ?",
+                (RUNNING, started, self.owner, job_id, QUEUED)
+            ).rowcount
+            row = conn.execute(
+                "SELECT params, submitted_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if not claimed:
+            return None
+        return started, json.loads(row[0]), row[1]
+
+    def _finish(self, job_id: str, **fields) -> None:
+        """Record a job's outcome, retrying while the database is busy"""
+        for attempt in range(self.settings.finish_attempts):
+            try:
+                self._update(job_id, **fields)
+                return
+            except sqlite3.Error as e:
+                print(f"Warning: could not record job {job_id} as finished: {str(e)}")
+                self._conn().rollback()
+                time.sleep(min(2 ** attempt, 30))
+        print(f"Error: job {job_id} is left running, its outcome could not be stored")
+
+    def _work(self, kind: _JobType) -> None:
+        while True:
+            job_id = kind.pending.get()
+            try:
+                claim = self._claim(job_id)
+            except sqlite3.Error as e:
+                # Still queued; try again once the database is free
+                print(f"Warning: could not claim {kind.name} job {job_id}: {str(e)}")
+                time.sleep(1)
+                kind.pending.put(job_id)
+                continue
+            if claim is None:
+                continue
+            started, params, submitted_at = claim
+
+            with self._lock:
+                kind.running += 1
+                kind.wait_seconds.append(started - submitted_at)
+
+            def progress(message: str) -> None:
+                try:
+                    self._update(job_id, progress=message)
+                except sqlite3.Error as e:
+                    # A lost progress note must not fail the job
+                    self._conn().rollback()
+                    print(f"Warning: could not record progress of job {job_id}: {str(e)}")
+
+            status = FAILED
+            try:
+                try:
+                    result = kind.handler(params, progress)
+                    if inspect.isawaitable(result):
+                        result = asyncio.run(result)
+                    status, fields = SUCCEEDED, {"result": json.dumps(result, default=str)}
+                except Exception as e:
+                    print(f"{kind.name} job {job_id} failed: {str(e)}")
+                    status, fields = FAILED, {"error": str(e)}
+                self._finish(job_id, status=status, finished_at=time.time(), **fields)
+            finally:
+                with self._lock:
+                    kind.running -= 1
+                    kind.run_seconds.append(time.time() - started)
+                    if status == SUCCEEDED:
+                        kind.succeeded += 1
+                    else:
+                        kind.failed += 1
+
+    def metrics(self) -> Dict:
+        """Queue depth, worker usage and wait/run latency per job type"""
+        self.start()
+        with self._lock:
+            return {
+                name: {
+                    "queued": kind.pending.qsize(),
+                    "running": kind.running,
+                    "concurrency": kind.concurrency,
+                    "succeeded": kind.succeeded,
+                    "failed": kind.failed,
+                    "rejected": kind.rejected,
+                    "wait_seconds": _latency(kind.wait_seconds),
+                    "run_seconds": _latency(kind.run_seconds)
+                }
+                for name, kind in self._types.items()
+            }
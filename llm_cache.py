@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlite_cache import SqliteCache
+
+load_dotenv()
+
+@dataclass(frozen=True)
+class LLMCacheSettings:
+    """Location and bounds of the persistent LLM response cache"""
+    enabled: bool = os.getenv("HOSPITAL_LLM_CACHE", "true").lower() == "true"
+    path: str = os.getenv("HOSPITAL_LLM_CACHE_DB", "llm_cache.sqlite")
+    max_entries: int = int(os.getenv("HOSPITAL_LLM_CACHE_MAX_ENTRIES", "10000"))
+    ttl_hours: float = float(os.getenv("HOSPITAL_LLM_CACHE_TTL_HOURS", "24"))
+    # Entries are trimmed back to max_entries once every evict_every writes
+    evict_every: int = 50
+    # A hit refreshes last_used at most this often, so hits are reads only
+    touch_interval_seconds: float = 60
+
+def normalize_text(text: str) -> str:
+    """Prompt text with letter case and whitespace differences removed"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def cache_key(model: str, temperature: float, messages: List[Dict]) -> str:
+    """Content hash of a chat completion request"""
+    content = json.dumps({
+        "model": model,
+        "temperature": float(temperature),
+        "messages": [[m["role"], normalize_text(m["content"])] for m in messages]
+    }, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+class LLMResponseCache(SqliteCache):
+    """SQLite-backed cache of LLM responses with LRU and TTL eviction"""
+
+    def __init__(self, settings: Optional[LLMCacheSettings] = None):
+        self.settings = settings or LLMCacheSettings()
+        super().__init__(
+            self.settings.path, "llm_responses", self.settings.max_entries, self.settings.enabled,
+            self.settings.evict_every, self.settings.touch_interval_seconds
+        )
+        self.bypassed = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """The cached response for key, or None if missing or expired"""
+        return self.lookup(key)
+
+    def put(self, key: str, response: str) -> None:
+        self.store(key, response, self.settings.ttl_hours * 3600)
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        with self._lock:
+            stats["bypassed"] = self.bypassed
+        return stats
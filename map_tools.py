@@ -1,16 +1,57 @@
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
-import googlemaps
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from langchain_core.tools import tool
 from langchain_core.runnables import RunnableConfig
 import os
 from dotenv import load_dotenv
+from route_cache import RouteCache
 
 # Set up Google Maps API client
 load_dotenv()
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
-gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+
+_gmaps = None
+_gmaps_lock = threading.Lock()
+
+def get_gmaps():
+    """Google Maps client, imported and created on first use.
+
+    HOSPITAL_MAPS_CLIENT=stub selects the offline StubMapsClient instead.
+    """
+    global _gmaps
+    if _gmaps is None:
+        with _gmaps_lock:
+            if _gmaps is None:
+                if os.getenv("HOSPITAL_MAPS_CLIENT", "google") == "stub":
+                    from maps_stub import StubMapsClient
+                    _gmaps = StubMapsClient()
+                else:
+                    import googlemaps
+                    _gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+    return _gmaps
+
+def set_gmaps_client(client) -> None:
+    """Swap the maps client, e.g. for a StubMapsClient in benchmarks and offline runs"""
+    global _gmaps
+    with _gmaps_lock:
+        _gmaps = client
+
+# Directions to the hospital, cached per (start address, mode, time bucket)
+route_cache = RouteCache()
+
+def cached_directions(kind: str, start_address: str, mode: str, when: datetime, **kwargs) -> List[Dict]:
+    """gmaps.directions from start_address to the hospital, served from route_cache when fresh"""
+    key = route_cache.key(kind, start_address, mode, when)
+    directions = route_cache.get(key, mode)
+    if directions is None:
+        directions = get_gmaps().directions(start_address, HOSPITAL_ADDRESS, mode=mode, **kwargs)
+        if directions:
+            route_cache.put(key, mode, directions)
+    return directions
 
 # Hospital main address constants
 HOSPITAL_ADDRESS = "251 E Huron St, Chicago, IL 60611"
@@ -52,10 +93,11 @@ def get_route_to_hospital(
     try:  
         # Get route planning
         now = datetime.now()
-        directions = gmaps.directions(
+        directions = cached_directions(
+            "route",
             start_address,
-            HOSPITAL_ADDRESS,
-            mode=mode,
+            mode,
+            arrival_time or now,
             arrival_time=arrival_time or now,
             alternatives=True,
             traffic_model='best_guess' if mode == 'driving' else None
@@ -134,10 +176,11 @@ def get_estimated_arrival_time(
         departure_time = departure_time or datetime.now()
         
         # Get route planning
-        directions = gmaps.directions(
+        directions = cached_directions(
+            "eta",
             start_address,
-            HOSPITAL_ADDRESS,
-            mode=mode,
+            mode,
+            departure_time,
             departure_time=departure_time,
             traffic_model='best_guess' if mode == 'driving' else None
         )
@@ -161,33 +204,110 @@ def get_estimated_arrival_time(
     except Exception as e:
         return {"error": f"Failed to calculate arrival time: {str(e)}"}
 
-def get_traffic_conditions() -> Dict:
-    """Get real-time traffic conditions around the hospital"""
-    try:
-        # Get nearby roads information
-        print("get_traffic_conditions")
-        roads = gmaps.places_nearby(
+TRAFFIC_REFRESH_SECONDS = float(os.getenv("HOSPITAL_TRAFFIC_REFRESH_SECONDS", "300"))
+TRAFFIC_MAX_STALENESS_SECONDS = float(os.getenv("HOSPITAL_TRAFFIC_MAX_STALENESS_SECONDS", "900"))
+
+class TrafficSnapshot:
+    """Nearby-road conditions around the hospital, refreshed in the background.
+
+    A daemon thread rebuilds the snapshot every refresh_seconds, so readers
+    just return the latest one. A reader only refreshes inline when the
+    snapshot is missing or older than max_staleness_seconds (for example
+    after repeated refresh failures). Place names do not change, so they are
+    looked up once and kept for the life of the process.
+    """
+
+    def __init__(self, refresh_seconds: float = TRAFFIC_REFRESH_SECONDS,
+                 max_staleness_seconds: float = TRAFFIC_MAX_STALENESS_SECONDS,
+                 max_lookups: int = 5):
+        self.refresh_seconds = refresh_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        self.max_lookups = max_lookups
+        self.refreshes = 0
+        self.failures = 0
+        self._snapshot = None  # (time.monotonic() of refresh, conditions)
+        self._place_names: Dict[str, str] = {}
+        self._refresh_lock = threading.Lock()
+        self._started = False
+
+    def _place_name(self, place_id: str) -> str:
+        name = self._place_names.get(place_id)
+        if name is None:
+            name = get_gmaps().place(place_id)['result'].get('name', 'Unknown Road')
+            self._place_names[place_id] = name
+        return name
+
+    def refresh(self) -> Dict:
+        """Rebuild the snapshot now"""
+        roads = get_gmaps().places_nearby(
             location=(HOSPITAL_LOCATION['lat'], HOSPITAL_LOCATION['lng']),
             radius=1000,
             type='route'
         )
-        print(roads)
-        traffic_conditions = {
+        place_ids = [road['place_id'] for road in roads.get('results', [])[:self.max_lookups]]
+        missing = [place_id for place_id in place_ids if place_id not in self._place_names]
+        if missing:
+            # Look up new places concurrently instead of one round trip after another
+            with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                list(pool.map(self._place_name, missing))
+
+        conditions = {
             "hospital_name": "Northwestern Memorial Hospital",
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
             "overall_status": "Normal",
-            "nearby_roads": []
-        }
-
-        for road in roads.get('results', [])[:5]:
-            road_details = gmaps.place(road['place_id'])['result']
-            traffic_conditions["nearby_roads"].append({
-                "name": road_details.get('name', 'Unknown Road'),
+            "nearby_roads": [{
+                "name": self._place_names.get(place_id, 'Unknown Road'),
                 "status": "Normal",  # Can be updated with real traffic data
                 "congestion_level": "Light"  # Can be updated with real traffic data
-            })
+            } for place_id in place_ids]
+        }
+        self._snapshot = (time.monotonic(), conditions)
+        self.refreshes += 1
+        return conditions
+
+    def start(self) -> None:
+        """Start the background refresh thread (once)"""
+        with self._refresh_lock:
+            if self._started:
+                return
+            self._started = True
 
-        return traffic_conditions
+        def run():
+            while True:
+                try:
+                    with self._refresh_lock:
+                        self.refresh()
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Traffic snapshot refresh failed: {str(e)}")
+                time.sleep(self.refresh_seconds)
+
+        threading.Thread(target=run, name="traffic-snapshot", daemon=True).start()
+
+    def get(self) -> Dict:
+        """The latest snapshot, refreshing inline only if it is missing or too stale"""
+        self.start()
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot[0] > self.max_staleness_seconds:
+            with self._refresh_lock:
+                snapshot = self._snapshot
+                if snapshot is None or time.monotonic() - snapshot[0] > self.max_staleness_seconds:
+                    try:
+                        self.refresh()
+                    except Exception:
+                        self.failures += 1
+                        if snapshot is None:
+                            raise
+                    snapshot = self._snapshot
+        refreshed_at, conditions = snapshot
+        return {**conditions, "age_seconds": round(time.monotonic() - refreshed_at)}
+
+traffic_snapshot = TrafficSnapshot()
+
+def get_traffic_conditions() -> Dict:
+    """Get real-time traffic conditions around the hospital"""
+    try:
+        return traffic_snapshot.get()
 
     except Exception as e:
-        return {"error": f"Failed to get traffic conditions: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Failed to get traffic conditions: {str(e)}"}
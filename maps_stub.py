@@ -0,0 +1,69 @@
+import hashlib
+import threading
+import time
+from typing import Dict, List
+
+class StubMapsClient:
+    """Offline stand-in for googlemaps.Client.
+
+    Implements the calls map_tools makes (directions, distance_matrix,
+    places_nearby, place) with deterministic fake data derived from the
+    origin, after an optional simulated network latency. Select it with HOSPITAL_MAPS_CLIENT=stub or
+    map_tools.set_gmaps_client(StubMapsClient()).
+    """
+
+    SPEED_KMH = {"driving": 30, "transit": 20, "bicycling": 15, "walking": 5}
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def _leg(self, origin: str, mode: str, alternative: int = 0) -> Dict:
+        seed = int(hashlib.md5(origin.lower().encode("utf-8")).hexdigest()[:8], 16)
+        distance_m = 2000 + seed % 18000 + alternative * 1500
+        duration_s = int(distance_m / 1000 / self.SPEED_KMH.get(mode, 30) * 3600)
+        leg = {
+            "distance": {"value": distance_m, "text": f"{distance_m / 1000:.1f} km"},
+            "duration": {"value": duration_s, "text": f"{duration_s // 60} mins"},
+        }
+        if mode == "driving":
+            leg["duration_in_traffic"] = {"value": int(duration_s * 1.2)}
+        return leg
+
+    def directions(self, origin: str, destination: str, mode: str = "driving",
+                   alternatives: bool = False, **kwargs) -> List[Dict]:
+        self._call("directions")
+        routes = []
+        for i in range(2 if alternatives else 1):
+            leg = self._leg(origin, mode, i)
+            leg["steps"] = [
+                {"html_instructions": f"Head <b>north</b> from {origin}"},
+                {"html_instructions": f"Continue to <b>{destination}</b>"},
+            ]
+            routes.append({"legs": [leg], "summary": f"stub route {i + 1}"})
+        return routes
+
+    def distance_matrix(self, origins: List[str], destinations: List[str], mode: str = "driving",
+                        **kwargs) -> Dict:
+        self._call("distance_matrix")
+        return {
+            "status": "OK",
+            "rows": [{
+                "elements": [dict(self._leg(origin, mode), status="OK") for _ in destinations]
+            } for origin in origins]
+        }
+
+    def places_nearby(self, location=None, radius=None, type=None, **kwargs) -> Dict:
+        self._call("places_nearby")
+        return {"results": [{"place_id": f"stub-road-{i}"} for i in range(5)]}
+
+    def place(self, place_id: str, **kwargs) -> Dict:
+        self._call("place")
+        return {"result": {"name": f"Stub Road {place_id.rsplit('-', 1)[-1]}"}}
@@ -1,21 +1,131 @@
 from crewai import Agent, Task, Crew, Process
 from langchain_openai import ChatOpenAI
-from typing import Dict
+from pydantic import BaseModel, Field
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import hashlib
 import os
+import re
+import threading
+import time
 import dotenv
 
 dotenv.load_dotenv()
 
+_llm_lock = threading.Lock()
+_llm_clients: Dict[Tuple[str, float], ChatOpenAI] = {}
+
+def get_llm(model_name: str = "gpt-4o-mini", temperature: float = 0.7) -> ChatOpenAI:
+    """Shared, thread-safe ChatOpenAI client for (model_name, temperature)"""
+    key = (model_name, float(temperature))
+    with _llm_lock:
+        llm = _llm_clients.get(key)
+        if llm is None:
+            llm = ChatOpenAI(
+                model_name=model_name,
+                temperature=temperature,
+                api_key=os.getenv("OPENAI_API_KEY")
+            )
+            _llm_clients[key] = llm
+        return llm
+
+class TriageDecision(BaseModel):
+    """Structured triage output"""
+    specialists: List[str] = Field(description="Keys of the specialists needed, chosen only from the available specialists")
+
+def normalize_case(patient_case: str) -> str:
+    """Case text with letter case and whitespace differences removed"""
+    return re.sub(r"\s+", " ", patient_case).strip().lower()
+
+class TriageCache:
+    """
+    LRU cache of triage decisions with a TTL, keyed by a hash of the
+    normalized patient case, the model and the specialist catalog.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        if max_size is None:
+            max_size = int(os.getenv("HOSPITAL_TRIAGE_CACHE_SIZE", "1024"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("HOSPITAL_TRIAGE_CACHE_TTL_SECONDS", "3600"))
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(patient_case: str, model_name: str, temperature: float, specialists: Iterable[str]) -> str:
+        content = "\x1f".join([model_name, str(float(temperature)), ",".join(sorted(specialists)),
+                                normalize_case(patient_case)])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key: str, specialists: List[str]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(specialists))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+triage_cache = TriageCache()
+
 class MedicalDiagnosisCrew:
-    def __init__(self, model_name: str = "gpt-4o-mini", temperature: float = 0.7):
+    def __init__(self, model_name: str = "gpt-4o-mini", temperature: float = 0.7,
+                 parallel: Optional[bool] = None, max_concurrency: Optional[int] = None,
+                 llm: Optional[ChatOpenAI] = None, structured_triage: Optional[bool] = None):
         """
         Initialize the Medical Diagnosis Crew with customizable LLM parameters.
         
         Args:
             model_name (str): The name of the LLM model to use
             temperature (float): The temperature parameter for the LLM
+            parallel (bool): Run the specialist evaluations concurrently
+                (default: HOSPITAL_DIAGNOSIS_PARALLEL, true)
+            max_concurrency (int): Maximum specialists evaluating at once in parallel mode
+                (default: HOSPITAL_DIAGNOSIS_MAX_CONCURRENCY, 4)
+            llm (ChatOpenAI): Client to use instead of creating a new one
+            structured_triage (bool): Ask triage for a validated TriageDecision instead of free text
+                (default: HOSPITAL_DIAGNOSIS_STRUCTURED_TRIAGE, true)
         """
-        self.llm = ChatOpenAI(
+        if parallel is None:
+            parallel = os.getenv("HOSPITAL_DIAGNOSIS_PARALLEL", "true").lower() == "true"
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("HOSPITAL_DIAGNOSIS_MAX_CONCURRENCY", "4"))
+        if structured_triage is None:
+            structured_triage = os.getenv("HOSPITAL_DIAGNOSIS_STRUCTURED_TRIAGE", "true").lower() == "true"
+        self.model_name = model_name
+        self.temperature = temperature
+        self.parallel = parallel
+        self.max_concurrency = max(1, max_concurrency)
+        self.structured_triage = structured_triage
+        self.llm = llm or ChatOpenAI(
             model_name=model_name,
             temperature=temperature,
             api_key=os.getenv("OPENAI_API_KEY")
@@ -126,6 +236,15 @@ class MedicalDiagnosisCrew:
     def _create_triage_task(self, patient_case: str) -> Task:
         """Create the initial triage task."""
         available_specialists = list(self.specialists.keys())
+        if self.structured_triage:
+            answer_format = "Return the keys of the required specialists in the specialists list."
+            expected_output = ("A TriageDecision whose specialists list holds the required specialist keys, "
+                               "selected only from the available specialists list")
+        else:
+            answer_format = ('Please return your answer as a comma-separated list of specialist keys.\n'
+                             '            For example: "internist,cardiologist,neurologist"')
+            expected_output = ("A comma-separated list of required specialist keys, "
+                               "selected only from the available specialists list")
         return Task(
             description=f"""Analyze the following patient case and determine which medical 
             specialists are needed for proper diagnosis. 
@@ -133,15 +252,58 @@ class MedicalDiagnosisCrew:
             IMPORTANT: You must ONLY select from the following available specialists:
             {', '.join(available_specialists)}
             
-            Please return your answer as a comma-separated list of specialist keys.
-            For example: "internist,cardiologist,neurologist"
+            {answer_format}
             
             Patient Case:
             {patient_case}""",
-            expected_output="A comma-separated list of required specialist keys, selected only from the available specialists list",
-            agent=self.triage_agent
+            expected_output=expected_output,
+            agent=self.triage_agent,
+            output_pydantic=TriageDecision if self.structured_triage else None
         )
 
+    def _validate_specialists(self, keys: Iterable[str]) -> List[str]:
+        """Known specialist keys from a triage answer, normalized and de-duplicated in order."""
+        valid = []
+        for key in keys:
+            key = re.sub(r"[\s-]+", "_", key.strip().strip("\"'`.[]").lower())
+            if key in self.specialist_agents and key not in valid:
+                valid.append(key)
+        return valid
+
+    def _parse_triage(self, triage_result) -> List[str]:
+        decision = getattr(triage_result, 'pydantic', None)
+        if isinstance(decision, TriageDecision):
+            return self._validate_specialists(decision.specialists)
+        return self._validate_specialists(re.split(r"[,;\n]+", str(triage_result)))
+
+    def triage(self, patient_case: str, retries: int = 1) -> List[str]:
+        """
+        Select the specialists for a case.
+
+        Decisions are served from triage_cache when the same (normalized)
+        case was triaged recently. An answer with no known specialist is
+        retried, then falls back to the internist; fallbacks are not cached.
+        """
+        cache_key = TriageCache.key(patient_case, self.model_name, self.temperature, self.specialists)
+        cached = triage_cache.get(cache_key)
+        if cached:
+            return cached
+
+        for _ in range(retries + 1):
+            triage_crew = Crew(
+                agents=[self.triage_agent],
+                tasks=[self._create_triage_task(patient_case)],
+                verbose=True,
+                process=Process.sequential
+            )
+            specialists = self._parse_triage(triage_crew.kickoff())
+            if specialists:
+                triage_cache.put(cache_key, specialists)
+                return specialists
+
+        print("Warning: triage selected no known specialists, falling back to the internist")
+        return ['internist']
+
     def run_diagnosis(self, patient_case: str) -> str:
         """
         Run the complete medical diagnosis process.
@@ -153,41 +315,51 @@ class MedicalDiagnosisCrew:
             str: The final diagnosis and treatment plan
         """
         # Step 1: Triage
-        triage_task = self._create_triage_task(patient_case)
-        triage_crew = Crew(
-            agents=[self.triage_agent],
-            tasks=[triage_task],
-            verbose=True,
-            process=Process.sequential
-        )
-
-        # Get triage results
-        triage_result = triage_crew.kickoff()
-        triage_result_str = str(triage_result)
-        required_specialists = [s.strip() for s in triage_result_str.split(',')]
+        required_specialists = self.triage(patient_case)
+        triage_result_str = ", ".join(required_specialists)
 
         # Step 2: Create specialist team and tasks
         selected_agents = {k: self.specialist_agents[k] for k in required_specialists 
                          if k in self.specialist_agents}
-        specialist_tasks = []
-
-        # Create tasks for each specialist
-        for specialist_key, agent in selected_agents.items():
-            task = Task(
-                description=f"""Review the patient case and provide your specialist evaluation.
-                
-                Patient Case:
-                {patient_case}
-                
-                Previous Evaluations:
-                {triage_result_str}""",
-                expected_output="A detailed medical evaluation from your specialist perspective",
-                agent=agent
-            )
-            specialist_tasks.append(task)
+        specialist_tasks = {
+            specialist_key: self._create_specialist_task(agent, patient_case, triage_result_str)
+            for specialist_key, agent in selected_agents.items()
+        }
+
+        if self.parallel:
+            return self._run_parallel(patient_case, selected_agents, specialist_tasks)
 
         # Create final synthesis task for CMO
-        synthesis_task = Task(
+        synthesis_task = self._create_synthesis_task(patient_case, "{context}")
+
+        # Create and run the medical crew
+        medical_crew = Crew(
+            agents=list(selected_agents.values()) + [self.specialist_agents['chief_medical_officer']],
+            tasks=list(specialist_tasks.values()) + [synthesis_task],
+            verbose=True,
+            process=Process.sequential
+        )
+
+        # Return final diagnosis
+        return medical_crew.kickoff()
+
+    def _create_specialist_task(self, agent: Agent, patient_case: str, triage_result: str) -> Task:
+        """Create the evaluation task for one specialist."""
+        return Task(
+            description=f"""Review the patient case and provide your specialist evaluation.
+            
+            Patient Case:
+            {patient_case}
+            
+            Previous Evaluations:
+            {triage_result}""",
+            expected_output="A detailed medical evaluation from your specialist perspective",
+            agent=agent
+        )
+
+    def _create_synthesis_task(self, patient_case: str, evaluations: str) -> Task:
+        """Create the CMO task that turns the specialist evaluations into a final diagnosis."""
+        return Task(
             description=f"""Review all specialist evaluations and provide a final diagnosis 
             and treatment plan.
             
@@ -195,22 +367,113 @@ class MedicalDiagnosisCrew:
             {patient_case}
             
             Specialist Evaluations:
-            {{context}}""",
+            {evaluations}""",
             expected_output="A comprehensive final diagnosis and treatment plan",
             agent=self.specialist_agents['chief_medical_officer']
         )
-        specialist_tasks.append(synthesis_task)
 
-        # Create and run the medical crew
-        medical_crew = Crew(
-            agents=list(selected_agents.values()) + [self.specialist_agents['chief_medical_officer']],
-            tasks=specialist_tasks,
+    def _run_parallel(self, patient_case: str, selected_agents: Dict[str, Agent],
+                      specialist_tasks: Dict[str, Task]):
+        """
+        Run the specialist evaluations concurrently, then the CMO synthesis.
+
+        Each specialist runs in its own single-task crew on a thread pool of
+        at most max_concurrency workers, so the evaluation step takes about as
+        long as the slowest specialist instead of the sum of all of them.
+        """
+        def evaluate(specialist_key: str) -> str:
+            crew = Crew(
+                agents=[selected_agents[specialist_key]],
+                tasks=[specialist_tasks[specialist_key]],
+                verbose=True,
+                process=Process.sequential
+            )
+            return str(crew.kickoff())
+
+        evaluations = {}
+        if specialist_tasks:
+            workers = min(self.max_concurrency, len(specialist_tasks))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="specialist") as pool:
+                futures = {key: pool.submit(evaluate, key) for key in specialist_tasks}
+                evaluations = {key: future.result() for key, future in futures.items()}
+
+        evaluations_text = "\n\n".join(
+            f"{selected_agents[key].role}:\n{evaluation}" for key, evaluation in evaluations.items()
+        )
+        synthesis_crew = Crew(
+            agents=[self.specialist_agents['chief_medical_officer']],
+            tasks=[self._create_synthesis_task(patient_case, evaluations_text)],
             verbose=True,
             process=Process.sequential
         )
+        return synthesis_crew.kickoff()
 
-        # Return final diagnosis
-        return medical_crew.kickoff()
+class CrewPool:
+    """
+    Process-wide pool of prebuilt MedicalDiagnosisCrew instances.
+
+    Crews are keyed by (model_name, temperature) and share one LLM client per
+    key. A crew is lent to one diagnosis at a time, so agent state is never
+    shared between concurrent requests, and returned afterwards for reuse;
+    each diagnosis still builds its own tasks. At most max_idle crews are
+    kept per key.
+    """
+
+    def __init__(self, max_idle: Optional[int] = None):
+        if max_idle is None:
+            max_idle = int(os.getenv("HOSPITAL_DIAGNOSIS_POOL_SIZE", "4"))
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle: Dict[Tuple[str, float], List[MedicalDiagnosisCrew]] = {}
+        self._lock = threading.Lock()
+
+    def _build(self, model_name: str, temperature: float) -> "MedicalDiagnosisCrew":
+        with self._lock:
+            self.created += 1
+        return MedicalDiagnosisCrew(
+            model_name=model_name,
+            temperature=temperature,
+            llm=get_llm(model_name, temperature)
+        )
+
+    def _release(self, key: Tuple[str, float], crew: "MedicalDiagnosisCrew") -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(crew)
+
+    @contextmanager
+    def crew(self, model_name: str = "gpt-4o-mini", temperature: float = 0.7) -> Iterator["MedicalDiagnosisCrew"]:
+        """Borrow a crew for one diagnosis"""
+        key = (model_name, float(temperature))
+        with self._lock:
+            idle = self._idle.get(key)
+            crew = idle.pop() if idle else None
+            if crew is not None:
+                self.reused += 1
+        if crew is None:
+            crew = self._build(model_name, temperature)
+        try:
+            yield crew
+        finally:
+            self._release(key, crew)
+
+    def warm(self, model_name: str = "gpt-4o-mini", temperature: float = 0.7, count: int = 1) -> None:
+        """Build crews ahead of the first request"""
+        key = (model_name, float(temperature))
+        for _ in range(count):
+            self._release(key, self._build(model_name, temperature))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "idle": {f"{model}@{temperature}": len(crews) for (model, temperature), crews in self._idle.items()}
+            }
+
+crew_pool = CrewPool()
 
 def main():
     """Example usage of the Medical Diagnosis Crew"""
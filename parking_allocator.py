@@ -0,0 +1,306 @@
+import itertools
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+from dotenv import load_dotenv
+from hospital_db import acquire_connection, release_connection, begin_immediate, TIMESTAMP_FORMAT
+
+load_dotenv()
+
+# Intervals are half-open (start, end) pairs of minutes since EPOCH
+Interval = Tuple[int, int]
+EPOCH = datetime(2000, 1, 1)
+UNBOUNDED = 10 ** 9
+T = TypeVar("T")
+
+@dataclass(frozen=True)
+class AllocatorSettings:
+    """Bounds of the in-memory parking spot index"""
+    # Longest reservation accepted; also bounds how far back conflicts are searched
+    max_reservation_hours: int = int(os.getenv("HOSPITAL_PARKING_MAX_HOURS", "24"))
+    # Reload an area from the database this often to pick up other processes' writes
+    refresh_seconds: float = float(os.getenv("HOSPITAL_PARKING_INDEX_REFRESH_SECONDS", "60"))
+    max_attempts: int = int(os.getenv("HOSPITAL_PARKING_ALLOCATION_ATTEMPTS", "5"))
+
+@dataclass(frozen=True)
+class SpotRequest:
+    """One stay to allocate: [start, start + duration_hours) in area_id"""
+    area_id: int
+    spot_type: str
+    start: datetime
+    duration_hours: int
+
+@dataclass(frozen=True)
+class Spot:
+    spot_id: int
+    spot_number: str
+    type: str
+    hourly_rate: float
+
+def to_minutes(moment: datetime) -> int:
+    return int((moment - EPOCH).total_seconds() // 60)
+
+def reservation_interval(start: datetime, duration_hours: int) -> Interval:
+    start_minute = to_minutes(start)
+    return start_minute, start_minute + duration_hours * 60
+
+# SQL the allocator runs; hospital_schema checks the plans of these same strings
+AREA_SPOTS_SQL = '''
+    SELECT ps.spot_id, ps.spot_number, ps.type, p.hourly_rate
+    FROM parking_spots ps
+    JOIN parking_facilities p ON ps.area_id = p.area_id
+    WHERE ps.area_id = ? AND ps.status = 'available'
+    ORDER BY ps.spot_number
+'''
+AREA_RESERVATIONS_SQL = '''
+    SELECT spot_id, reservation_time, duration_hours
+    FROM parking_reservations
+    WHERE area_id = ? AND status = 'confirmed' AND reservation_time >= ?
+'''
+SPOT_CONFLICT_SQL = '''
+    SELECT
+        (SELECT status FROM parking_spots WHERE spot_id = ?),
+        (SELECT COUNT(*) FROM parking_reservations
+         WHERE spot_id = ? AND status = 'confirmed'
+         AND reservation_time >= ? AND reservation_time < ?
+         AND datetime(reservation_time, '+' || duration_hours || ' hours') > ?)
+'''
+
+class AreaIndex:
+    """Available spots of one area with their reserved intervals, sorted per spot"""
+
+    def __init__(self, area_id: int):
+        self.area_id = area_id
+        self.lock = threading.Lock()
+        self.spots: Dict[int, Spot] = {}
+        self.intervals: Dict[int, List[Interval]] = {}
+        # Claims handed out but not yet committed, kept across reloads
+        self.pending: Dict[int, Tuple[int, Interval]] = {}
+        self.loaded_at = 0.0
+
+    def load(self, conn, since: datetime) -> None:
+        spots = conn.execute(AREA_SPOTS_SQL, (self.area_id,)).fetchall()
+        rows = conn.execute(AREA_RESERVATIONS_SQL, (self.area_id, since.strftime(TIMESTAMP_FORMAT))).fetchall()
+
+        self.spots = {row[0]: Spot(*row) for row in spots}
+        self.intervals = {spot_id: [] for spot_id in self.spots}
+        for spot_id, reservation_time, duration_hours in rows:
+            if spot_id in self.intervals:
+                start = datetime.fromisoformat(str(reservation_time))
+                insort(self.intervals[spot_id], reservation_interval(start, duration_hours))
+        for spot_id, interval in self.pending.values():
+            if spot_id in self.intervals:
+                insort(self.intervals[spot_id], interval)
+        self.loaded_at = time.monotonic()
+
+    def slack(self, spot_id: int, interval: Interval) -> Optional[int]:
+        """
+        Free minutes left around interval in the spot's gap, or None if it overlaps.
+
+        Open-ended gaps count as UNBOUNDED, so spots with nothing booked on
+        either side come last.
+        """
+        intervals = self.intervals.get(spot_id, [])
+        i = bisect_left(intervals, (interval[1],))
+        if i > 0 and intervals[i - 1][1] > interval[0]:
+            return None
+        before = interval[0] - intervals[i - 1][1] if i > 0 else UNBOUNDED
+        after = intervals[i][0] - interval[1] if i < len(intervals) else UNBOUNDED
+        return before + after
+
+    def best_fit(self, spot_type: str, interval: Interval) -> Optional[Spot]:
+        """The free spot of spot_type whose gap the interval fills most tightly"""
+        best, best_slack = None, None
+        for spot in self.spots.values():
+            if spot.type != spot_type:
+                continue
+            slack = self.slack(spot.spot_id, interval)
+            if slack is not None and (best_slack is None or slack < best_slack):
+                best, best_slack = spot, slack
+        return best
+
+    def add(self, spot_id: int, interval: Interval) -> None:
+        if spot_id in self.intervals:
+            insort(self.intervals[spot_id], interval)
+
+    def remove(self, spot_id: int, interval: Interval) -> None:
+        intervals = self.intervals.get(spot_id, [])
+        i = bisect_left(intervals, interval)
+        if i < len(intervals) and intervals[i] == interval:
+            del intervals[i]
+
+class SpotAllocator:
+    """
+    Hands out parking spots without double booking.
+
+    Each area keeps an in-memory index of its available spots and their
+    confirmed reservations, so finding a free spot is a binary search per
+    spot instead of a join over the reservation history. A spot is first
+    claimed in memory, which keeps concurrent callers in this process off
+    it, then re-checked and booked inside a single BEGIN IMMEDIATE
+    transaction, which keeps other processes off it. The database check is
+    what guarantees correctness; the index only decides what to try first.
+    """
+
+    def __init__(self, settings: Optional[AllocatorSettings] = None):
+        self.settings = settings or AllocatorSettings()
+        self._areas: Dict[int, AreaIndex] = {}
+        self._lock = threading.Lock()
+        self._claim_ids = itertools.count(1)
+        self.conflicts = 0
+
+    def _area(self, conn, area_id: int) -> AreaIndex:
+        with self._lock:
+            area = self._areas.setdefault(area_id, AreaIndex(area_id))
+        with area.lock:
+            if time.monotonic() - area.loaded_at >= self.settings.refresh_seconds:
+                self._load(conn, area)
+        return area
+
+    def _load(self, conn, area: AreaIndex) -> None:
+        since = datetime.now() - timedelta(hours=self.settings.max_reservation_hours)
+        area.load(conn, since)
+
+    def _conflicts(self, conn, spot_id: int, start: datetime, duration_hours: int) -> bool:
+        """Whether the spot is unavailable or overlaps a confirmed reservation, per the database"""
+        end = start + timedelta(hours=duration_hours)
+        earliest = start - timedelta(hours=self.settings.max_reservation_hours)
+        row = conn.execute(SPOT_CONFLICT_SQL, (
+            spot_id, spot_id, earliest.strftime(TIMESTAMP_FORMAT),
+            end.strftime(TIMESTAMP_FORMAT), start.strftime(TIMESTAMP_FORMAT)
+        )).fetchone()
+        return row[0] != 'available' or row[1] > 0
+
+    def _unclaim(self, areas: Dict[int, AreaIndex], claims: Dict, committed: bool) -> None:
+        for claim_id, area_id, spot, interval in claims.values():
+            area = areas[area_id]
+            with area.lock:
+                area.pending.pop(claim_id, None)
+                if not committed:
+                    area.remove(spot.spot_id, interval)
+
+    def allocate_many(
+        self,
+        requests: Sequence[SpotRequest],
+        book: Callable[[object, SpotRequest, Spot], T],
+        require_all: bool = False
+    ) -> List[Optional[T]]:
+        """
+        Reserve spots for many stays in one transaction.
+
+        Stays are placed in order of their end time, each on the spot whose
+        free gap it fills most tightly (best fit), which books as many stays
+        as possible when spots run short. book(cursor, request, spot) writes one reservation inside
+        the transaction. Returns book's results in request order, with None
+        for stays that found no spot; with require_all, nothing is booked
+        unless every stay fits.
+        """
+        for request in requests:
+            if not 0 < request.duration_hours <= self.settings.max_reservation_hours:
+                raise ValueError(
+                    f"Parking can be reserved for 1 to {self.settings.max_reservation_hours} hours")
+        results: List[Optional[T]] = [None] * len(requests)
+        if not requests:
+            return results
+        intervals = [reservation_interval(r.start, r.duration_hours) for r in requests]
+        order = sorted(range(len(requests)), key=lambda i: (intervals[i][1], intervals[i][0]))
+
+        conn = acquire_connection()
+        try:
+            areas = {area_id: self._area(conn, area_id)
+                     for area_id in sorted({request.area_id for request in requests})}
+            for _ in range(self.settings.max_attempts):
+                # i -> (claim_id, area_id, spot, interval)
+                claims = {}
+                for i in order:
+                    request = requests[i]
+                    area = areas[request.area_id]
+                    interval = intervals[i]
+                    with area.lock:
+                        spot = area.best_fit(request.spot_type, interval)
+                        if spot is not None:
+                            claim_id = next(self._claim_ids)
+                            area.pending[claim_id] = (spot.spot_id, interval)
+                            area.add(spot.spot_id, interval)
+                            claims[i] = (claim_id, request.area_id, spot, interval)
+                if require_all and len(claims) < len(requests):
+                    self._unclaim(areas, claims, committed=False)
+                    return results
+
+                committed = False
+                cursor = conn.cursor()
+                try:
+                    begin_immediate(conn)
+                    for i in order:
+                        if i not in claims:
+                            continue
+                        request, spot = requests[i], claims[i][2]
+                        if self._conflicts(conn, spot.spot_id, request.start, request.duration_hours):
+                            conn.rollback()
+                            break
+                        results[i] = book(cursor, request, spot)
+                    else:
+                        conn.commit()
+                        committed = True
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
+                    self._unclaim(areas, claims, committed)
+                if committed:
+                    return results
+
+                # Another process got there first: pick up its writes and place the batch again
+                results = [None] * len(requests)
+                with self._lock:
+                    self.conflicts += 1
+                for area in areas.values():
+                    with area.lock:
+                        self._load(conn, area)
+            return results
+        finally:
+            release_connection(conn)
+
+    def allocate(
+        self,
+        area_id: int,
+        spot_type: str,
+        start: datetime,
+        duration_hours: int,
+        book: Callable[[object, Spot], T]
+    ) -> Optional[T]:
+        """
+        Reserve a free spot of spot_type in area_id for [start, start + duration_hours).
+
+        book(cursor, spot) writes the reservation; it runs inside the
+        transaction that verified the spot, and its return value is returned
+        once committed. Returns None when the area has no free spot.
+        """
+        request = SpotRequest(area_id, spot_type, start, duration_hours)
+        return self.allocate_many([request], lambda cursor, _, spot: book(cursor, spot))[0]
+
+    def release(self, area_id: int, spot_id: int, start: datetime, duration_hours: int) -> None:
+        """Forget a reservation after its cancellation has been committed"""
+        with self._lock:
+            area = self._areas.get(area_id)
+        if area is not None:
+            with area.lock:
+                area.remove(spot_id, reservation_interval(start, duration_hours))
+
+    def invalidate(self, area_id: Optional[int] = None) -> None:
+        """Reload one area, or all of them, on next use (e.g. after spot status changes)"""
+        with self._lock:
+            if area_id is None:
+                areas = list(self._areas.values())
+            else:
+                areas = [self._areas[area_id]] if area_id in self._areas else []
+        for area in areas:
+            with area.lock:
+                area.loaded_at = 0.0
+
+spot_allocator = SpotAllocator()
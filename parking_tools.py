@@ -1,10 +1,18 @@
+import calendar
+import math
+import os
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 from enum import Enum
 from dataclasses import dataclass
 from langchain_core.tools import tool
 from langchain_core.runnables import RunnableConfig
-import sqlite3
+from hospital_db import acquire_connection, release_connection, begin_immediate, TIMESTAMP_FORMAT
+from parking_allocator import Spot, SpotRequest, spot_allocator
+
+MAX_BULK_RESERVATIONS = int(os.getenv("HOSPITAL_PARKING_MAX_BULK", "100"))
+# A recurring visit must fit within this many days of its first arrival
+MAX_RECURRENCE_DAYS = int(os.getenv("HOSPITAL_PARKING_MAX_RECURRENCE_DAYS", "366"))
 
 class ParkingType(Enum):
     STANDARD = "standard"
@@ -27,6 +35,74 @@ class ParkingSpot:
     status: ParkingStatus
     sensor_status: bool  # True if sensor is working
 
+# SQL run by the tools below; hospital_schema checks the plans of these same strings
+OCCUPANCY_UPSERT_SQL = '''
+    INSERT INTO parking_occupancy (area_id, bucket_start, reserved)
+    VALUES (?, ?, ?)
+    ON CONFLICT(area_id, bucket_start) DO UPDATE SET reserved = reserved + excluded.reserved
+'''
+# Reserved spots come from the hourly occupancy summary: the peak
+# number of confirmed reservations in any hour of the window
+PARKING_AVAILABILITY_SQL = """
+    SELECT
+        p.area_id,
+        p.level,
+        p.total_spaces,
+        p.parking_type,
+        p.hourly_rate,
+        (SELECT COUNT(*) FROM parking_spots ps
+         WHERE ps.area_id = p.area_id AND ps.status = 'available') as available_spots,
+        (SELECT COALESCE(MAX(o.reserved), 0) FROM parking_occupancy o
+         WHERE o.area_id = p.area_id
+         AND o.bucket_start >= ? AND o.bucket_start < ?) as reserved_spots
+    FROM parking_facilities p
+    WHERE 1=1
+"""
+PARKING_AVAILABILITY_FILTERS = {
+    "parking_type": " AND p.parking_type = ?",
+}
+INSERT_RESERVATION_SQL = '''
+    INSERT INTO parking_reservations (
+        area_id, spot_id, patient_id, reservation_time,
+        duration_hours, total_cost, status, created_at
+    ) VALUES (?, ?, ?, ?, ?, ?, 'confirmed', CURRENT_TIMESTAMP)
+'''
+RESERVATION_CHECK_SQL = '''
+    SELECT reservation_time, status, total_cost, area_id, duration_hours, spot_id
+    FROM parking_reservations
+    WHERE reservation_id = ? AND patient_id = ?
+'''
+CANCEL_RESERVATION_SQL = '''
+    UPDATE parking_reservations
+    SET status = 'cancelled',
+        cancelled_at = CURRENT_TIMESTAMP
+    WHERE reservation_id = ?
+'''
+APPOINTMENT_STAYS_SQL = '''
+    SELECT scheduled_time, end_time FROM appointments
+    WHERE patient_id = ? AND status = 'scheduled'
+    AND scheduled_time >= ? AND scheduled_time < ?
+    ORDER BY scheduled_time
+'''
+
+def occupancy_bucket(moment: datetime) -> datetime:
+    """Start of the hourly occupancy bucket containing moment"""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def adjust_occupancy(cursor, area_id: int, start: datetime, duration_hours: int, delta: int) -> None:
+    """Add delta to every hourly bucket the reservation overlaps.
+
+    Must run inside the transaction that inserts or cancels the reservation
+    so the summary never drifts from parking_reservations.
+    """
+    end = start + timedelta(hours=duration_hours)
+    bucket = occupancy_bucket(start)
+    rows = []
+    while bucket < end:
+        rows.append((area_id, bucket.strftime(TIMESTAMP_FORMAT), delta))
+        bucket += timedelta(hours=1)
+    cursor.executemany(OCCUPANCY_UPSERT_SQL, rows)
+
 @tool
 def get_parking_availability(
     arrival_time: Optional[datetime] = None,
@@ -36,38 +112,22 @@ def get_parking_availability(
     config: RunnableConfig
 ) -> Dict:
     """Get real-time parking availability information"""
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
-        query = """
-            SELECT 
-                p.area_id,
-                p.level,
-                p.total_spaces,
-                p.parking_type,
-                p.hourly_rate,
-                COUNT(ps.spot_id) as total_spots,
-                SUM(CASE WHEN ps.status = 'available' THEN 1 ELSE 0 END) as available_spots,
-                COUNT(pr.reservation_id) as reserved_spots
-            FROM parking_facilities p
-            LEFT JOIN parking_spots ps ON p.area_id = ps.area_id
-            LEFT JOIN parking_reservations pr ON p.area_id = pr.area_id
-                AND pr.reservation_time BETWEEN ? AND datetime(?, '+' || ? || ' hours')
-            WHERE 1=1
-        """
+        query = PARKING_AVAILABILITY_SQL
+        window_start = arrival_time or datetime.now()
+        window_end = window_start + timedelta(hours=duration_hours or 2)
         params = [
-            arrival_time or datetime.now(),
-            arrival_time or datetime.now(),
-            duration_hours or 2
+            occupancy_bucket(window_start).strftime(TIMESTAMP_FORMAT),
+            window_end.strftime(TIMESTAMP_FORMAT)
         ]
 
         if parking_type:
-            query += " AND p.parking_type = ?"
+            query += PARKING_AVAILABILITY_FILTERS["parking_type"]
             params.append(parking_type.value)
 
-        query += " GROUP BY p.area_id, p.level"
-
         cursor.execute(query, params)
         results = cursor.fetchall()
 
@@ -79,10 +139,10 @@ def get_parking_availability(
         }
 
         for result in results:
-            (area_id, level, total_spaces, p_type, rate, 
-             total_spots, available_spots, reserved_spots) = result
-            
-            current_available = available_spots - reserved_spots
+            (area_id, level, total_spaces, p_type, rate,
+             available_spots, reserved_spots) = result
+
+            current_available = max(available_spots - reserved_spots, 0)
             
             area_info = {
                 "area_id": area_id,
@@ -92,7 +152,7 @@ def get_parking_availability(
                 "total_spaces": total_spaces,
                 "available_spaces": current_available,
                 "reserved_spaces": reserved_spots,
-                "occupancy_percentage": round((1 - current_available/total_spaces) * 100, 1)
+                "occupancy_percentage": round((1 - current_available/total_spaces) * 100, 1) if total_spaces else 0.0
             }
             
             availability["areas"].append(area_info)
@@ -103,7 +163,7 @@ def get_parking_availability(
 
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 @tool
 def reserve_parking_spot(
@@ -120,41 +180,21 @@ def reserve_parking_spot(
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
-    cursor = conn.cursor()
+    def book(cursor, spot: Spot):
+        total_cost = spot.hourly_rate * duration_hours
+        cursor.execute(INSERT_RESERVATION_SQL, (area_id, spot.spot_id, patient_id, arrival_time,
+                                                duration_hours, total_cost))
+        reservation_id = cursor.lastrowid
+        adjust_occupancy(cursor, area_id, arrival_time, duration_hours, 1)
+        return reservation_id, spot.spot_number, total_cost
 
     try:
-        cursor.execute('''
-            SELECT ps.spot_id, ps.spot_number, p.hourly_rate
-            FROM parking_spots ps
-            JOIN parking_facilities p ON ps.area_id = p.area_id
-            LEFT JOIN parking_reservations pr 
-                ON ps.spot_id = pr.spot_id
-                AND pr.reservation_time BETWEEN ? AND datetime(?, '+' || ? || ' hours')
-            WHERE ps.area_id = ?
-            AND ps.type = ?
-            AND ps.status = 'available'
-            AND pr.reservation_id IS NULL
-            LIMIT 1
-        ''', (arrival_time, arrival_time, duration_hours, area_id, parking_type.value))
-
-        spot = cursor.fetchone()
-        if not spot:
+        booked = spot_allocator.allocate(
+            area_id, (parking_type or ParkingType.STANDARD).value, arrival_time, duration_hours, book
+        )
+        if booked is None:
             return {"error": "No available parking spots for the selected criteria"}
-
-        spot_id, spot_number, hourly_rate = spot
-        total_cost = hourly_rate * duration_hours
-
-        cursor.execute('''
-            INSERT INTO parking_reservations (
-                area_id, spot_id, patient_id, reservation_time,
-                duration_hours, total_cost, status, created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, 'confirmed', CURRENT_TIMESTAMP)
-        ''', (area_id, spot_id, patient_id, arrival_time, 
-              duration_hours, total_cost))
-
-        reservation_id = cursor.lastrowid
-        conn.commit()
+        reservation_id, spot_number, total_cost = booked
 
         qr_code = f"PARKING-{reservation_id}-{spot_number}"
 
@@ -185,11 +225,7 @@ def reserve_parking_spot(
         }
 
     except Exception as e:
-        conn.rollback()
         return {"error": f"Failed to reserve parking: {str(e)}"}
-    finally:
-        cursor.close()
-        conn.close()
 
 @tool
 def cancel_parking_reservation(
@@ -203,16 +239,13 @@ def cancel_parking_reservation(
     if not patient_id:
         raise ValueError("No patient ID configured.")
 
-    conn = sqlite3.connect('hospital.sqlite')
+    conn = acquire_connection()
     cursor = conn.cursor()
 
     try:
+        begin_immediate(conn)
         # Verify reservation exists and belongs to patient
-        cursor.execute('''
-            SELECT reservation_time, status, total_cost
-            FROM parking_reservations
-            WHERE reservation_id = ? AND patient_id = ?
-        ''', (reservation_id, patient_id))
+        cursor.execute(RESERVATION_CHECK_SQL, (reservation_id, patient_id))
         
         reservation = cursor.fetchone()
         if not reservation:
@@ -226,14 +259,11 @@ def cancel_parking_reservation(
             return {"error": f"Cannot cancel reservation with status: {reservation[1]}"}
 
         # Process cancellation
-        cursor.execute('''
-            UPDATE parking_reservations
-            SET status = 'cancelled',
-                cancelled_at = CURRENT_TIMESTAMP
-            WHERE reservation_id = ?
-        ''', (reservation_id,))
+        cursor.execute(CANCEL_RESERVATION_SQL, (reservation_id,))
+        adjust_occupancy(cursor, reservation[3], reservation_time, reservation[4], -1)
 
         conn.commit()
+        spot_allocator.release(reservation[3], reservation[5], reservation_time, reservation[4])
 
         return {
             "status": "cancelled",
@@ -246,5 +276,177 @@ def cancel_parking_reservation(
         return {"error": f"Failed to cancel reservation: {str(e)}"}
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
+
+
+def recurring_arrivals(
+    first_arrival: datetime,
+    count: int,
+    interval_days: int = 1,
+    weekdays: Optional[List[str]] = None
+) -> List[datetime]:
+    """
+    Arrival times of a recurring visit, e.g. dialysis three times a week.
+
+    With weekdays (names such as "Monday", or abbreviations of at least
+    three letters such as "Mon"), every matching day from first_arrival on
+    is used; otherwise one arrival every interval_days.
+
+    Raises:
+        ValueError: If count is out of range, a weekday is not recognised, or
+            the arrivals do not fit within MAX_RECURRENCE_DAYS
+    """
+    if not 1 <= count <= MAX_BULK_RESERVATIONS:
+        raise ValueError(f"count must be between 1 and {MAX_BULK_RESERVATIONS}")
+    allowed = _weekday_numbers(weekdays) if weekdays else None
+    step = timedelta(days=1 if allowed else max(interval_days, 1))
+    last_day = first_arrival + timedelta(days=MAX_RECURRENCE_DAYS)
+    arrivals = []
+    day = first_arrival
+    while len(arrivals) < count:
+        if day > last_day:
+            raise ValueError(f"{count} arrivals do not fit within {MAX_RECURRENCE_DAYS} days")
+        if allowed is None or day.weekday() in allowed:
+            arrivals.append(day)
+        day += step
+    return arrivals
+
+def _weekday_numbers(weekdays: List[str]) -> set:
+    """datetime.weekday() numbers for day names or their abbreviations"""
+    if isinstance(weekdays, str):
+        raise ValueError("weekdays must be a list of day names, e.g. [\"Monday\", \"Thursday\"]")
+    numbers = set()
+    for name in weekdays:
+        prefix = str(name).strip().lower()
+        matches = [number for number, day in enumerate(calendar.day_name)
+                   if len(prefix) >= 3 and day.lower().startswith(prefix)]
+        if not matches:
+            raise ValueError(f"Unknown weekday: {name!r}")
+        numbers.update(matches)
+    return numbers
+
+def appointment_stays(
+    patient_id: int,
+    days_ahead: int = 30,
+    lead_minutes: int = 30,
+    buffer_minutes: int = 30
+) -> List[tuple]:
+    """(arrival_time, duration_hours) covering each upcoming scheduled appointment"""
+    conn = acquire_connection()
+    cursor = conn.cursor()
+
+    try:
+        now = datetime.now()
+        cursor.execute(APPOINTMENT_STAYS_SQL, (patient_id, now.strftime(TIMESTAMP_FORMAT),
+              (now + timedelta(days=days_ahead)).strftime(TIMESTAMP_FORMAT)))
+
+        stays = []
+        for scheduled_time, end_time in cursor.fetchall():
+            start = datetime.fromisoformat(str(scheduled_time))
+            end = datetime.fromisoformat(str(end_time)) if end_time else start + timedelta(hours=1)
+            arrival = start - timedelta(minutes=lead_minutes)
+            leave = end + timedelta(minutes=buffer_minutes)
+            stays.append((arrival, max(math.ceil((leave - arrival).total_seconds() / 3600), 1)))
+        return stays
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+def reserve_parking_many(patient_id: int, requests: List[SpotRequest], require_all: bool = False) -> List[Optional[Dict]]:
+    """Book many stays for a patient in one transaction; None for stays that found no spot"""
+    def book(cursor, request: SpotRequest, spot: Spot) -> Dict:
+        total_cost = spot.hourly_rate * request.duration_hours
+        cursor.execute(INSERT_RESERVATION_SQL, (request.area_id, spot.spot_id, patient_id, request.start,
+                                                request.duration_hours, total_cost))
+        reservation_id = cursor.lastrowid
+        adjust_occupancy(cursor, request.area_id, request.start, request.duration_hours, 1)
+        return {
+            "reservation_id": reservation_id,
+            "area_id": request.area_id,
+            "spot_number": spot.spot_number,
+            "arrival_time": request.start.isoformat(),
+            "duration_hours": request.duration_hours,
+            "total_cost": total_cost,
+            "qr_code": f"PARKING-{reservation_id}-{spot.spot_number}"
+        }
+
+    return spot_allocator.allocate_many(requests, book, require_all=require_all)
+
+@tool
+def reserve_parking_bulk(
+    area_id: int,
+    stays: Optional[List[Dict]] = None,
+    recurrence: Optional[Dict] = None,
+    from_appointments: bool = False,
+    days_ahead: int = 30,
+    parking_type: Optional[ParkingType] = ParkingType.STANDARD,
+    require_all: bool = False,
+    *,
+    config: RunnableConfig
+) -> Dict:
+    """
+    Reserve parking for many visits at once, e.g. a group visit or a dialysis schedule
+
+    Args:
+        area_id: Parking area used for stays that do not name their own
+        stays: Explicit stays, each with arrival_time (ISO time),
+            duration_hours and an optional area_id
+        recurrence: A recurring visit with first_arrival (ISO time),
+            duration_hours, count, and either interval_days or weekdays
+            (e.g. ["Monday", "Wednesday", "Friday"] or ["Mon", "Wed", "Fri"])
+        from_appointments: Also cover each of the patient's scheduled
+            appointments in the next days_ahead days, arriving 30 minutes early
+        parking_type: Type of spot to reserve
+        require_all: Book nothing unless every stay gets a spot
+
+    Returns:
+        The reservations made, the stays that could not be booked, and the total cost
+    """
+    configuration = config.get("configurable", {})
+    patient_id = configuration.get("patient_id")
+    if not patient_id:
+        raise ValueError("No patient ID configured.")
+
+    spot_type = (parking_type or ParkingType.STANDARD).value
+    try:
+        requests = []
+        for stay in stays or []:
+            requests.append(SpotRequest(
+                stay.get("area_id") or area_id, spot_type,
+                datetime.fromisoformat(stay["arrival_time"]), int(stay["duration_hours"])
+            ))
+        if recurrence:
+            for arrival in recurring_arrivals(
+                datetime.fromisoformat(recurrence["first_arrival"]),
+                int(recurrence["count"]),
+                int(recurrence.get("interval_days") or 1),
+                recurrence.get("weekdays")
+            ):
+                requests.append(SpotRequest(area_id, spot_type, arrival, int(recurrence["duration_hours"])))
+        if from_appointments:
+            for arrival, duration_hours in appointment_stays(patient_id, days_ahead):
+                requests.append(SpotRequest(area_id, spot_type, arrival, duration_hours))
+
+        if not requests:
+            return {"error": "No stays to reserve"}
+        if len(requests) > MAX_BULK_RESERVATIONS:
+            return {"error": f"At most {MAX_BULK_RESERVATIONS} stays can be reserved at once"}
+
+        results = reserve_parking_many(patient_id, requests, require_all)
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": f"Failed to reserve parking: {str(e)}"}
 
+    reserved = [result for result in results if result is not None]
+    failed = [{
+        "area_id": request.area_id,
+        "arrival_time": request.start.isoformat(),
+        "duration_hours": request.duration_hours,
+        "error": "No available parking spots for the selected criteria"
+    } for request, result in zip(requests, results) if result is None]
+    return {
+        "reserved": reserved,
+        "failed": failed,
+        "total_cost": sum(result["total_cost"] for result in reserved)
+    }
@@ -0,0 +1,79 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from sqlite_cache import SqliteCache
+
+load_dotenv()
+
+@dataclass(frozen=True)
+class RouteCacheSettings:
+    """Location, TTLs and time buckets of the directions cache"""
+    enabled: bool = os.getenv("HOSPITAL_ROUTE_CACHE", "true").lower() == "true"
+    path: str = os.getenv("HOSPITAL_ROUTE_CACHE_DB", "route_cache.sqlite")
+    max_entries: int = int(os.getenv("HOSPITAL_ROUTE_CACHE_MAX_ENTRIES", "5000"))
+    # Driving times depend on live traffic: short TTL, fine time buckets
+    driving_ttl_seconds: float = float(os.getenv("HOSPITAL_ROUTE_CACHE_DRIVING_TTL", "600"))
+    driving_bucket_minutes: int = int(os.getenv("HOSPITAL_ROUTE_CACHE_DRIVING_BUCKET_MINUTES", "15"))
+    # Transit follows timetables, so it is bucketed by the hour but keeps for a day
+    transit_ttl_seconds: float = float(os.getenv("HOSPITAL_ROUTE_CACHE_TRANSIT_TTL", "86400"))
+    transit_bucket_minutes: int = int(os.getenv("HOSPITAL_ROUTE_CACHE_TRANSIT_BUCKET_MINUTES", "60"))
+    # Walking and cycling geometry hardly changes and does not depend on the time
+    static_ttl_seconds: float = float(os.getenv("HOSPITAL_ROUTE_CACHE_STATIC_TTL", "604800"))
+    evict_every: int = 50
+    touch_interval_seconds: float = 60
+
+def normalize_address(address: str) -> str:
+    """Address with case, punctuation and spacing differences removed"""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", address.lower())).strip()
+
+class RouteCache(SqliteCache):
+    """SQLite-backed cache of Google directions responses to the hospital"""
+
+    def __init__(self, settings: Optional[RouteCacheSettings] = None):
+        self.settings = settings or RouteCacheSettings()
+        super().__init__(
+            self.settings.path, "route_cache", self.settings.max_entries, self.settings.enabled,
+            self.settings.evict_every, self.settings.touch_interval_seconds
+        )
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def policy(self, mode: str) -> Tuple[float, Optional[int]]:
+        """(ttl_seconds, bucket_minutes) for a travel mode; no bucket means time-independent"""
+        if mode == "driving":
+            return self.settings.driving_ttl_seconds, self.settings.driving_bucket_minutes
+        if mode == "transit":
+            return self.settings.transit_ttl_seconds, self.settings.transit_bucket_minutes
+        return self.settings.static_ttl_seconds, None
+
+    def key(self, kind: str, start_address: str, mode: str, when: datetime) -> str:
+        """Key for a request of the given kind from start_address at time when"""
+        _, bucket_minutes = self.policy(mode)
+        bucket = int(when.timestamp() // (bucket_minutes * 60)) if bucket_minutes else "any"
+        return f"{kind}|{mode}|{bucket}|{normalize_address(start_address)}"
+
+    def _count(self, mode: str, outcome: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(mode, {"hits": 0, "misses": 0})
+            counters[outcome] += 1
+
+    def get(self, key: str, mode: str):
+        """The cached response for key, or None if missing or expired"""
+        if not self.enabled:
+            return None
+        response = self.lookup(key)
+        self._count(mode, "misses" if response is None else "hits")
+        return json.loads(response) if response is not None else None
+
+    def put(self, key: str, mode: str, response) -> None:
+        ttl_seconds, _ = self.policy(mode)
+        self.store(key, json.dumps(response, default=str), ttl_seconds, mode)
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        with self._lock:
+            stats["by_mode"] = {mode: dict(counters) for mode, counters in self._counters.items()}
+        return stats
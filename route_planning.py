@@ -0,0 +1,183 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Union
+from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
+import map_tools
+from map_tools import HOSPITAL_ADDRESS, cached_directions, get_gmaps
+
+# The Distance Matrix API takes at most 25 origins per request
+MAX_MATRIX_ORIGINS = 25
+BATCH_MAX_CONCURRENCY = int(os.getenv("HOSPITAL_ROUTE_BATCH_CONCURRENCY", "4"))
+
+@dataclass
+class TripRequest:
+    """One trip to the hospital; arrival_time takes precedence over departure_time"""
+    start_address: str
+    mode: str = "driving"
+    departure_time: Optional[datetime] = None
+    arrival_time: Optional[datetime] = None
+
+def _parse_time(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def as_trip(item: Union[TripRequest, Dict, tuple]) -> TripRequest:
+    """TripRequest from a TripRequest, a dict, or a (start_address, departure_time, mode) tuple"""
+    if isinstance(item, TripRequest):
+        return item
+    if isinstance(item, dict):
+        return TripRequest(
+            start_address=item["start_address"],
+            mode=item.get("mode") or "driving",
+            departure_time=_parse_time(item.get("departure_time")),
+            arrival_time=_parse_time(item.get("arrival_time"))
+        )
+    start_address, departure_time, *rest = item
+    return TripRequest(start_address, rest[0] if rest else "driving", _parse_time(departure_time))
+
+class _Trip:
+    def __init__(self, request: TripRequest, now: datetime):
+        self.request = request
+        self.mode = request.mode
+        self.by_arrival = request.arrival_time is not None
+        self.anchor = request.arrival_time if self.by_arrival else (request.departure_time or now)
+        # Google only accepts arrival_time in a distance matrix for transit;
+        # other arrival-time trips fall back to single directions requests
+        self.use_matrix = not self.by_arrival or self.mode == "transit"
+        kind = "matrix-arrival" if self.by_arrival else "matrix-departure"
+        self.key = map_tools.route_cache.key(kind, request.start_address, self.mode, self.anchor)
+        # A matrix request carries one time for all its origins, so only trips
+        # with the same exact anchor share a request; time-independent modes
+        # (no cache bucket) can all share one
+        _, bucket_minutes = map_tools.route_cache.policy(self.mode)
+        self.group = (kind, self.mode, self.anchor if bucket_minutes else None)
+
+    def time_kwargs(self) -> Dict:
+        if self.by_arrival:
+            return {"arrival_time": self.anchor}
+        return {
+            "departure_time": self.anchor,
+            "traffic_model": 'best_guess' if self.mode == 'driving' else None
+        }
+
+def _element(leg: Dict) -> Dict:
+    element = {"duration": leg["duration"], "distance": leg["distance"]}
+    if "duration_in_traffic" in leg:
+        element["duration_in_traffic"] = leg["duration_in_traffic"]
+    return element
+
+def _matrix_call(trips: List[_Trip], elements: Dict[str, Dict]) -> Callable[[], None]:
+    def call():
+        first = trips[0]
+        matrix = get_gmaps().distance_matrix(
+            [trip.request.start_address for trip in trips],
+            [HOSPITAL_ADDRESS],
+            mode=first.mode,
+            **first.time_kwargs()
+        )
+        for trip, row in zip(trips, matrix["rows"]):
+            element = row["elements"][0]
+            if element.get("status") == "OK":
+                elements[trip.key] = _element(element)
+                map_tools.route_cache.put(trip.key, trip.mode, elements[trip.key])
+    return call
+
+def _directions_call(trip: _Trip, elements: Dict[str, Dict]) -> Callable[[], None]:
+    def call():
+        directions = cached_directions(
+            "eta-arrival", trip.request.start_address, trip.mode, trip.anchor, **trip.time_kwargs()
+        )
+        if directions:
+            elements[trip.key] = _element(directions[0]['legs'][0])
+    return call
+
+def _result(trip: _Trip, element: Optional[Dict]) -> Dict:
+    if element is None:
+        return {"start_address": trip.request.start_address, "error": "Unable to calculate arrival time"}
+    duration_seconds = element.get('duration_in_traffic', element['duration'])['value']
+    if trip.by_arrival:
+        arrival, departure = trip.anchor, trip.anchor - timedelta(seconds=duration_seconds)
+    else:
+        departure, arrival = trip.anchor, trip.anchor + timedelta(seconds=duration_seconds)
+    return {
+        "start_address": trip.request.start_address,
+        "mode": trip.mode,
+        "departure_time": departure.strftime("%Y-%m-%d %H:%M"),
+        "estimated_arrival": arrival.strftime("%Y-%m-%d %H:%M"),
+        "duration_minutes": duration_seconds // 60,
+        "distance_km": element['distance']['value'] / 1000,
+        "traffic_condition": "Normal" if duration_seconds <= element['duration']['value'] else "Heavy"
+    }
+
+def plan_trips(requests: Iterable[Union[TripRequest, Dict, tuple]],
+               max_concurrency: int = BATCH_MAX_CONCURRENCY) -> List[Dict]:
+    """
+    Estimated departure/arrival times for many trips to the hospital.
+
+    Trips that map to the same route cache key (same normalized address,
+    mode and time bucket) are computed once, and cached results are reused.
+    The remaining trips are grouped by mode and exact departure or arrival
+    time into Distance Matrix requests of up to 25 origins, and arrival-time trips Google
+    cannot put in a matrix fall back to directions requests. These calls
+    run on a pool of max_concurrency threads. Results come back in input
+    order, in the same shape as get_estimated_arrival_time.
+    """
+    now = datetime.now()
+    trips = [_Trip(as_trip(item), now) for item in requests]
+
+    unique: Dict[str, _Trip] = {}
+    for trip in trips:
+        unique.setdefault(trip.key, trip)
+
+    elements: Dict[str, Dict] = {}
+    groups: Dict[tuple, List[_Trip]] = {}
+    calls = []
+    for key, trip in unique.items():
+        cached = map_tools.route_cache.get(key, trip.mode)
+        if cached is not None:
+            elements[key] = cached
+        elif trip.use_matrix:
+            groups.setdefault(trip.group, []).append(trip)
+        else:
+            calls.append(_directions_call(trip, elements))
+    for group in groups.values():
+        for i in range(0, len(group), MAX_MATRIX_ORIGINS):
+            calls.append(_matrix_call(group[i:i + MAX_MATRIX_ORIGINS], elements))
+
+    if calls:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(calls))) as pool:
+            for future in [pool.submit(call) for call in calls]:
+                try:
+                    future.result()
+                except Exception as e:
+                    # The trips of a failed call are reported individually below
+                    print(f"Batch route request failed: {str(e)}")
+
+    return [_result(trip, elements.get(trip.key)) for trip in trips]
+
+@tool
+def plan_arrival_times(
+    trips: List[Dict],
+    *,
+    config: RunnableConfig
+) -> List[Dict]:
+    """
+    Plan arrival times to the hospital for many trips at once, e.g. a day's appointments
+
+    Args:
+        trips: Trips to plan. Each has start_address, an optional mode
+            (driving/walking/transit/bicycling, default driving) and either
+            departure_time or arrival_time as an ISO time such as 2024-05-01T08:30
+            (defaults to departing now)
+
+    Returns:
+        One result per trip, in the same order as trips
+    """
+    try:
+        return plan_trips(trips)
+    except Exception as e:
+        return [{"error": f"Failed to plan arrival times: {str(e)}"}]
@@ -0,0 +1,250 @@
+"""Async (ASGI) version of run_server.py.
+
+Serves the same routes from a single event loop, so one process can keep
+many conversations in flight while they wait on the LLM. Diagnosis, deep
+search and browser tasks run on the shared background job queue. Run with
+
+    hypercorn run_async_server:app
+or
+    python run_async_server.py
+"""
+from quart import Quart, render_template, request, jsonify, redirect, Response
+import uuid
+from hospital_support_graph import get_hospital_support_graph
+import httpx
+from session_store import create_session_store
+from ai_doctor_tools import symptom_cache
+from map_tools import route_cache
+from chat_events import astream_chat_events, arun_chat_turn, format_sse, is_clinician, turn_config
+from job_queue import JobQueueFull
+from hospital_jobs import create_job_queue, format_patient_case, upload_path
+from warmup import warm_up_from_env
+import asyncio
+
+app = Quart(__name__)
+
+# Store session states
+sessions = create_session_store()
+
+# Background workers for the long-running agent workflows
+jobs = create_job_queue()
+
+GRADIO_URL = "https://2a44bb1a28317d2c8b.gradio.live"
+
+@app.before_serving
+async def warm_up():
+    # Load what HOSPITAL_WARMUP lists before accepting requests
+    await asyncio.to_thread(warm_up_from_env, True)
+
+@app.route('/')
+async def home():
+    return await render_template('index.html')
+
+@app.route('/redirect_to_gradio')
+async def redirect_to_gradio():
+    return redirect(GRADIO_URL)
+
+@app.route('/analyze_image', methods=['POST'])
+async def analyze_image():
+    files = await request.files
+    form = await request.form
+    if 'image' not in files:
+        return jsonify({"error": "No image provided"})
+
+    image = files['image']
+    session_id = form.get('session_id') or str(uuid.uuid4())
+    prompt = form.get('prompt', '').strip()
+
+    try:
+        async with httpx.AsyncClient(timeout=60) as client:
+            response = await client.post(
+                f"{GRADIO_URL}/predict",
+                files={'image': (image.filename, image.read(), image.content_type)}
+            )
+
+        if response.status_code == 200:
+            analysis_text = response.json()['prediction']
+            if prompt:
+                analysis_text = f"Regarding your question: '{prompt}'\n\nAnalysis: {analysis_text}"
+            return jsonify({
+                "session_id": session_id,
+                "analysis": analysis_text
+            })
+        return jsonify({
+            "session_id": session_id,
+            "error": "Failed to analyze image"
+        })
+
+    except Exception as e:
+        return jsonify({
+            "session_id": session_id,
+            "error": f"Error analyzing image: {str(e)}"
+        })
+
+@app.route('/chat', methods=['POST'])
+async def chat():
+    data = await request.get_json()
+    message = data.get('message', '').strip()
+    session_id, session = await asyncio.to_thread(sessions.get_or_create, data.get('session_id'))
+    # Authenticated clinicians can ask for fresh tool results instead of cached ones
+    config = turn_config(session["config"], bool(data.get('bypass_cache'))
+                         and is_clinician(request.headers.get('X-Clinician-Token')))
+
+    if not message:
+        return jsonify({"error": "Empty message"})
+
+    try:
+        responses = await arun_chat_turn(
+            get_hospital_support_graph(), message, config, session["printed"]
+        )
+        await asyncio.to_thread(sessions.save, session_id, session)
+        return jsonify({
+            "session_id": session_id,
+            "responses": responses
+        })
+
+    except Exception as e:
+        print(f"Error in chat endpoint: {str(e)}")
+        return jsonify({
+            "session_id": session_id,
+            "error": "An error occurred while processing your message. Please try again."
+        }), 500
+
+@app.route('/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Stream a chat turn as Server-Sent Events: token deltas, tool calls and results"""
+    data = await request.get_json()
+    message = data.get('message', '').strip()
+    session_id, session = await asyncio.to_thread(sessions.get_or_create, data.get('session_id'))
+    config = turn_config(session["config"], bool(data.get('bypass_cache'))
+                         and is_clinician(request.headers.get('X-Clinician-Token')))
+
+    if not message:
+        return jsonify({"session_id": session_id, "error": "Empty message"})
+
+    async def generate():
+        yield format_sse("session", {"session_id": session_id})
+        try:
+            async for event, payload in astream_chat_events(
+                get_hospital_support_graph(), message, config, session["printed"]
+            ):
+                yield format_sse(event, payload)
+        except Exception as e:
+            print(f"Error in chat stream: {str(e)}")
+            yield format_sse("error", {
+                "error": "An error occurred while processing your message. Please try again."
+            })
+        finally:
+            await asyncio.to_thread(sessions.save, session_id, session)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
+
+@app.route('/session_stats')
+async def session_stats():
+    return jsonify(await asyncio.to_thread(sessions.stats))
+
+@app.route('/cache_stats')
+async def cache_stats():
+    # deep_search loads with its first job; import it here only for the stats
+    from deep_search.utils import search_cache
+    return jsonify(await asyncio.to_thread(lambda: {
+        "symptom_analysis": symptom_cache.stats(),
+        "routes": route_cache.stats(),
+        "search": search_cache.stats()
+    }))
+
+async def _submit(job_type, params):
+    # The job queue and session store are SQLite-backed; their calls run
+    # in a worker thread so a busy database never stalls the event loop
+    try:
+        job_id = await asyncio.to_thread(jobs.submit, job_type, params)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "result_url": f"/jobs/{job_id}/result"
+    }), 202
+
+@app.route('/run_diagnosis', methods=['POST'])
+async def run_diagnosis():
+    """Queue a diagnosis job; poll /jobs/<job_id> for its progress"""
+    data = await request.get_json()
+    try:
+        patient_case = format_patient_case(data)
+    except KeyError as e:
+        return jsonify({"error": f"Missing field: {e.args[0]}"}), 400
+    return await _submit("diagnosis", {"patient_case": patient_case})
+
+@app.route('/run_browser_task', methods=['POST'])
+async def browser_task():
+    """Queue a browser task job; an uploaded file is kept until the job has run"""
+    form = await request.form
+    files = await request.files
+    task = form.get('task')
+    model = form.get('model', 'gpt-4o-mini')
+    headless = form.get('headless', 'true').lower() == 'true'
+
+    if not task:
+        return jsonify({"error": "No task provided"})
+
+    file_path = None
+    file = files.get('file')
+    if file:
+        file_path = upload_path(jobs, file.filename)
+        await file.save(file_path)
+
+    return await _submit("browser", {
+        "task": task,
+        "model": model,
+        "headless": headless,
+        "file_path": file_path
+    })
+
+@app.route('/deep_search', methods=['POST'])
+async def deep_search():
+    """Queue a deep search job; poll /jobs/<job_id> for its progress"""
+    data = await request.get_json()
+    research_topic = data.get('research_topic')
+
+    if not research_topic:
+        return jsonify({"error": "Research topic is required"})
+
+    return await _submit("deep_search", {
+        "research_topic": research_topic,
+        "llm_provider": data.get('llm_provider'),
+        "search_api": data.get('search_api'),
+        "max_loops": data.get('max_loops', 3),
+        "queries_per_loop": data.get('queries_per_loop')
+    })
+
+@app.route('/jobs/<job_id>')
+async def job_status(job_id):
+    job = await asyncio.to_thread(jobs.get, job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/result')
+async def job_result(job_id):
+    job = await asyncio.to_thread(jobs.get, job_id, include_result=True)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": job["error"], "status": job["status"]}), 500
+    if job["status"] != "succeeded":
+        return jsonify({"status": job["status"], "progress": job["progress"]}), 202
+    return jsonify(job["result"])
+
+@app.route('/jobs/metrics')
+async def job_metrics():
+    return jsonify(await asyncio.to_thread(jobs.metrics))
+
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -1,21 +1,26 @@
-from flask import Flask, render_template, request, jsonify, redirect
+from flask import Flask, render_template, request, jsonify, redirect, Response, stream_with_context
 import uuid
-from hospital_support_graph import hospital_support_graph
+from hospital_support_graph import get_hospital_support_graph
 import time
 import requests
-from multiagent import MedicalDiagnosisCrew  # Import your existing multiagent class
-from browser import run_browser_task  # Import the browser task function
-import asyncio
-import tempfile
-import os
-# Add deep search imports
-from deep_search.graph import graph as deep_search_graph
-from deep_search.configuration import Configuration, LLMProvider, SearchAPI
+from session_store import create_session_store
+from ai_doctor_tools import symptom_cache
+from map_tools import route_cache
+from chat_events import stream_chat_events, run_chat_turn, format_sse, is_clinician, turn_config
+from job_queue import JobQueueFull
+from hospital_jobs import create_job_queue, format_patient_case, upload_path
+from warmup import warm_up_from_env
 
 app = Flask(__name__)
 
 # Store session states
-sessions = {}
+sessions = create_session_store()
+
+# Background workers for the long-running agent workflows
+jobs = create_job_queue()
+
+# Load what HOSPITAL_WARMUP lists now rather than on the first request
+warm_up_from_env()
 
 @app.route('/')
 def home():
@@ -75,77 +80,20 @@ def chat():
     message = data.get('message', '').strip()
     session_id = data.get('session_id')
     
-    # Fix: Handle null or invalid session_id
-    if not session_id or session_id == 'null':
-        session_id = str(uuid.uuid4())
-        patient_id = str(uuid.uuid4())
-        sessions[session_id] = {
-            "printed": set(),
-            "config": {
-                "configurable": {
-                    "patient_id": patient_id,
-                    "thread_id": session_id,
-                }
-            }
-        }
-    elif session_id not in sessions:
-        patient_id = str(uuid.uuid4())
-        sessions[session_id] = {
-            "printed": set(),
-            "config": {
-                "configurable": {
-                    "patient_id": patient_id,
-                    "thread_id": session_id,
-                }
-            }
-        }
+    session_id, session = sessions.get_or_create(session_id)
+    # Authenticated clinicians can ask for fresh tool results instead of cached ones
+    config = turn_config(session["config"], bool(data.get('bypass_cache'))
+                         and is_clinician(request.headers.get('X-Clinician-Token')))
     
     if not message:
         return jsonify({"error": "Empty message"})
     
     try:
-        session = sessions[session_id]
-        events = hospital_support_graph.stream(
-            {"messages": ("user", message)},
-            session["config"],
-            stream_mode="values"
+        responses = run_chat_turn(
+            get_hospital_support_graph(), message, config, session["printed"]
         )
         
-        responses = []
-        for event in events:
-            current_state = event.get("dialog_state")
-            message = event.get("messages")
-            
-            if message:
-                # 处理单个消息或消息列表
-                messages_to_process = message if isinstance(message, list) else [message]
-                
-                for msg in messages_to_process:
-                    # 检查是否已经处理过这条消息
-                    msg_id = msg.id if hasattr(msg, 'id') else None
-                    if msg_id and msg_id in session["printed"]:
-                        continue
-                    
-                    # 获取消息内容
-                    content = msg.content if hasattr(msg, 'content') else str(msg)
-                    
-                    # 如果消息有工具调用，确保它们被正确处理
-                    if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                        for tool_call in msg.tool_calls:
-                            # 添加工具调用响应
-                            tool_response = {
-                                'tool_call_id': tool_call['id'],
-                                'content': content
-                            }
-                            responses.append(tool_response)
-                    else:
-                        # 普通消息直接添加到响应中
-                        responses.append(content)
-                    
-                    # 标记消息为已处理
-                    if msg_id:
-                        session["printed"].add(msg_id)
-        
+        sessions.save(session_id, session)
         return jsonify({
             "session_id": session_id,
             "responses": responses
@@ -158,138 +106,137 @@ def chat():
             "error": "An error occurred while processing your message. Please try again."
         }), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream a chat turn as Server-Sent Events: token deltas, tool calls and results"""
+    data = request.json
+    message = data.get('message', '').strip()
+    session_id, session = sessions.get_or_create(data.get('session_id'))
+    config = turn_config(session["config"], bool(data.get('bypass_cache'))
+                         and is_clinician(request.headers.get('X-Clinician-Token')))
+
+    if not message:
+        return jsonify({"session_id": session_id, "error": "Empty message"})
+
+    def generate():
+        yield format_sse("session", {"session_id": session_id})
+        try:
+            for event, payload in stream_chat_events(
+                get_hospital_support_graph(), message, config, session["printed"]
+            ):
+                yield format_sse(event, payload)
+        except Exception as e:
+            print(f"Error in chat stream: {str(e)}")
+            yield format_sse("error", {
+                "error": "An error occurred while processing your message. Please try again."
+            })
+        finally:
+            sessions.save(session_id, session)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/session_stats')
+def session_stats():
+    return jsonify(sessions.stats())
+
+@app.route('/cache_stats')
+def cache_stats():
+    # deep_search loads with its first job; import it here only for the stats
+    from deep_search.utils import search_cache
+    return jsonify({
+        "symptom_analysis": symptom_cache.stats(),
+        "routes": route_cache.stats(),
+        "search": search_cache.stats()
+    })
+
+def _submit(job_type, params):
+    try:
+        job_id = jobs.submit(job_type, params)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "result_url": f"/jobs/{job_id}/result"
+    }), 202
+
 @app.route('/run_diagnosis', methods=['POST'])
 def run_diagnosis():
+    """Queue a diagnosis job; poll /jobs/<job_id> for its progress"""
+    data = request.json
     try:
-        data = request.json
-        
-        # Format patient case
-        patient_case = f"""
-        Patient Information:
-        {data['basic_info']}
-        
-        Presenting Complaints:
-        {data['symptoms']}
-        
-        Medical History:
-        {data['medical_history']}
-        
-        Current Medications:
-        {data['medications']}
-        
-        Vital Signs:
-        {data['vital_signs']}
-        """
-        
-        # Initialize medical diagnosis crew
-        crew = MedicalDiagnosisCrew(model_name="gpt-4o-mini", temperature=0.7)
-        
-        # Run diagnosis and convert result to string
-        diagnosis_result = str(crew.run_diagnosis(patient_case))
-        
-        # Create a simple diagnosis process with the result
-        diagnosis_process = [{
-            "specialist": "Medical Team",
-            "message": diagnosis_result
-        }]
-        
-        return jsonify({
-            "success": True,
-            "diagnosis_process": diagnosis_process
-        })
-        
-    except Exception as e:
-        print(f"Diagnosis error: {str(e)}")  # Add logging
-        return jsonify({
-            "error": f"Error during diagnosis: {str(e)}"
-        }), 500
+        patient_case = format_patient_case(data)
+    except KeyError as e:
+        return jsonify({"error": f"Missing field: {e.args[0]}"}), 400
+    return _submit("diagnosis", {"patient_case": patient_case})
 
 @app.route('/run_browser_task', methods=['POST'])
 def browser_task():
-    try:
-        task = request.form.get('task')
-        model = request.form.get('model', 'gpt-4o-mini')
-        headless = request.form.get('headless', 'true').lower() == 'true'
-        
-        if not task:
-            return jsonify({"error": "No task provided"})
-        
-        file = request.files.get('file')
-        
-        # 如果有文件，创建临时文件
-        temp_file = None
-        if file:
-            # 获取文件扩展名
-            file_ext = os.path.splitext(file.filename)[1]
-            
-            # 创建临时文件
-            temp_file = tempfile.NamedTemporaryFile(suffix=file_ext, delete=False)
-            file.save(temp_file.name)
-            temp_file.close()
-            
-        try:
-            result = asyncio.run(run_browser_task(
-                task=task,
-                model=model,
-                headless=headless,
-                file_obj=temp_file if file else None
-            ))
-            
-            return jsonify({
-                "success": True,
-                "result": result
-            })
-            
-        finally:
-            # 清理临时文件
-            if temp_file:
-                try:
-                    os.unlink(temp_file.name)
-                except:
-                    pass
-        
-    except Exception as e:
-        print(f"Browser task error: {str(e)}")  # Add logging
-        return jsonify({
-            "error": f"Error during browser task: {str(e)}"
-        }), 500
+    """Queue a browser task job; an uploaded file is kept until the job has run"""
+    task = request.form.get('task')
+    model = request.form.get('model', 'gpt-4o-mini')
+    headless = request.form.get('headless', 'true').lower() == 'true'
+
+    if not task:
+        return jsonify({"error": "No task provided"})
+
+    file_path = None
+    file = request.files.get('file')
+    if file:
+        file_path = upload_path(jobs, file.filename)
+        file.save(file_path)
+
+    return _submit("browser", {
+        "task": task,
+        "model": model,
+        "headless": headless,
+        "file_path": file_path
+    })
 
 @app.route('/deep_search', methods=['POST'])
 def deep_search():
-    try:
-        data = request.json
-        research_topic = data.get('research_topic')
-        llm_provider = data.get('llm_provider')
-        search_api = data.get('search_api')
-        max_loops = data.get('max_loops', 3)
-        
-        if not research_topic:
-            return jsonify({"error": "Research topic is required"})
-            
-        config = {
-            "configurable": {
-                "llm_provider": llm_provider,
-                "search_api": search_api,
-                "max_web_research_loops": max_loops
-            }
-        }
-        
-        # 运行研究 - 使用正确导入的 deep_search_graph
-        result = deep_search_graph.invoke(
-            {"research_topic": research_topic},
-            config=config
-        )
-        
-        return jsonify({
-            "success": True,
-            "result": result["running_summary"]
-        })
-        
-    except Exception as e:
-        print(f"Deep search error: {str(e)}")
-        return jsonify({
-            "error": f"Error during research: {str(e)}"
-        }), 500
+    """Queue a deep search job; poll /jobs/<job_id> for its progress"""
+    data = request.json
+    research_topic = data.get('research_topic')
+
+    if not research_topic:
+        return jsonify({"error": "Research topic is required"})
+
+    return _submit("deep_search", {
+        "research_topic": research_topic,
+        "llm_provider": data.get('llm_provider'),
+        "search_api": data.get('search_api'),
+        "max_loops": data.get('max_loops', 3),
+        "queries_per_loop": data.get('queries_per_loop')
+    })
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = jobs.get(job_id, include_result=True)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": job["error"], "status": job["status"]}), 500
+    if job["status"] != "succeeded":
+        return jsonify({"status": job["status"], "progress": job["progress"]}), 202
+    return jsonify(job["result"])
+
+@app.route('/jobs/metrics')
+def job_metrics():
+    return jsonify(jobs.metrics())
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
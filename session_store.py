@@ -0,0 +1,243 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class RecentIds:
+    """Set of the most recently seen message ids, capped at max_size"""
+
+    def __init__(self, max_size: int, ids: Iterable[str] = ()):
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        for msg_id in ids:
+            self.add(msg_id)
+
+    def add(self, msg_id: str) -> None:
+        self._ids[msg_id] = None
+        self._ids.move_to_end(msg_id)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    def __contains__(self, msg_id: str) -> bool:
+        return msg_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+def _new_session(session_id: str, max_printed_ids: int, patient_id: Optional[str] = None,
+                 printed: Iterable[str] = ()) -> dict:
+    return {
+        "printed": RecentIds(max_printed_ids, printed),
+        "config": {
+            "configurable": {
+                "patient_id": patient_id or str(uuid.uuid4()),
+                "thread_id": session_id,
+            }
+        }
+    }
+
+class SessionStore:
+    """In-process chat sessions with LRU and idle-TTL eviction"""
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl_seconds: float = 3600,
+                 max_printed_ids: int = 2000):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_printed_ids = max_printed_ids
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: Optional[str]) -> Tuple[str, dict]:
+        """Return (session_id, session), creating a new session when needed"""
+        if not session_id or session_id == 'null':
+            session_id = str(uuid.uuid4())
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self.hits += 1
+                session = entry[1]
+            else:
+                self.misses += 1
+                session = _new_session(session_id, self.max_printed_ids)
+            self._sessions[session_id] = (now, session)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        return session_id, session
+
+    def save(self, session_id: str, session: dict) -> None:
+        """Persist changes to a session; a no-op for the in-process store"""
+
+    def _evict_idle(self, now: float) -> None:
+        # Entries are kept in last-access order, so expired ones are at the front
+        while self._sessions:
+            last_seen, _ = next(iter(self._sessions.values()))
+            if now - last_seen < self.idle_ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._sessions)
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "sessions": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None
+        }
+
+class SqliteSessionStore(SessionStore):
+    """Sessions kept in a SQLite file so several workers can share them.
+
+    Looking up a live session is a read. Idle and surplus sessions are
+    evicted every evict_every writes; until then an idle row is treated as
+    expired.
+    """
+
+    def __init__(self, path: str, evict_every: int = 50, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.evict_every = max(1, evict_every)
+        self._writes = 0
+        self._local = threading.local()
+        self._ready = False
+        self._setup_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._setup(conn)
+            self._local.conn = conn
+        return conn
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        """Create the session table on the first connection"""
+        with self._setup_lock:
+            if self._ready:
+                return
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chat_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    patient_id TEXT NOT NULL,
+                    printed TEXT NOT NULL,
+                    last_seen REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_last_seen ON chat_sessions(last_seen)")
+            conn.commit()
+            self._ready = True
+
+    def get_or_create(self, session_id: Optional[str]) -> Tuple[str, dict]:
+        if not session_id or session_id == 'null':
+            session_id = str(uuid.uuid4())
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "SELECT patient_id, printed FROM chat_sessions WHERE session_id = ? AND last_seen >= ?",
+            (session_id, now - self.idle_ttl_seconds)
+        ).fetchone()
+        hit = row is not None
+        if not hit:
+            # Workers that miss on the same new session race to insert it;
+            # the first one wins and everyone uses its patient_id
+            session = _new_session(session_id, self.max_printed_ids)
+            conn.execute('''
+                INSERT INTO chat_sessions (session_id, patient_id, printed, last_seen)
+                VALUES (?, ?, '[]', ?)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    patient_id = excluded.patient_id,
+                    printed = excluded.printed,
+                    last_seen = excluded.last_seen
+                WHERE chat_sessions.last_seen < ?
+            ''', (session_id, session["config"]["configurable"]["patient_id"], now,
+                  now - self.idle_ttl_seconds))
+            self._wrote(conn, now)
+            conn.commit()
+            row = conn.execute(
+                "SELECT patient_id, printed FROM chat_sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return session_id, _new_session(session_id, self.max_printed_ids, row[0], json.loads(row[1]))
+
+    def save(self, session_id: str, session: dict) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute('''
+            INSERT OR REPLACE INTO chat_sessions (session_id, patient_id, printed, last_seen)
+            VALUES (?, ?, ?, ?)
+        ''', (session_id, session["config"]["configurable"]["patient_id"],
+              json.dumps(list(session["printed"])), now))
+        self._wrote(conn, now)
+        conn.commit()
+
+    def _wrote(self, conn: sqlite3.Connection, now: float) -> None:
+        # Eviction walks the last_seen index, so it only runs every evict_every writes
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        cursor = conn.execute('''
+            DELETE FROM chat_sessions
+            WHERE last_seen < ?
+            OR session_id IN (
+                SELECT session_id FROM chat_sessions
+                ORDER BY last_seen DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (now - self.idle_ttl_seconds, self.max_sessions))
+        with self._lock:
+            self.evictions += cursor.rowcount
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["backend"] = "sqlite"
+        stats["sessions"] = self._conn().execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+        return stats
+
+def create_session_store() -> SessionStore:
+    """Build the session store selected by HOSPITAL_SESSION_STORE (memory | sqlite)"""
+    options = {
+        "max_sessions": int(os.getenv("HOSPITAL_SESSION_MAX", "10000")),
+        "idle_ttl_seconds": float(os.getenv("HOSPITAL_SESSION_TTL_SECONDS", "3600")),
+        "max_printed_ids": int(os.getenv("HOSPITAL_SESSION_MAX_PRINTED_IDS", "2000")),
+    }
+    backend = os.getenv("HOSPITAL_SESSION_STORE", "memory")
+    if backend == "sqlite":
+        return SqliteSessionStore(
+            os.getenv("HOSPITAL_SESSION_DB", "sessions.sqlite"),
+            evict_every=int(os.getenv("HOSPITAL_SESSION_EVICT_EVERY", "50")),
+            **options
+        )
+    if backend != "memory":
+        raise ValueError(f"Unsupported session store: {backend}")
+    return SessionStore(**options)
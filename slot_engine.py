@@ -0,0 +1,128 @@
+from bisect import insort
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# Intervals are half-open (start, end) pairs of minutes since midnight
+Interval = Tuple[int, int]
+MINUTES_PER_DAY = 24 * 60
+
+def parse_clock(value: str) -> int:
+    """Convert an 'HH:MM' string to minutes since midnight"""
+    hours, minutes = value.strip().split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+def parse_working_hours(working_hours: Optional[str]) -> Optional[Interval]:
+    """Parse a doctor's 'HH:MM-HH:MM' working hours into a minute interval"""
+    if not working_hours:
+        return None
+    start_time, end_time = working_hours.split('-')
+    return parse_clock(start_time), parse_clock(end_time)
+
+def parse_working_days(working_days: Optional[str]) -> Optional[frozenset]:
+    """Parse a comma separated list of weekday names; None means every day"""
+    if not working_days:
+        return None
+    return frozenset(day.strip() for day in working_days.split(','))
+
+def _to_datetime(value: Union[str, datetime]) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def minutes_to_datetime(day: date, minute: int) -> datetime:
+    return datetime(day.year, day.month, day.day) + timedelta(minutes=minute)
+
+class BookingIndex:
+    """Booked appointments per (doctor, day) as sorted minute intervals.
+
+    Each booking's timestamps are parsed once when it is added; lookups then
+    work purely on integers.
+    """
+
+    def __init__(self):
+        self._intervals: Dict[Tuple[int, date], List[Interval]] = {}
+        self._merged: Dict[Tuple[int, date], List[Interval]] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "BookingIndex":
+        """Build an index from (doctor_id, scheduled_time, end_time) rows"""
+        index = cls()
+        for doctor_id, start, end in rows:
+            index.add(doctor_id, start, end)
+        return index
+
+    def add(self, doctor_id: int, start: Union[str, datetime], end: Union[str, datetime]) -> None:
+        start_dt, end_dt = _to_datetime(start), _to_datetime(end)
+        day = start_dt.date()
+        start_minute = start_dt.hour * 60 + start_dt.minute
+        end_minute = (end_dt.date() - day).days * MINUTES_PER_DAY + end_dt.hour * 60 + end_dt.minute
+        if end_dt.second or end_dt.microsecond:
+            end_minute += 1
+        # Bookings that run past midnight are split into one interval per day
+        while end_minute > start_minute:
+            key = (doctor_id, day)
+            insort(self._intervals.setdefault(key, []), (start_minute, min(end_minute, MINUTES_PER_DAY)))
+            self._merged.pop(key, None)
+            day += timedelta(days=1)
+            start_minute, end_minute = 0, end_minute - MINUTES_PER_DAY
+
+    def busy(self, doctor_id: int, day: date) -> List[Interval]:
+        """Disjoint, sorted busy intervals for a doctor on a day"""
+        key = (doctor_id, day)
+        merged = self._merged.get(key)
+        if merged is None:
+            merged = []
+            for start, end in self._intervals.get(key, ()):
+                if merged and start <= merged[-1][1]:
+                    if end > merged[-1][1]:
+                        merged[-1] = (merged[-1][0], end)
+                else:
+                    merged.append((start, end))
+            self._merged[key] = merged
+        return merged
+
+def free_slots(work: Interval, busy: List[Interval], duration: int) -> List[Interval]:
+    """Walk the slot grid and the busy intervals together in a single pass"""
+    work_start, work_end = work
+    slots = []
+    i = 0
+    slot_start = work_start
+    while slot_start + duration <= work_end:
+        slot_end = slot_start + duration
+        while i < len(busy) and busy[i][1] <= slot_start:
+            i += 1
+        if i == len(busy) or busy[i][0] >= slot_end:
+            slots.append((slot_start, slot_end))
+        slot_start = slot_end
+    return slots
+
+def free_slots_batch(
+    schedules: Dict[int, Tuple[Optional[str], Optional[str]]],
+    bookings: BookingIndex,
+    days: Iterable[date],
+    duration: int
+) -> Dict[Tuple[int, date], List[Interval]]:
+    """Free slots for many doctors and days at once.
+
+    Args:
+        schedules: doctor_id -> (working_days, working_hours) as stored in doctors
+        bookings: Scheduled appointments for every doctor and day requested
+        days: Days to compute slots for
+        duration: Slot length in minutes
+
+    Returns:
+        (doctor_id, day) -> free minute intervals, only for days the doctor works
+    """
+    days = list(days)
+    weekdays = {day: day.strftime('%A') for day in days}
+    result = {}
+    for doctor_id, (working_days, working_hours) in schedules.items():
+        work = parse_working_hours(working_hours)
+        if work is None:
+            continue
+        allowed = parse_working_days(working_days)
+        for day in days:
+            if allowed is not None and weekdays[day] not in allowed:
+                continue
+            result[(doctor_id, day)] = free_slots(work, bookings.busy(doctor_id, day), duration)
+    return result
@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+class SqliteCache:
+    """SQLite table of cached text responses with TTL and LRU eviction.
+
+    Base of the LLM, search and route caches. Each entry carries its own
+    expiry and an optional tag (model provider, travel mode). The table is
+    created on the first connection, so a cache built at import touches no
+    file. Hits are reads: last_used is refreshed at most every
+    touch_interval_seconds, and the table is trimmed back to max_entries
+    once every evict_every writes.
+    """
+
+    def __init__(self, path: str, table: str, max_entries: int, enabled: bool = True,
+                 evict_every: int = 50, touch_interval_seconds: float = 60):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.evict_every = max(1, evict_every)
+        self.touch_interval_seconds = touch_interval_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ready = False
+        self._setup_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._setup(conn)
+            self._local.conn = conn
+        return conn
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        with self._setup_lock:
+            if self._ready:
+                return
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")}
+            if columns and not {"tag", "expires_at"} <= columns:
+                # Written by an older cache layout; cached responses are disposable
+                conn.execute(f"DROP TABLE {self.table}")
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    cache_key TEXT PRIMARY KEY,
+                    tag TEXT,
+                    response TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table}(last_used)")
+            conn.commit()
+            self._ready = True
+
+    def lookup(self, key: str) -> Optional[str]:
+        """The cached text for key, or None if missing or expired"""
+        if not self.enabled:
+            return None
+        conn = self._conn()
+        row = conn.execute(
+            f"SELECT response, expires_at, last_used FROM {self.table} WHERE cache_key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[1] <= now:
+            with self._lock:
+                self.misses += 1
+            return None
+        if now - row[2] >= self.touch_interval_seconds:
+            conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE cache_key = ?", (now, key))
+            conn.commit()
+        with self._lock:
+            self.hits += 1
+        return row[0]
+
+    def store(self, key: str, response: str, ttl_seconds: float, tag: Optional[str] = None) -> None:
+        """Cache response under key for ttl_seconds"""
+        if not self.enabled:
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.execute(f'''
+            INSERT OR REPLACE INTO {self.table} (cache_key, tag, response, expires_at, last_used)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (key, tag, response, now + ttl_seconds, now))
+        with self._lock:
+            self.writes += 1
+            evict = self.writes % self.evict_every == 0
+        if evict:
+            self._evict(conn, now)
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        cursor = conn.execute(f'''
+            DELETE FROM {self.table}
+            WHERE expires_at <= ?
+            OR cache_key IN (
+                SELECT cache_key FROM {self.table}
+                ORDER BY last_used DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (now, self.max_entries))
+        with self._lock:
+            self.evictions += cursor.rowcount
+
+    def stats(self) -> Dict:
+        entries = self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
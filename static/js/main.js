@@ -144,6 +144,7 @@ document.addEventListener('DOMContentLoaded', function() {
         messageDiv.textContent = content;
         messagesDiv.appendChild(messageDiv);
         messagesDiv.scrollTop = messagesDiv.scrollHeight;
+        return messageDiv;
     }
 
     function setLoading(loading) {
@@ -164,6 +165,77 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Read a Server-Sent Events response body and hand each event to onEvent
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) {
+                        event = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        data += line.slice(6);
+                    }
+                });
+                if (data) {
+                    onEvent(event, JSON.parse(data));
+                }
+            }
+        }
+    }
+
+    // Render streamed chat events incrementally, one bubble per assistant message
+    function createChatEventHandler() {
+        const bubbles = {};
+
+        return function(event, data) {
+            switch (event) {
+                case 'session':
+                    sessionId = data.session_id;
+                    break;
+                case 'token':
+                    if (!bubbles[data.id]) {
+                        bubbles[data.id] = addMessage('', 'assistant');
+                    }
+                    bubbles[data.id].textContent += data.content;
+                    document.getElementById('chat-messages').scrollTop =
+                        document.getElementById('chat-messages').scrollHeight;
+                    break;
+                case 'message':
+                    if (bubbles[data.id]) {
+                        bubbles[data.id].textContent = data.content;
+                    } else {
+                        bubbles[data.id] = addMessage(data.content, 'assistant');
+                    }
+                    break;
+                case 'tool_call':
+                    addMessage(`Working on it: ${data.name}...`, 'system');
+                    break;
+                case 'done':
+                    if (data.pending_approval) {
+                        addMessage('This action needs your confirmation before it can be completed.', 'system');
+                    }
+                    break;
+                case 'error':
+                    addMessage(data.error, 'system');
+                    break;
+            }
+        };
+    }
+
     async function sendMessage() {
         const message = messageInput.value.trim();
         
@@ -175,7 +247,7 @@ document.addEventListener('DOMContentLoaded', function() {
         setLoading(true);
         
         try {
-            const response = await fetch('/chat', {
+            const response = await fetch('/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -186,18 +258,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 })
             });
             
-            const data = await response.json();
-            
-            if (!sessionId) {
-                sessionId = data.session_id;
-            }
-            
-            if (data.error) {
-                addMessage(data.error, 'system');
+            const contentType = response.headers.get('Content-Type') || '';
+            if (contentType.includes('text/event-stream')) {
+                await readEventStream(response, createChatEventHandler());
             } else {
-                data.responses.forEach(response => {
-                    addMessage(response, 'assistant');
-                });
+                // Validation errors come back as a plain JSON body
+                const data = await response.json();
+                if (!sessionId) {
+                    sessionId = data.session_id;
+                }
+                if (data.error) {
+                    addMessage(data.error, 'system');
+                }
             }
         } catch (error) {
             addMessage('Sorry, an error occurred. Please try again.', 'system');
@@ -243,6 +315,33 @@ document.addEventListener('DOMContentLoaded', function() {
         startDiagnosisBtn.addEventListener('click', startDiagnosis);
     }
 
+    // Long-running tasks are queued as background jobs: submit, then poll
+    // the job status until it finishes and fetch the result.
+    async function runJob(url, options, onProgress) {
+        const response = await fetch(url, options);
+        const submitted = await response.json();
+        if (submitted.error) {
+            return submitted;
+        }
+
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            const status = await (await fetch(submitted.status_url)).json();
+            if (status.error && status.status !== 'failed') {
+                return status;
+            }
+            if (status.status === 'succeeded' || status.status === 'failed') {
+                break;
+            }
+            if (onProgress) {
+                onProgress(status.status === 'queued'
+                    ? `Queued (position ${status.queue_position})...`
+                    : (status.progress || 'Running...'));
+            }
+        }
+        return (await fetch(submitted.result_url)).json();
+    }
+
     async function startDiagnosis() {
         const diagnosisLog = document.getElementById('diagnosis-log');
         const patientCase = {
@@ -257,15 +356,14 @@ document.addEventListener('DOMContentLoaded', function() {
         diagnosisLog.innerHTML = '<div class="diagnosis-entry">Starting diagnosis process...</div>';
 
         try {
-            const response = await fetch('/run_diagnosis', {
+            const progressEntry = diagnosisLog.firstElementChild;
+            const data = await runJob('/run_diagnosis', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify(patientCase)
-            });
-
-            const data = await response.json();
+            }, progress => { progressEntry.textContent = progress; });
 
             if (data.error) {
                 addDiagnosisEntry('System', data.error, 'error');
@@ -395,12 +493,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 formData.append('file', fileInput.files[0]);
             }
             
-            const response = await fetch('/run_browser_task', {
+            const data = await runJob('/run_browser_task', {
                 method: 'POST',
                 body: formData
-            });
-            
-            const data = await response.json();
+            }, progress => { browserLog.textContent = progress; });
             
             if (data.error) {
                 browserLog.textContent = `Error: ${data.error}`;
@@ -441,7 +537,7 @@ document.addEventListener('DOMContentLoaded', function() {
         researchLog.textContent = 'Starting research...';
         
         try {
-            const response = await fetch('/deep_search', {
+            const data = await runJob('/deep_search', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -452,9 +548,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     search_api: searchApi,
                     max_loops: parseInt(loops)
                 })
-            });
-            
-            const data = await response.json();
+            }, progress => { researchLog.textContent = progress; });
             
             if (data.error) {
                 researchLog.textContent = `Error: ${data.error}`;
@@ -0,0 +1,75 @@
+import os
+import time
+from typing import Dict, Iterable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WARMUP_TARGETS = ("db", "chat", "diagnosis", "deep_search", "browser")
+
+def _warm_db() -> None:
+    from hospital_db import acquire_connection, release_connection
+    # Opening the first connection also applies pending schema migrations
+    release_connection(acquire_connection())
+
+def _warm_chat(async_clients: bool) -> None:
+    from hospital_support_graph import get_hospital_support_graph, get_llm
+    get_hospital_support_graph()
+    get_llm()
+    from ai_doctor_tools import get_async_openai_client, get_openai_client
+    from map_tools import get_gmaps, traffic_snapshot
+    get_openai_client()
+    if async_clients:
+        get_async_openai_client()
+    get_gmaps()
+    traffic_snapshot.start()
+
+def _warm_diagnosis() -> None:
+    from multiagent import crew_pool
+    crew_pool.warm("gpt-4o-mini", 0.7)
+
+def _warm_deep_search() -> None:
+    import deep_search.graph  # noqa: F401
+
+def _warm_browser() -> None:
+    import browser  # noqa: F401
+
+def warm_up(targets: Optional[Iterable[str]] = None, async_clients: bool = False) -> Dict[str, float]:
+    """
+    Load parts of the app now instead of on their first request.
+
+    Heavy SDKs and API clients are created lazily, so a worker starts fast
+    and only pays for what it serves; warming moves that cost to startup.
+    Returns the seconds spent per target. A target that fails to load is
+    reported and skipped.
+    """
+    targets = list(targets or WARMUP_TARGETS)
+    steps = {
+        "db": _warm_db,
+        "chat": lambda: _warm_chat(async_clients),
+        "diagnosis": _warm_diagnosis,
+        "deep_search": _warm_deep_search,
+        "browser": _warm_browser,
+    }
+    timings = {}
+    for target in targets:
+        if target not in steps:
+            raise ValueError(f"Unknown warm-up target: {target}")
+        start = time.perf_counter()
+        try:
+            steps[target]()
+        except Exception as e:
+            print(f"Warning: warm-up of {target} failed: {str(e)}")
+            continue
+        timings[target] = round(time.perf_counter() - start, 3)
+    print(f"Warm-up finished: {timings}")
+    return timings
+
+def warm_up_from_env(async_clients: bool = False) -> Dict[str, float]:
+    """Warm the targets listed in HOSPITAL_WARMUP (comma-separated, or "all")"""
+    value = os.getenv("HOSPITAL_WARMUP", "").strip()
+    if not value:
+        return {}
+    if value == "all":
+        return warm_up(async_clients=async_clients)
+    return warm_up([t.strip() for t in value.split(",") if t.strip()], async_clients=async_clients)